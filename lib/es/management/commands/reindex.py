@@ -2,7 +2,16 @@
 Marketplace ElasticSearch Indexer.
 
 Currently creates the indexes and re-indexes apps and feed elements.
+
+With `--incremental` (or `--since`), the live index is copied into the new
+index and only the objects modified since the last reindexing are extracted
+again from the database.
+
+The state of every chunk is recorded, use `--resume` to queue the failed or
+lost chunks of an interrupted reindexing again, and the
+`reindex_progress` command to follow a reindexing.
 """
+import datetime
 import logging
 import sys
 import time
@@ -11,13 +20,17 @@ from optparse import make_option
 
 import elasticsearch
 from celery import chain, chord, task
+from elasticsearch import helpers
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
 
 import mkt.feed.indexers as f_indexers
 from amo.utils import chunked, timestamp_index
-from lib.es.models import Reindexing
+from lib.es.models import Reindexing, ReindexingChunk
+from mkt.search.utils import index_cache_key
 from mkt.webapps.indexers import WebappIndexer
 
 
@@ -100,6 +113,32 @@ def pre_index(new_index, old_index, alias, indexer, settings):
                       wait_for_relocating_shards=0)
 
 
+def _copy_actions(hits, index):
+    """Bulk actions creating the documents of `hits` in `index`."""
+    for hit in hits:
+        yield {'_op_type': 'create', '_index': index, '_type': hit['_type'],
+               '_id': hit['_id'], '_source': hit['_source']}
+
+
+@task
+def copy_index(new_index, old_index, alias):
+    """
+    Copy all the documents of the live index into the new index, so that only
+    the objects modified since the last reindexing need to be extracted again.
+
+    The objects modified during the copy are written to both indices, so the
+    documents already in the new index are more recent than the copied ones:
+    they are only created, never overwritten.
+    """
+    _print('Copying documents from {old} to {new}.'.format(
+        old=old_index, new=new_index), alias)
+    hits = helpers.scan(ES, index=old_index, scroll='5m')
+    copied, skipped = helpers.bulk(ES, _copy_actions(hits, new_index),
+                                   stats_only=True)
+    _print('Copied {copied} documents, {skipped} were already there.'.format(
+        copied=copied, skipped=skipped), alias)
+
+
 @task
 def post_index(new_index, old_index, alias, indexer, settings):
     """
@@ -129,6 +168,12 @@ def post_index(new_index, old_index, alias, indexer, settings):
             {'remove': {'index': old_index, 'alias': alias}}
         )
     ES.indices.update_aliases(body=dict(actions=actions))
+    # The cached searches are keyed by the indices behind the alias.
+    cache.delete(index_cache_key(alias))
+
+    # Anything modified after the reindexing started was indexed on both
+    # indices, so the next incremental reindexing can start from there.
+    Reindexing.set_watermark(alias)
 
     _print('Unflagging the database.', alias)
     Reindexing.unflag_reindexing(alias=alias)
@@ -144,25 +189,126 @@ def post_index(new_index, old_index, alias, indexer, settings):
            '{output}\n'.format(output=alias_output), alias)
 
 
-@task(ignore_result=False)
-def run_indexing(index, indexer, ids):
+@task(ignore_result=False, acks_late=True)
+def run_indexing(index, indexer, ids, chunk_id=None):
     """Index the objects.
 
     - index: name of the index
+    - chunk_id: id of the ReindexingChunk to mark as done or failed
 
     Note: `ignore_result=False` is required for the chord to work and trigger
-    the callback.
+    the callback. `acks_late=True` makes a chunk run again if its worker is
+    restarted before it is done.
 
     """
-    indexer.run_indexing(ids, ES, index=index)
+    if chunk_id:
+        ReindexingChunk.set_heartbeat(chunk_id)
+    try:
+        indexer.run_indexing(ids, ES, index=index)
+    except Exception:
+        if chunk_id:
+            ReindexingChunk.set_status(chunk_id,
+                                       ReindexingChunk.STATUS_FAILED)
+        raise
+    if chunk_id:
+        ReindexingChunk.set_status(chunk_id, ReindexingChunk.STATUS_DONE)
 
 
-def chunk_indexing(indexer, chunk_size):
-    """Chunk the items to index."""
-    chunks = list(indexer.get_indexable().values_list('id', flat=True))
+def chunk_indexing(indexer, chunk_size, since=None):
+    """
+    Chunk the items to index.
+
+    since -- only include the items modified since that date.
+    """
+    qs = indexer.get_indexable()
+    if since:
+        qs = qs.filter(modified__gte=since)
+    chunks = list(qs.values_list('id', flat=True))
     return chunked(chunks, chunk_size), len(chunks)
 
 
+def get_index_settings(index):
+    """Return the settings of an existing index, or an empty dict."""
+    if not index:
+        return {}
+    try:
+        return (ES.indices.get_settings(index=index).get(
+            index, {}).get('settings', {}))
+    except elasticsearch.NotFoundError:
+        return {}
+
+
+def post_index_task(new_index, old_index, alias, indexer):
+    """Return the post_index task, restoring the replicas of the old index."""
+    num_replicas = get_index_settings(old_index).get(
+        'number_of_replicas', settings.ES_DEFAULT_NUM_REPLICAS)
+    return post_index.si(new_index, old_index, alias, indexer, {
+        'number_of_replicas': num_replicas,
+        'refresh_interval': '5s'})
+
+
+def index_tasks(new_index, indexer, chunks):
+    """Return the run_indexing tasks of a list of ReindexingChunk."""
+    return [run_indexing.si(new_index, indexer, chunk.get_ids(),
+                            chunk_id=chunk.id)
+            for chunk in chunks]
+
+
+def resume_indexing():
+    """
+    Queue the failed or lost chunks of the ongoing reindexings again, then
+    point the aliases to the new indices when they are done.
+
+    The reindexings with chunks that are still pending and not lost (see
+    ReindexingChunk.is_lost()) are left alone, their chunks may still be
+    running.
+    """
+    indexers = dict((alias, indexer) for alias, indexer, size in INDEXES)
+    indices = (ReindexingChunk.objects.order_by('alias')
+               .values_list('alias', 'old_index', 'new_index').distinct())
+    if not indices:
+        raise CommandError('No reindexing to resume.')
+
+    for alias, old_index, new_index in indices:
+        if alias not in indexers:
+            continue
+        indexer = indexers[alias]
+        chunks = list(ReindexingChunk.objects.filter(new_index=new_index)
+                      .exclude(status=ReindexingChunk.STATUS_DONE)
+                      .order_by('id'))
+        running = [c for c in chunks
+                   if c.status == ReindexingChunk.STATUS_PENDING and
+                   not c.is_lost()]
+        if running:
+            _print('{n} chunks of {index} may still be running, not resuming '
+                   'it.'.format(n=len(running), index=new_index), alias)
+            continue
+        post_task = post_index_task(new_index, old_index, alias, indexer)
+        if not chunks:
+            _print('All chunks done, finishing the reindexation.', alias)
+            post_task.apply_async()
+            continue
+
+        _print('Resuming {n} chunks of {index}.'.format(n=len(chunks),
+                                                         index=new_index),
+               alias)
+        ReindexingChunk.objects.filter(id__in=[c.id for c in chunks]).update(
+            status=ReindexingChunk.STATUS_PENDING, heartbeat=timezone.now())
+        chord(header=index_tasks(new_index, indexer, chunks),
+              body=post_task).apply_async()
+
+
+def parse_since(value):
+    """Parse the `--since` option, either a date or a date and time."""
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise CommandError('Invalid --since value %r, expected YYYY-MM-DD or '
+                       '"YYYY-MM-DD HH:MM:SS".' % value)
+
+
 class Command(BaseCommand):
     help = 'Reindex all ES indexes'
     option_list = BaseCommand.option_list + (
@@ -176,6 +322,18 @@ class Command(BaseCommand):
                     help=('Bypass the database flag that says '
                           'another indexation is ongoing'),
                     default=False),
+        make_option('--incremental', action='store_true',
+                    help=('Copy the live index and only reindex the objects '
+                          'modified since the last reindexing'),
+                    default=False),
+        make_option('--since', action='store',
+                    help=('Copy the live index and only reindex the objects '
+                          'modified since that date (YYYY-MM-DD)'),
+                    default=None),
+        make_option('--resume', action='store_true',
+                    help=('Queue the failed or lost chunks of the ongoing '
+                          'reindexing again'),
+                    default=False),
     )
 
     def handle(self, *args, **kwargs):
@@ -189,11 +347,21 @@ class Command(BaseCommand):
         index_choice = kwargs.get('index', None)
         prefix = kwargs.get('prefix', '')
         force = kwargs.get('force', False)
+        incremental = kwargs.get('incremental', False)
+        since = kwargs.get('since', None)
+        if since:
+            since = parse_since(since)
+            incremental = True
 
         if index_choice:
             # If we only want to reindex a subset of indexes.
             INDEXES = INDEX_DICT.get(index_choice, INDEXES)
 
+        if kwargs.get('resume', False):
+            resume_indexing()
+            _print('Remaining indexing tasks all queued up.')
+            return
+
         if Reindexing.is_reindexing() and not force:
             raise CommandError('Indexation already occuring - use --force to '
                                'bypass')
@@ -202,7 +370,24 @@ class Command(BaseCommand):
 
         for ALIAS, INDEXER, CHUNK_SIZE in INDEXES:
 
-            chunks, total = chunk_indexing(INDEXER, CHUNK_SIZE)
+            # Get the old index if it exists.
+            try:
+                aliases = ES.indices.get_alias(name=ALIAS).keys()
+            except elasticsearch.NotFoundError:
+                aliases = []
+            old_index = aliases[0] if aliases else None
+
+            alias_since = None
+            if incremental:
+                alias_since = since or Reindexing.get_watermark(ALIAS)
+                if not old_index or not alias_since:
+                    # Nothing to copy from, fall back to a full reindexing.
+                    _print('No previous index to copy, reindexing all items.',
+                           ALIAS)
+                    alias_since = None
+
+            chunks, total = chunk_indexing(INDEXER, CHUNK_SIZE,
+                                           since=alias_since)
             if not total:
                 _print('No items to queue.', ALIAS)
             else:
@@ -211,29 +396,12 @@ class Command(BaseCommand):
                        .format(total=total, n=total_chunks, size=CHUNK_SIZE),
                        ALIAS)
 
-            # Get the old index if it exists.
-            try:
-                aliases = ES.indices.get_alias(name=ALIAS).keys()
-            except elasticsearch.NotFoundError:
-                aliases = []
-            old_index = aliases[0] if aliases else None
-
             # Create a new index, using the index name with a timestamp.
             new_index = timestamp_index(prefix + ALIAS)
 
             # See how the index is currently configured.
-            if old_index:
-                try:
-                    s = (ES.indices.get_settings(index=old_index).get(
-                        old_index, {}).get('settings', {}))
-                except elasticsearch.NotFoundError:
-                    s = {}
-            else:
-                s = {}
-            num_replicas = s.get('number_of_replicas',
-                                 settings.ES_DEFAULT_NUM_REPLICAS)
-            num_shards = s.get('number_of_shards',
-                               settings.ES_DEFAULT_NUM_SHARDS)
+            num_shards = get_index_settings(old_index).get(
+                'number_of_shards', settings.ES_DEFAULT_NUM_SHARDS)
 
             pre_task = pre_index.si(new_index, old_index, ALIAS, INDEXER, {
                 'analysis': INDEXER.get_analysis(),
@@ -242,18 +410,23 @@ class Command(BaseCommand):
                 'store.compress.tv': True,
                 'store.compress.stored': True,
                 'refresh_interval': '-1'})
-            post_task = post_index.si(new_index, old_index, ALIAS, INDEXER, {
-                'number_of_replicas': num_replicas,
-                'refresh_interval': '5s'})
+            post_task = post_index_task(new_index, old_index, ALIAS, INDEXER)
+            pre_tasks = [pre_task]
+            if alias_since:
+                _print('Copying {index} and reindexing items modified since '
+                       '{since}.'.format(index=old_index, since=alias_since),
+                       ALIAS)
+                pre_tasks.append(copy_index.si(new_index, old_index, ALIAS))
 
             # Ship it.
             if not total:
                 # If there's no data we still create the index and alias.
-                chain(pre_task, post_task).apply_async()
+                chain(*(pre_tasks + [post_task])).apply_async()
             else:
-                index_tasks = [run_indexing.si(new_index, INDEXER, chunk)
-                               for chunk in chunks]
-                chain(pre_task,
-                      chord(header=index_tasks, body=post_task)).apply_async()
+                chunks = ReindexingChunk.create_chunks(ALIAS, old_index,
+                                                       new_index, chunks)
+                chain(*(pre_tasks + [
+                    chord(header=index_tasks(new_index, INDEXER, chunks),
+                          body=post_task)])).apply_async()
 
         _print('New index and indexing tasks all queued up.')
@@ -0,0 +1,45 @@
+"""
+Reports the progress of the ongoing reindexings.
+
+Call like:
+
+    ./manage.py reindex_progress
+
+"""
+from django.core.management.base import BaseCommand
+
+from lib.es.models import ReindexingChunk
+
+
+def format_timedelta(delta):
+    if delta is None:
+        return 'unknown'
+    # timedelta.total_seconds() is not present in 2.6.
+    minutes, seconds = divmod(delta.days * 86400 + delta.seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%d:%02d:%02d' % (hours, minutes, seconds)
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def handle(self, *args, **kw):
+        progress = ReindexingChunk.progress()
+        if not progress:
+            self.stdout.write('No reindexing in progress.')
+            return
+
+        for p in progress:
+            percent = 100.0 * p['done'] / p['total'] if p['total'] else 100
+            self.stdout.write(
+                '[alias:{alias}] {new_index}: {done}/{total} items '
+                '({percent:.1f}%), {chunks_done}/{chunks} chunks done, '
+                '{chunks_failed} failed. Elapsed: {elapsed}, ETA: {eta}.'
+                .format(percent=percent,
+                        elapsed=format_timedelta(p['elapsed']),
+                        eta=format_timedelta(p['eta']),
+                        **dict((k, v) for k, v in p.items()
+                               if k not in ('elapsed', 'eta'))))
+            if p['chunks_failed']:
+                self.stdout.write('  Use `./manage.py reindex --resume` to '
+                                  'index the failed chunks again.')
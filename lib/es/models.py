@@ -1,3 +1,6 @@
+import datetime
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
@@ -30,9 +33,12 @@ class Reindexing(models.Model):
     def unflag_reindexing(cls, alias=None):
         """Mark down that we are done reindexing"""
         qs = cls.objects.all()
+        chunks = ReindexingChunk.objects.all()
         if alias:
             qs = qs.filter(alias=alias)
+            chunks = chunks.filter(alias=alias)
         qs.delete()
+        chunks.delete()
 
     @classmethod
     def get_indices(cls, alias):
@@ -47,3 +53,141 @@ class Reindexing(models.Model):
                     if idx is not None]
         except Reindexing.DoesNotExist:
             return [alias]
+
+    @classmethod
+    def get_watermark(cls, alias):
+        """
+        Return the date from which the documents in `alias` are known to be
+        up-to-date, or None if the alias was never fully indexed.
+        """
+        try:
+            return ReindexingWatermark.objects.get(alias=alias).indexed_date
+        except ReindexingWatermark.DoesNotExist:
+            return None
+
+    @classmethod
+    def set_watermark(cls, alias, date=None):
+        """
+        Record the date from which the documents in `alias` are up-to-date.
+
+        Defaults to the start date of the ongoing reindexing for that alias,
+        since anything modified after that was indexed on both indices.
+        """
+        if date is None:
+            dates = cls.objects.filter(alias=alias).values_list('start_date',
+                                                                flat=True)
+            date = dates[0] if dates else timezone.now()
+        watermark, created = ReindexingWatermark.objects.get_or_create(
+            alias=alias, defaults={'indexed_date': date})
+        if not created:
+            watermark.indexed_date = date
+            watermark.save()
+        return watermark
+
+
+class ReindexingWatermark(models.Model):
+    """
+    Used to remember when an alias was last reindexed, so that an incremental
+    reindexing only has to re-extract the objects modified since then.
+    """
+    alias = models.CharField(max_length=255, unique=True)
+    indexed_date = models.DateTimeField()
+
+    class Meta:
+        db_table = 'zadmin_reindexing_watermark'
+
+
+class ReindexingChunk(models.Model):
+    """
+    Used to track the state of each chunk of objects queued by a reindexing,
+    so that a failed or interrupted reindexing can be resumed and its
+    progress reported.
+    """
+    STATUS_PENDING = 0
+    STATUS_DONE = 1
+    STATUS_FAILED = 2
+
+    alias = models.CharField(max_length=255)
+    old_index = models.CharField(max_length=255, null=True)
+    new_index = models.CharField(max_length=255)
+    # Comma separated ids of the objects to index.
+    ids = models.TextField()
+    size = models.PositiveIntegerField()
+    status = models.PositiveSmallIntegerField(default=STATUS_PENDING)
+    start_date = models.DateTimeField(default=timezone.now)
+    end_date = models.DateTimeField(null=True)
+    # When the chunk was last queued or its task started running.
+    heartbeat = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'zadmin_reindexing_chunk'
+
+    def get_ids(self):
+        return [int(id_) for id_ in self.ids.split(',') if id_]
+
+    def is_lost(self):
+        """
+        Return True if the chunk is pending but its task is known to be
+        dead: it hasn't started nor finished for ES_REINDEX_CHUNK_TIMEOUT
+        seconds since it was queued or started.
+        """
+        timeout = datetime.timedelta(seconds=settings.ES_REINDEX_CHUNK_TIMEOUT)
+        return (self.status == self.STATUS_PENDING and
+                self.heartbeat < timezone.now() - timeout)
+
+    @classmethod
+    def create_chunks(cls, alias, old_index, new_index, chunks):
+        """Record the chunks of ids queued for indexing into `new_index`."""
+        cls.objects.bulk_create([
+            cls(alias=alias, old_index=old_index, new_index=new_index,
+                ids=','.join(str(id_) for id_ in chunk), size=len(chunk))
+            for chunk in chunks])
+        return list(cls.objects.filter(new_index=new_index).order_by('id'))
+
+    @classmethod
+    def set_heartbeat(cls, pk):
+        cls.objects.filter(pk=pk).update(heartbeat=timezone.now())
+
+    @classmethod
+    def set_status(cls, pk, status):
+        cls.objects.filter(pk=pk).update(status=status,
+                                         end_date=timezone.now())
+
+    @classmethod
+    def progress(cls):
+        """
+        Return a list of dicts describing the progress of every ongoing
+        reindexing, with the number of chunks and items done, failed and
+        remaining, and the estimated time left (a timedelta, or None until a
+        chunk is done).
+        """
+        now = timezone.now()
+        progress = []
+        indices = (cls.objects.order_by('alias')
+                   .values_list('alias', 'new_index').distinct())
+        for alias, new_index in indices:
+            chunks = list(cls.objects.filter(new_index=new_index)
+                          .values_list('status', 'size', 'start_date'))
+            done = [size for status, size, _ in chunks
+                    if status == cls.STATUS_DONE]
+            failed = [size for status, size, _ in chunks
+                      if status == cls.STATUS_FAILED]
+            total = sum(size for _, size, _ in chunks)
+            elapsed = now - min(start for _, _, start in chunks)
+            remaining = total - sum(done) - sum(failed)
+            eta = None
+            if done:
+                eta = elapsed * remaining / sum(done)
+            progress.append({
+                'alias': alias,
+                'new_index': new_index,
+                'chunks': len(chunks),
+                'chunks_done': len(done),
+                'chunks_failed': len(failed),
+                'total': total,
+                'done': sum(done),
+                'failed': sum(failed),
+                'elapsed': elapsed,
+                'eta': eta,
+            })
+        return progress
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+import mock
+from nose.tools import eq_, ok_
+
+import amo.tests
+from lib.es.management.commands import reindex
+from lib.es.management.commands.reindex import (copy_index, resume_indexing,
+                                                run_indexing)
+from lib.es.models import ReindexingChunk
+from mkt.webapps.indexers import WebappIndexer
+
+
+class TestCopyIndex(amo.tests.ESTestCase):
+
+    def setUp(self):
+        super(TestCopyIndex, self).setUp()
+        self.apps = [amo.tests.app_factory(), amo.tests.app_factory()]
+        self.refresh('webapp')
+        self.alias = settings.ES_INDEXES['webapp']
+        self.new_index = self.alias + '_copy'
+        self.es.indices.create(index=self.new_index,
+                               body={'mappings': WebappIndexer.get_mapping()})
+        self.addCleanup(self.es.indices.delete, index=self.new_index)
+
+    def get_name(self, app):
+        doc = self.es.get(index=self.new_index, id=app.id,
+                          doc_type=WebappIndexer.get_mapping_type_name())
+        return doc['_source']['name']
+
+    def test_copy(self):
+        copy_index(self.new_index, self.alias, self.alias)
+        self.es.indices.refresh(index=self.new_index)
+        eq_(self.es.count(index=self.new_index)['count'], 2)
+        eq_(self.get_name(self.apps[0]),
+            WebappIndexer.extract_document(self.apps[0].id)['name'])
+
+    def test_modified_during_copy(self):
+        # The app is modified and written to the new index during the copy.
+        app = self.apps[0]
+        doc = WebappIndexer.extract_document(app.id)
+        doc['name'] = ['Modified']
+        self.es.index(index=self.new_index, id=app.id, body=doc,
+                      doc_type=WebappIndexer.get_mapping_type_name())
+        copy_index(self.new_index, self.alias, self.alias)
+        self.es.indices.refresh(index=self.new_index)
+        eq_(self.es.count(index=self.new_index)['count'], 2)
+        eq_(self.get_name(app), ['Modified'])
+        eq_(self.get_name(self.apps[1]),
+            WebappIndexer.extract_document(self.apps[1].id)['name'])
+
+
+class TestRunIndexing(amo.tests.TestCase):
+
+    def setUp(self):
+        self.chunk, = ReindexingChunk.create_chunks('foo', 'bar', 'baz',
+                                                    [[1, 2]])
+        self.an_hour_ago = datetime.now() - timedelta(hours=1)
+        ReindexingChunk.objects.update(heartbeat=self.an_hour_ago)
+        self.indexer = mock.Mock()
+
+    def get_chunk(self):
+        return ReindexingChunk.objects.get(pk=self.chunk.pk)
+
+    def test_done(self):
+        run_indexing('baz', self.indexer, [1, 2], chunk_id=self.chunk.pk)
+        self.indexer.run_indexing.assert_called_with([1, 2], reindex.ES,
+                                                     index='baz')
+        chunk = self.get_chunk()
+        eq_(chunk.status, ReindexingChunk.STATUS_DONE)
+        ok_(chunk.heartbeat > self.an_hour_ago)
+        ok_(chunk.end_date)
+
+    def test_failed(self):
+        self.indexer.run_indexing.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            run_indexing('baz', self.indexer, [1, 2], chunk_id=self.chunk.pk)
+        chunk = self.get_chunk()
+        eq_(chunk.status, ReindexingChunk.STATUS_FAILED)
+        ok_(chunk.heartbeat > self.an_hour_ago)
+
+
+@mock.patch('lib.es.management.commands.reindex.post_index_task')
+@mock.patch('lib.es.management.commands.reindex.chord')
+class TestResumeIndexing(amo.tests.TestCase):
+
+    def setUp(self):
+        self.alias, self.indexer, _ = reindex.INDEXES[0]
+        self.chunks = ReindexingChunk.create_chunks(
+            self.alias, 'old', 'new', [[1, 2], [3], [4]])
+        ReindexingChunk.set_status(self.chunks[0].pk,
+                                   ReindexingChunk.STATUS_DONE)
+        ReindexingChunk.set_status(self.chunks[1].pk,
+                                   ReindexingChunk.STATUS_FAILED)
+
+    def lose(self, chunk):
+        ReindexingChunk.objects.filter(pk=chunk.pk).update(
+            heartbeat=datetime.now() - timedelta(hours=2))
+
+    def queued_ids(self, chord):
+        return [task.args[2] for task in chord.call_args[1]['header']]
+
+    def test_nothing_to_resume(self, chord, post_index_task):
+        ReindexingChunk.objects.all().delete()
+        with self.assertRaises(CommandError):
+            resume_indexing()
+
+    def test_running(self, chord, post_index_task):
+        # The pending chunk may still be running.
+        resume_indexing()
+        ok_(not chord.called)
+        ok_(not post_index_task.called)
+        eq_(ReindexingChunk.objects.get(pk=self.chunks[1].pk).status,
+            ReindexingChunk.STATUS_FAILED)
+
+    def test_failed_and_lost(self, chord, post_index_task):
+        self.lose(self.chunks[2])
+        resume_indexing()
+        eq_(self.queued_ids(chord), [[3], [4]])
+        eq_(chord.call_args[1]['body'], post_index_task.return_value)
+        ok_(chord.return_value.apply_async.called)
+        post_index_task.assert_called_with('new', 'old', self.alias,
+                                           self.indexer)
+        for chunk in ReindexingChunk.objects.filter(
+                pk__in=[self.chunks[1].pk, self.chunks[2].pk]):
+            eq_(chunk.status, ReindexingChunk.STATUS_PENDING)
+            ok_(not chunk.is_lost())
+
+    def test_all_done(self, chord, post_index_task):
+        ReindexingChunk.objects.update(status=ReindexingChunk.STATUS_DONE)
+        resume_indexing()
+        ok_(not chord.called)
+        ok_(post_index_task.return_value.apply_async.called)
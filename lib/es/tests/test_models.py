@@ -1,7 +1,9 @@
-from nose.tools import eq_
+from datetime import datetime, timedelta
+
+from nose.tools import eq_, ok_
 
 import amo.tests
-from lib.es.models import Reindexing
+from lib.es.models import Reindexing, ReindexingChunk, ReindexingWatermark
 
 
 class TestReindexing(amo.tests.TestCase):
@@ -61,3 +63,85 @@ class TestReindexing(amo.tests.TestCase):
 
         # Doesn't clash on other aliases.
         self.assertSetEqual(Reindexing.get_indices('other'), ['other'])
+
+    def test_watermark(self):
+        eq_(Reindexing.get_watermark('foo'), None)
+
+        date = datetime(2014, 1, 1)
+        Reindexing.set_watermark('foo', date)
+        eq_(Reindexing.get_watermark('foo'), date)
+
+        # Setting it again updates the existing watermark.
+        date = datetime(2014, 2, 1)
+        Reindexing.set_watermark('foo', date)
+        eq_(Reindexing.get_watermark('foo'), date)
+        eq_(ReindexingWatermark.objects.filter(alias='foo').count(), 1)
+
+        # Doesn't clash on other aliases.
+        eq_(Reindexing.get_watermark('other'), None)
+
+    def test_watermark_defaults_to_start_date(self):
+        reindex = Reindexing.objects.create(alias='foo', new_index='bar',
+                                            old_index='baz')
+        Reindexing.set_watermark('foo')
+        eq_(Reindexing.get_watermark('foo'), reindex.start_date)
+
+
+class TestReindexingChunk(amo.tests.TestCase):
+
+    def create_chunks(self):
+        return ReindexingChunk.create_chunks('foo', 'bar', 'baz',
+                                             [[1, 2, 3], [4, 5], [6]])
+
+    def test_create_chunks(self):
+        chunks = self.create_chunks()
+        eq_([c.get_ids() for c in chunks], [[1, 2, 3], [4, 5], [6]])
+        eq_([c.size for c in chunks], [3, 2, 1])
+        eq_(set(c.status for c in chunks),
+            set([ReindexingChunk.STATUS_PENDING]))
+
+    def test_set_status(self):
+        chunk = self.create_chunks()[0]
+        ReindexingChunk.set_status(chunk.pk, ReindexingChunk.STATUS_DONE)
+        chunk = ReindexingChunk.objects.get(pk=chunk.pk)
+        eq_(chunk.status, ReindexingChunk.STATUS_DONE)
+        assert chunk.end_date
+
+    def test_is_lost(self):
+        chunks = self.create_chunks()
+        ok_(not any(c.is_lost() for c in chunks))
+
+        an_hour_ago = datetime.now() - timedelta(hours=1, minutes=1)
+        ReindexingChunk.objects.update(heartbeat=an_hour_ago)
+        ReindexingChunk.set_status(chunks[0].pk, ReindexingChunk.STATUS_DONE)
+        ReindexingChunk.set_heartbeat(chunks[1].pk)
+        chunks = list(ReindexingChunk.objects.order_by('id'))
+        eq_([c.is_lost() for c in chunks], [False, False, True])
+
+    def test_progress(self):
+        eq_(ReindexingChunk.progress(), [])
+
+        chunks = self.create_chunks()
+        ReindexingChunk.objects.update(
+            start_date=datetime.now() - timedelta(minutes=3))
+        ReindexingChunk.set_status(chunks[0].pk, ReindexingChunk.STATUS_DONE)
+        ReindexingChunk.set_status(chunks[1].pk,
+                                   ReindexingChunk.STATUS_FAILED)
+
+        progress, = ReindexingChunk.progress()
+        eq_(progress['alias'], 'foo')
+        eq_(progress['new_index'], 'baz')
+        eq_(progress['chunks'], 3)
+        eq_(progress['chunks_done'], 1)
+        eq_(progress['chunks_failed'], 1)
+        eq_((progress['total'], progress['done'], progress['failed']),
+            (6, 3, 2))
+        # 3 items done in 3 minutes, 1 item left.
+        eq_(progress['eta'].days * 86400 + progress['eta'].seconds, 60)
+
+    def test_unflag_reindexing(self):
+        self.create_chunks()
+        ReindexingChunk.create_chunks('other', 'bar', 'qux', [[1]])
+        Reindexing.unflag_reindexing(alias='foo')
+        eq_(list(ReindexingChunk.objects.values_list('alias', flat=True)),
+            ['other'])
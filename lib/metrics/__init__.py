@@ -1,6 +1,9 @@
+import datetime
+import hashlib
 import threading
 
 from django.conf import settings
+from django.core.cache import cache
 
 import commonware.log
 
@@ -9,6 +12,12 @@ from mkt.monolith import record_stat
 
 log = commonware.log.getLogger('z.metrics')
 
+# Each thread keeps its own Monolith client, so that the HTTP connections of
+# its session are kept alive and reused between requests.
+_locals = threading.local()
+# Bumped by `reset_monolith_clients` to have every thread create a new client.
+_generation = [0]
+
 
 def record_action(action, request, data=None):
     """Records the given action by sending it to the metrics servers.
@@ -30,18 +39,93 @@ def record_action(action, request, data=None):
     record_stat(action, request, **data)
 
 
-def get_monolith_client():
-    _locals = threading.local()
-    if not hasattr(_locals, 'monolith'):
-        server = getattr(settings, 'MONOLITH_SERVER', None)
-        index = getattr(settings, 'MONOLITH_INDEX', 'time_*')
-        if server is None:
-            raise ValueError('You need to configure MONOLITH_SERVER')
+class CachedMonolithClient(object):
+    """
+    Wraps a Monolith client, caching the time series it returns.
+
+    Series ending before yesterday no longer change, they are cached for
+    `MONOLITH_CLOSED_CACHE_TIMEOUT` seconds. The others are still being filled
+    in and are only cached for `MONOLITH_CACHE_TIMEOUT` seconds. Raw queries
+    are not cached.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def raw(self, query):
+        return self.client.raw(query)
+
+    def cache_key(self, field, start, end, interval, terms):
+        key = repr((field, str(start), str(end), str(interval),
+                    sorted(terms.items())))
+        return 'monolith:%s' % hashlib.md5(key).hexdigest()
+
+    def cache_timeout(self, end):
+        if isinstance(end, basestring):
+            end = datetime.datetime.strptime(end[:10], '%Y-%m-%d').date()
+        elif isinstance(end, datetime.datetime):
+            end = end.date()
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        if end < yesterday:
+            return settings.MONOLITH_CLOSED_CACHE_TIMEOUT
+        return settings.MONOLITH_CACHE_TIMEOUT
+
+    def __call__(self, field, start, end, interval='day', **terms):
+        key = self.cache_key(field, start, end, interval, terms)
+        data = cache.get(key)
+        if data is None:
+            data = list(self.client(field, start, end, interval, **terms))
+            cache.set(key, data, self.cache_timeout(end))
+        return data
+
+
+def _set_default_timeout(session, timeout):
+    """
+    Makes the requests of a `requests` session time out after `timeout`
+    seconds, unless given another timeout.
+    """
+    request = session.request
+
+    def request_with_timeout(method, url, **kwargs):
+        kwargs.setdefault('timeout', timeout)
+        return request(method, url, **kwargs)
 
-        statsd = {'statsd.host': getattr(settings, 'STATSD_HOST', 'localhost'),
-                  'statsd.port': getattr(settings, 'STATSD_PORT', 8125)}
+    session.request = request_with_timeout
 
+
+def reset_monolith_clients():
+    """
+    Makes every thread, including the ones of a pool, create a new Monolith
+    client on their next `get_monolith_client` call. Used by the tests when
+    they mock the client class.
+    """
+    _generation[0] += 1
+
+
+def get_monolith_client():
+    """
+    Returns the Monolith client of the current thread, creating it on the
+    first call.
+    """
+    server = getattr(settings, 'MONOLITH_SERVER', None)
+    index = getattr(settings, 'MONOLITH_INDEX', 'time_*')
+    if server is None:
+        raise ValueError('You need to configure MONOLITH_SERVER')
+    statsd = {'statsd.host': getattr(settings, 'STATSD_HOST', 'localhost'),
+              'statsd.port': getattr(settings, 'STATSD_PORT', 8125)}
+
+    # A new client is needed when the settings change.
+    key = (server, index, sorted(statsd.items()), settings.MONOLITH_TIMEOUT,
+           _generation[0])
+    if getattr(_locals, 'monolith_key', None) != key:
         from monolith.client import Client as MonolithClient
-        _locals.monolith = MonolithClient(server, index, **statsd)
+
+        client = MonolithClient(server, index, **statsd)
+        # The client doesn't take a timeout, set it on its session so that
+        # a slow Monolith doesn't hold the threads requesting it forever.
+        if getattr(client, 'session', None) is not None:
+            _set_default_timeout(client.session, settings.MONOLITH_TIMEOUT)
+        _locals.monolith = CachedMonolithClient(client)
+        _locals.monolith_key = key
 
     return _locals.monolith
@@ -1,8 +1,14 @@
 # -*- coding: utf8 -*-
+import datetime
+
+from django.conf import settings
+
 import mock
+from nose.tools import eq_
 
 import amo.tests
-from lib.metrics import record_action
+from lib.metrics import (get_monolith_client, record_action,
+                         reset_monolith_clients)
 
 
 class TestMetrics(amo.tests.TestCase):
@@ -16,3 +22,67 @@ class TestMetrics(amo.tests.TestCase):
         record_action('install', request, {})
         record_stat.assert_called_with('install', request,
             **{'locale': 'en', 'src': 'foo', 'user-agent': 'py'})
+
+
+@mock.patch.object(settings, 'MONOLITH_SERVER', 'http://0.0.0.0:0')
+@mock.patch('monolith.client.Client')
+class TestMonolithClient(amo.tests.TestCase):
+
+    def setUp(self):
+        reset_monolith_clients()
+
+    def test_no_server(self, client):
+        with self.settings(MONOLITH_SERVER=None):
+            with self.assertRaises(ValueError):
+                get_monolith_client()
+
+    def test_reused(self, client):
+        eq_(get_monolith_client(), get_monolith_client())
+        eq_(client.call_count, 1)
+
+    def test_new_server(self, client):
+        get_monolith_client()
+        with self.settings(MONOLITH_SERVER='http://0.0.0.0:1'):
+            get_monolith_client()
+        eq_(client.call_count, 2)
+
+    def test_raw(self, client):
+        client.return_value.raw.return_value = {'facets': {}}
+        eq_(get_monolith_client().raw({}), {'facets': {}})
+        eq_(get_monolith_client().raw({}), {'facets': {}})
+        eq_(client.return_value.raw.call_count, 2)
+
+    def test_cached(self, client):
+        data = [{'count': 1, 'date': '2013-10-10'}]
+        client.return_value.return_value = iter(data)
+        monolith = get_monolith_client()
+        eq_(monolith('foo', '2013-10-10', '2013-10-10', 'day', region='br'),
+            data)
+        eq_(monolith('foo', '2013-10-10', '2013-10-10', 'day', region='br'),
+            data)
+        eq_(client.return_value.call_count, 1)
+
+        client.return_value.return_value = iter([])
+        eq_(monolith('foo', '2013-10-10', '2013-10-10', 'day', region='us'),
+            [])
+        eq_(client.return_value.call_count, 2)
+
+    @mock.patch('lib.metrics.cache')
+    def test_cache_timeout(self, cache, client):
+        cache.get.return_value = None
+        client.return_value.return_value = []
+        monolith = get_monolith_client()
+        monolith('foo', '2013-10-10', '2013-10-11', 'day')
+        eq_(cache.set.call_args[0][2], settings.MONOLITH_CLOSED_CACHE_TIMEOUT)
+        monolith('foo', '2013-10-10', datetime.date.today(), 'day')
+        eq_(cache.set.call_args[0][2], settings.MONOLITH_CACHE_TIMEOUT)
+
+    def test_timeout(self, client):
+        session = client.return_value.session
+        request = session.request
+        get_monolith_client()
+        session.request('POST', 'http://0.0.0.0:0/es', data='{}')
+        request.assert_called_with('POST', 'http://0.0.0.0:0/es', data='{}',
+                                   timeout=settings.MONOLITH_TIMEOUT)
+        session.request('GET', 'http://0.0.0.0:0/', timeout=1)
+        request.assert_called_with('GET', 'http://0.0.0.0:0/', timeout=1)
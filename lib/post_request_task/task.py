@@ -1,12 +1,16 @@
+import atexit
 import threading
+import time
 from functools import partial
 
-from django.core.signals import got_request_exception, request_finished
+from django.conf import settings
+from django.core.signals import (got_request_exception, request_finished,
+                                 request_started)
 
 import commonware.log
 from celery import task as base_task
 from celery import Task
-from celery.signals import task_postrun
+from celery.signals import task_postrun, task_prerun
 
 
 log = commonware.log.getLogger('z.post_request_task')
@@ -20,17 +24,70 @@ def _get_task_queue():
     return _locals.__dict__.setdefault('task_queue', [])
 
 
+def _chunk_task(t):
+    """Splits a coalesced task call into calls of at most `chunk_size` ids."""
+    cls, args, kwargs = t
+    if not (cls.coalesce and args and args[0]):
+        return [t]
+    ids, rest = list(args[0][0]), tuple(args[0][1:])
+    size = cls.chunk_size or settings.POST_REQUEST_TASK_CHUNK_SIZE
+    return [(cls, ((ids[i:i + size],) + rest,) + tuple(args[1:]), kwargs)
+            for i in range(0, len(ids), size)]
+
+
 def _send_tasks(**kwargs):
     """Sends all delayed Celery tasks."""
     queue = _get_task_queue()
+    _locals.queued_at = None
     while queue:
-        cls, args, kwargs = queue.pop(0)
-        cls.original_apply_async(*args, **kwargs)
+        for cls, args, kwargs in _chunk_task(queue.pop(0)):
+            cls.original_apply_async(*args, **kwargs)
+
+
+def _send_tasks_at_exit():
+    """
+    Sends the tasks still queued when the process exits, e.g. the tail of
+    the tasks of a cron job or management command, unless a request or task
+    was interrupted.
+    """
+    if not getattr(_locals, 'depth', 0):
+        _send_tasks()
 
 
 def _discard_tasks(**kwargs):
     """Discards all delayed Celery tasks."""
     _get_task_queue()[:] = []
+    _locals.queued_at = None
+
+
+def _start_request(**kwargs):
+    """Holds the tasks back until the request or task is finished."""
+    _locals.depth = getattr(_locals, 'depth', 0) + 1
+
+
+def _finish_request(**kwargs):
+    _locals.depth = max(getattr(_locals, 'depth', 0) - 1, 0)
+
+
+def _coalesce_task(queue, t):
+    """Merges the ids of `t` into a queued call to the same task.
+
+    Returns True if a queued call with the same other arguments was found.
+
+    """
+    cls, args, kwargs = t
+    ids, rest = args[0][0], tuple(args[0][1:])
+    for i, (q_cls, q_args, q_kwargs) in enumerate(queue):
+        if (q_cls is not cls or not q_args or not q_args[0] or
+                q_kwargs != kwargs or q_args[1:] != args[1:] or
+                tuple(q_args[0][1:]) != rest):
+            continue
+        q_ids = list(q_args[0][0])
+        seen = set(q_ids)
+        q_ids.extend(id_ for id_ in ids if id_ not in seen)
+        queue[i] = (cls, ((q_ids,) + rest,) + tuple(args[1:]), kwargs)
+        return True
+    return False
 
 
 def _append_task(t):
@@ -39,14 +96,33 @@ def _append_task(t):
     Expected argument is a tuple of the (task class, args, kwargs).
 
     This doesn't append to queue if the argument is already in the queue.
+    Calls to tasks created with `coalesce=True` are merged into the queued
+    call with the same other arguments, their list of ids are unioned.
+
+    Outside of the request-response cycle and of tasks (e.g. in cron jobs
+    and management commands), the queue is sent once it has been filling up
+    for more than `POST_REQUEST_TASK_FLUSH_INTERVAL` seconds, and what is
+    left of it when the process exits.
 
     """
     queue = _get_task_queue()
-    if t not in queue:
+    cls, args, kwargs = t
+    if cls.coalesce and args and args[0] and _coalesce_task(queue, t):
+        log.debug('Coalesced task: %s' % (t,))
+    elif t not in queue:
         queue.append(t)
     else:
         log.debug('Removed duplicate task: %s' % (t,))
 
+    if getattr(_locals, 'depth', 0):
+        return
+    now = time.time()
+    queued_at = getattr(_locals, 'queued_at', None)
+    if queued_at is None:
+        _locals.queued_at = now
+    elif now - queued_at >= settings.POST_REQUEST_TASK_FLUSH_INTERVAL:
+        _send_tasks()
+
 
 class PostRequestTask(Task):
     """A task whose execution is delayed until after the request finishes.
@@ -56,6 +132,11 @@ class PostRequestTask(Task):
 
     """
     abstract = True
+    # Set `coalesce=True` in the task decorator for tasks taking a list of ids
+    # as their first argument, to merge their calls in one call per chunk of
+    # `chunk_size` ids (defaults to `POST_REQUEST_TASK_CHUNK_SIZE`).
+    coalesce = False
+    chunk_size = None
 
     def original_apply_async(self, *args, **kwargs):
         return super(PostRequestTask, self).apply_async(*args, **kwargs)
@@ -69,6 +150,13 @@ task = partial(base_task, base=PostRequestTask)
 
 
 # Hook the signal handlers up.
+# Hold the tasks back while a request or a task is running.
+request_started.connect(_start_request,
+                        dispatch_uid='request_started_tasks')
+task_prerun.connect(_start_request, dispatch_uid='tasks_started_tasks')
+request_finished.connect(_finish_request,
+                         dispatch_uid='request_finished_flag')
+task_postrun.connect(_finish_request, dispatch_uid='tasks_finished_flag')
 # Send the tasks to celery when the request is finished.
 request_finished.connect(_send_tasks,
                          dispatch_uid='request_finished_tasks')
@@ -76,6 +164,10 @@ request_finished.connect(_send_tasks,
 # cycle, when a task calls another task).
 task_postrun.connect(_send_tasks, dispatch_uid='tasks_finished_tasks')
 
+# Send the tasks queued outside of requests and tasks that are left when the
+# process exits.
+atexit.register(_send_tasks_at_exit)
+
 # And make sure to discard the task queue when we have an exception in the
 # request-response cycle.
 got_request_exception.connect(_discard_tasks,
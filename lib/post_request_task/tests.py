@@ -1,11 +1,13 @@
-from django.core.signals import request_finished
+from django.core.signals import request_finished, request_started
 from django.test import TestCase
 
 from celery.signals import task_postrun
 from mock import Mock, patch
 from nose.tools import eq_
 
-from lib.post_request_task.task import task, _get_task_queue, _discard_tasks
+from lib.post_request_task.task import (task, _get_task_queue,
+                                        _discard_tasks, _send_tasks,
+                                        _send_tasks_at_exit)
 
 
 task_mock = Mock()
@@ -16,6 +18,11 @@ def test_task():
     task_mock()
 
 
+@task(coalesce=True, chunk_size=3)
+def test_ids_task(ids, name):
+    task_mock(ids, name)
+
+
 class TestTask(TestCase):
 
     def tearDown(self):
@@ -87,3 +94,66 @@ class TestTask(TestCase):
             test_task.delay()
 
         self._verify_task_filled()
+
+    def test_coalesce(self):
+        with self.settings(CELERY_ALWAYS_EAGER=False):
+            test_ids_task.delay([1, 2], 'a')
+            test_ids_task.delay([2, 3], 'a')
+            test_ids_task.delay([4], 'b')
+        queue = _get_task_queue()
+        eq_([args for cls, args, kwargs in queue],
+            [(([1, 2, 3], 'a'), {}), (([4], 'b'), {})])
+
+    def test_coalesce_chunks(self):
+        test_ids_task.delay([1, 2], 'a')
+        test_ids_task.delay([3, 4, 5], 'a')
+        _send_tasks()
+        eq_([c[0] for c in task_mock.call_args_list],
+            [([1, 2, 3], 'a'), ([4, 5], 'a')])
+
+    def test_coalesce_chunks_set(self):
+        test_ids_task.delay(set([1, 2, 3, 4]), 'a')
+        _send_tasks()
+        eq_(sorted(sum([c[0][0] for c in task_mock.call_args_list], [])),
+            [1, 2, 3, 4])
+        eq_(task_mock.call_count, 2)
+
+    @patch('lib.post_request_task.task.time.time')
+    def test_flush_interval(self, time_mock):
+        time_mock.return_value = 1000
+        test_ids_task.delay([1], 'a')
+        assert not task_mock.called
+        time_mock.return_value = 1000 + 10
+        test_ids_task.delay([2], 'a')
+        task_mock.assert_called_with([1, 2], 'a')
+        self._verify_task_empty()
+
+    @patch('lib.post_request_task.task.time.time')
+    def test_no_flush_interval_in_request(self, time_mock):
+        request_started.send(sender=self)
+        time_mock.return_value = 1000
+        test_ids_task.delay([1], 'a')
+        time_mock.return_value = 1000 + 10
+        test_ids_task.delay([2], 'a')
+        assert not task_mock.called
+        request_finished.send(sender=self)
+        task_mock.assert_called_with([1, 2], 'a')
+
+    @patch('lib.post_request_task.task.time.time')
+    def test_flush_at_exit(self, time_mock):
+        time_mock.return_value = 1000
+        test_ids_task.delay([1], 'a')
+        assert not task_mock.called
+        # Nothing else is queued before the process exits.
+        _send_tasks_at_exit()
+        task_mock.assert_called_with([1], 'a')
+        self._verify_task_empty()
+
+    def test_no_flush_at_exit_in_request(self):
+        request_started.send(sender=self)
+        try:
+            test_ids_task.delay([1], 'a')
+            _send_tasks_at_exit()
+            assert not task_mock.called
+        finally:
+            request_finished.send(sender=self)
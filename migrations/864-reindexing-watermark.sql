@@ -0,0 +1,7 @@
+CREATE TABLE `zadmin_reindexing_watermark` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `alias` varchar(255) NOT NULL,
+  `indexed_date` datetime NOT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `alias` (`alias`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
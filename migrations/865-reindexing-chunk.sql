@@ -0,0 +1,15 @@
+CREATE TABLE `zadmin_reindexing_chunk` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `alias` varchar(255) NOT NULL,
+  `old_index` varchar(255) DEFAULT NULL,
+  `new_index` varchar(255) NOT NULL,
+  `ids` longtext NOT NULL,
+  `size` int(11) unsigned NOT NULL,
+  `status` smallint(5) unsigned NOT NULL DEFAULT 0,
+  `start_date` datetime NOT NULL,
+  `end_date` datetime DEFAULT NULL,
+  `heartbeat` datetime NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `zadmin_reindexing_chunk_new_index` (`new_index`),
+  KEY `zadmin_reindexing_chunk_alias` (`alias`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
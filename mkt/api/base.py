@@ -1,11 +1,13 @@
 import functools
 import json
 
+from django.core.paginator import InvalidPage
 from django.db.models.sql import EmptyResultSet
+from django.http import Http404
 
 import commonware.log
 from rest_framework.decorators import api_view
-from rest_framework.exceptions import ParseError
+from rest_framework.exceptions import ParseError, PermissionDenied
 from rest_framework.mixins import ListModelMixin
 from rest_framework.routers import Route, SimpleRouter
 from rest_framework.response import Response
@@ -136,14 +138,23 @@ class MarketplaceView(object):
 
     - A implementation of paginate_queryset() that goes with our custom
       pagination handler. It does tastypie-like offset pagination instead of
-      the default page mechanism.
+      the default page mechanism. Views setting `cursor_pagination` also let
+      clients paginate with a `cursor` instead, and authenticated clients
+      export all the results with `export=1` (see ESPaginator.cursor_page()).
     """
+    cursor_pagination = False
+
     def handle_exception(self, exc):
         exc._request = self.request._request
         exc._klass = self.__class__
         return super(MarketplaceView, self).handle_exception(exc)
 
     def paginate_queryset(self, queryset, page_size=None):
+        cursor_query_param = self.request.QUERY_PARAMS.get('cursor')
+        if self.cursor_pagination and cursor_query_param is not None:
+            return self.paginate_queryset_by_cursor(
+                queryset, cursor_query_param, page_size=page_size)
+
         page_query_param = self.request.QUERY_PARAMS.get(self.page_kwarg)
         offset_query_param = self.request.QUERY_PARAMS.get('offset')
 
@@ -155,6 +166,27 @@ class MarketplaceView(object):
         return super(MarketplaceView, self).paginate_queryset(queryset,
             page_size=page_size)
 
+    def paginate_queryset_by_cursor(self, queryset, cursor, page_size=None):
+        """
+        Paginate with the `cursor` query parameter instead of offsets, for
+        views with `cursor_pagination` and a paginator_class that supports it
+        (see ESPaginator.cursor_page()). An empty cursor is the first page.
+
+        The `export` mode keeps an ES scroll open between two pages, it is
+        only available to authenticated users.
+        """
+        export = bool(self.request.QUERY_PARAMS.get('export'))
+        if export and not self.request.user.is_authenticated():
+            raise PermissionDenied('Exporting requires authentication.')
+        page_size = page_size or self.get_paginate_by()
+        if not page_size:
+            return None
+        paginator = self.paginator_class(queryset, page_size)
+        try:
+            return paginator.cursor_page(cursor, export=export)
+        except InvalidPage as e:
+            raise Http404(unicode(e))
+
     def get_region_from_request(self, request):
         """
         Returns the REGION object for the passed request. If the GET param
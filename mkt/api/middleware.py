@@ -296,7 +296,7 @@ class CORSMiddleware(object):
 
         # The headers that the response will be able to access.
         response['Access-Control-Expose-Headers'] = (
-            'API-Filter, API-Status, API-Version')
+            'API-Failed-Lines, API-Filter, API-Status, API-Version')
 
         return response
 
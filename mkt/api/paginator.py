@@ -1,12 +1,84 @@
+import base64
+import json
 import urlparse
 
-from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.conf import settings
+from django.core.paginator import (EmptyPage, InvalidPage, Page,
+                                   PageNotAnInteger, Paginator)
 from django.http import QueryDict
 from django.utils.http import urlencode
 
+from elasticsearch import NotFoundError
+from elasticsearch_dsl import F
+from elasticsearch_dsl.result import Response
 from rest_framework import pagination, serializers
 
 
+def encode_cursor(offset, after=None, scroll_id=None):
+    """
+    Returns the opaque token of the page at `offset`, starting after the hit
+    with the sort values `after`, or read from the ES scroll `scroll_id` in
+    export mode, if given.
+    """
+    return base64.urlsafe_b64encode(json.dumps([offset, after, scroll_id]))
+
+
+def decode_cursor(cursor):
+    """Returns the (offset, after, scroll_id) tuple encoded in `cursor`."""
+    try:
+        offset, after, scroll_id = json.loads(
+            base64.urlsafe_b64decode(str(cursor)))
+        if after is not None and not isinstance(after, list):
+            raise ValueError
+        if scroll_id is not None and not isinstance(scroll_id, basestring):
+            raise ValueError
+        return int(offset), after, scroll_id
+    except (TypeError, ValueError):
+        raise InvalidPage('That cursor is not valid')
+
+
+def get_keyset_sort(sort):
+    """
+    Returns the list of (field, descending) tuples of the `sort` of a
+    search, or None if it sorts by score (the default), which can't be
+    filtered on.
+    """
+    fields = []
+    for key in sort:
+        if isinstance(key, dict):
+            (field, options), = key.items()
+            order = (options.get('order', 'asc') if isinstance(options, dict)
+                     else options)
+        else:
+            field, order = key, 'asc'
+        if field == '_score':
+            return None
+        fields.append((field, order == 'desc'))
+    return fields or None
+
+
+def get_after_filter(sort, after):
+    """
+    Returns the filter of the hits sorted after the hit with the sort values
+    `after`, for the `sort` returned by get_keyset_sort().
+    """
+    should = []
+    for i, (field, desc) in enumerate(sort):
+        must = [F('term', **{f: value})
+                for (f, _), value in zip(sort[:i], after)]
+        must.append(F('range', **{field: {'lt' if desc else 'gt': after[i]}}))
+        should.append(F('bool', must=must))
+    return F('bool', should=should)
+
+
+class CursorPage(Page):
+    """
+    A page of cursor paginated results. `next_cursor` is the token of the
+    next page, None if this is the last one.
+    """
+    next_cursor = None
+
+
 class ESPaginator(Paginator):
     """
     A better paginator for search results
@@ -53,6 +125,94 @@ class ESPaginator(Paginator):
 
         return page
 
+    def cursor_page(self, cursor=None, export=False):
+        """
+        Returns a page object, for the opt-in cursor pagination.
+
+        `cursor` is the opaque token found in the `next` link of the previous
+        page, or empty for the first page. When the search is sorted on
+        fields, `id` is added to the sort to make it total and the cursor
+        holds the sort values of the last hit of the previous page. The next
+        page is then the first one of the search filtered on the hits sorted
+        after it, so a deep page costs the same as the first one instead of
+        having every shard sort `offset + limit` hits. The cursor holds no
+        server-side state: fetching it again returns the same page.
+
+        Searches sorted by score (the default of the searches with a query
+        string), or hits missing a sort value, can't be filtered that way and
+        fall back to the offset: their cursors give no depth benefit. Use the
+        `export` mode to read all of their results.
+        """
+        if export:
+            return self.scroll_page(cursor)
+
+        offset, after, scroll_id = (decode_cursor(cursor) if cursor
+                                    else (0, None, None))
+        if scroll_id is not None:
+            raise InvalidPage('That cursor is only valid in export mode')
+        sq = self.object_list
+        sort = get_keyset_sort(sq._sort)
+        if sort and 'id' not in [field for field, desc in sort]:
+            sq = sq.sort(*(sq._sort + ['id']))
+            sort.append(('id', False))
+        if after is not None:
+            if not sort or len(after) != len(sort):
+                raise InvalidPage('That cursor is not valid')
+            sq = sq.filter(get_after_filter(sort, after))[0:self.per_page]
+        else:
+            sq = sq[offset:offset + self.per_page]
+
+        raw = sq._using.search(index=sq._index, doc_type=sq._doc_type,
+                               body=sq.to_dict(), **sq._params)
+        hits = Response(raw).hits
+        # The filtered search only counts the hits from `offset`.
+        self._count = hits.total + (offset if after is not None else 0)
+        page = CursorPage(hits, offset / self.per_page + 1, self)
+        if offset + len(hits) < self._count:
+            last = raw['hits']['hits'][-1].get('sort')
+            if not sort or None in (last or [None]):
+                last = None
+            page.next_cursor = encode_cursor(offset + len(hits), last)
+        return page
+
+    def scroll_page(self, cursor=None):
+        """
+        Returns a page object of the export mode of the cursor pagination.
+
+        The pages are read from an ES scroll, in the order of the search, so
+        every page costs the same whatever the sort. The scroll is kept for
+        ES_SCROLL_TIMEOUT between two pages and cleared after the last one.
+        A scroll is stateful: each cursor can only be fetched once.
+        """
+        es = self.object_list._using
+        offset, after, scroll_id = (decode_cursor(cursor) if cursor
+                                    else (0, None, None))
+        if scroll_id:
+            try:
+                raw = es.scroll(scroll_id, scroll=settings.ES_SCROLL_TIMEOUT)
+            except NotFoundError:
+                raise EmptyPage('That cursor has expired')
+        elif offset or after is not None:
+            raise InvalidPage('That cursor is not valid in export mode')
+        else:
+            sq = self.object_list[0:self.per_page]
+            raw = es.search(index=sq._index, doc_type=sq._doc_type,
+                            body=sq.to_dict(),
+                            scroll=settings.ES_SCROLL_TIMEOUT, **sq._params)
+
+        hits = Response(raw).hits
+        if not hits and raw['_shards']['failed']:
+            # Some shards lost the scroll, ES doesn't always 404.
+            raise EmptyPage('That cursor has expired')
+        self._count = hits.total
+        page = CursorPage(hits, offset / self.per_page + 1, self)
+        if offset + len(hits) < hits.total:
+            page.next_cursor = encode_cursor(offset + len(hits),
+                                             scroll_id=raw['_scroll_id'])
+        else:
+            es.clear_scroll(scroll_id=raw['_scroll_id'])
+        return page
+
 
 class MetaSerializer(serializers.Serializer):
     """
@@ -81,13 +241,23 @@ class MetaSerializer(serializers.Serializer):
         return self.replace_query_params(url, {'offset': number * per_page,
                                                'limit': per_page})
 
+    def get_cursor_link(self, page):
+        request = self.context.get('request')
+        url = request and request.get_full_path() or ''
+        per_page = page.paginator.per_page
+        return self.replace_query_params(url, {'cursor': page.next_cursor,
+                                               'limit': per_page})
+
     def get_next(self, page):
+        if isinstance(page, CursorPage):
+            # Cursor pagination only goes forward.
+            return page.next_cursor and self.get_cursor_link(page)
         if not page.has_next():
             return None
         return self.get_offset_link_for_page(page, page.next_page_number())
 
     def get_previous(self, page):
-        if not page.has_previous():
+        if isinstance(page, CursorPage) or not page.has_previous():
             return None
         return self.get_offset_link_for_page(page, page.previous_page_number())
 
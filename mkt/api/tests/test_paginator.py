@@ -1,14 +1,17 @@
 from urlparse import urlparse
 
-from django.core.paginator import Paginator
+from django.core.paginator import InvalidPage, Paginator
 from django.http import QueryDict
 
-from nose.tools import eq_
+import mock
+from nose.tools import eq_, ok_
 from test_utils import RequestFactory
 
-from amo.tests import ESTestCase, TestCase
+from amo.tests import app_factory, ESTestCase, TestCase
 
-from mkt.api.paginator import MetaSerializer, ESPaginator
+from mkt.api.paginator import (CursorPage, decode_cursor, encode_cursor,
+                               ESPaginator, get_after_filter, get_keyset_sort,
+                               MetaSerializer)
 from mkt.webapps.indexers import WebappIndexer
 
 
@@ -31,6 +34,103 @@ class TestSearchPaginator(ESTestCase):
 
         es.search = orig_search
 
+    def test_cursor_page(self):
+        apps = [app_factory() for i in range(3)]
+        self.refresh('webapp')
+        sq = WebappIndexer.search().filter(
+            'terms', id=[app.id for app in apps]).sort('id')
+        paginator = ESPaginator(sq, 2)
+
+        page = paginator.cursor_page()
+        eq_([int(app.id) for app in page], [apps[0].id, apps[1].id])
+        eq_(page.number, 1)
+        eq_(paginator.count, 3)
+        ok_(page.next_cursor)
+
+        eq_(decode_cursor(page.next_cursor), (2, [apps[1].id], None))
+
+        # Fetching the same cursor twice returns the same page.
+        for i in range(2):
+            next_page = paginator.cursor_page(page.next_cursor)
+            eq_([int(app.id) for app in next_page], [apps[2].id])
+            eq_(next_page.number, 2)
+            eq_(paginator.count, 3)
+            eq_(next_page.next_cursor, None)
+
+    def test_cursor_page_by_score(self):
+        apps = [app_factory() for i in range(3)]
+        self.refresh('webapp')
+        sq = WebappIndexer.search().filter(
+            'terms', id=[app.id for app in apps])
+        paginator = ESPaginator(sq, 2)
+
+        page = paginator.cursor_page()
+        eq_(decode_cursor(page.next_cursor), (2, None, None))
+        first_ids = [int(app.id) for app in page]
+
+        page = paginator.cursor_page(page.next_cursor)
+        eq_(len(page), 1)
+        eq_(page.number, 2)
+        eq_(set(first_ids + [int(page[0].id)]), set(app.id for app in apps))
+        eq_(page.next_cursor, None)
+
+    def test_scroll_page(self):
+        apps = [app_factory() for i in range(3)]
+        self.refresh('webapp')
+        es = WebappIndexer.get_es()
+        sq = WebappIndexer.search(using=es).filter(
+            'terms', id=[app.id for app in apps]).sort('id')
+        paginator = ESPaginator(sq, 2)
+
+        page = paginator.cursor_page(export=True)
+        eq_([int(app.id) for app in page], [apps[0].id, apps[1].id])
+        offset, after, scroll_id = decode_cursor(page.next_cursor)
+        eq_((offset, after), (2, None))
+        ok_(scroll_id)
+
+        with mock.patch.object(es, 'clear_scroll',
+                               wraps=es.clear_scroll) as clear_scroll:
+            page = paginator.cursor_page(page.next_cursor, export=True)
+        eq_([int(app.id) for app in page], [apps[2].id])
+        eq_(page.number, 2)
+        eq_(paginator.count, 3)
+        eq_(page.next_cursor, None)
+        # The scroll is cleared after the last page.
+        ok_(clear_scroll.called)
+
+    def test_scroll_page_invalid(self):
+        paginator = ESPaginator(WebappIndexer.search(), 2)
+        with self.assertRaises(InvalidPage):
+            paginator.cursor_page(encode_cursor(2, [1]), export=True)
+        with self.assertRaises(InvalidPage):
+            paginator.cursor_page(encode_cursor(2, scroll_id='scroll'))
+
+    def test_cursor_page_invalid(self):
+        with self.assertRaises(InvalidPage):
+            ESPaginator(WebappIndexer.search(), 2).cursor_page('nope')
+        with self.assertRaises(InvalidPage):
+            # Sort values, but the search is sorted by score.
+            ESPaginator(WebappIndexer.search(), 2).cursor_page(
+                encode_cursor(2, [1]))
+
+
+class TestKeysetSort(TestCase):
+
+    def test_get_keyset_sort(self):
+        eq_(get_keyset_sort([]), None)
+        eq_(get_keyset_sort(['_score', 'id']), None)
+        eq_(get_keyset_sort([{'popularity': {'order': 'desc'}}, 'name_sort',
+                             {'created': 'desc'}]),
+            [('popularity', True), ('name_sort', False), ('created', True)])
+
+    def test_get_after_filter(self):
+        eq_(get_after_filter([('popularity', True), ('id', False)],
+                             [5, 3]).to_dict(),
+            {'bool': {'should': [
+                {'bool': {'must': [{'range': {'popularity': {'lt': 5}}}]}},
+                {'bool': {'must': [{'term': {'popularity': 5}},
+                                   {'range': {'id': {'gt': 3}}}]}}]}})
+
 
 class TestMetaSerializer(TestCase):
     def setUp(self):
@@ -102,6 +202,29 @@ class TestMetaSerializer(TestCase):
 
         eq_(serialized['next'], None)
 
+    def test_cursor_page(self):
+        data = ['a', 'b', 'c', 'd', 'e']
+        per_page = 2
+        page = CursorPage(data[2:4], 2, Paginator(data, per_page))
+        page.next_cursor = encode_cursor(4, [10])
+        serialized = self.get_serialized_data(page)
+        eq_(serialized['offset'], 2)
+        eq_(serialized['total_count'], len(data))
+        eq_(serialized['limit'], per_page)
+
+        eq_(serialized['previous'], None)
+
+        next = urlparse(serialized['next'])
+        eq_(next.path, self.url)
+        eq_(QueryDict(next.query), QueryDict(
+            'limit=2&cursor=%s' % encode_cursor(4, [10], None)))
+        eq_(decode_cursor(QueryDict(next.query)['cursor']), (4, [10], None))
+
+    def test_last_cursor_page(self):
+        data = ['a', 'b', 'c']
+        page = CursorPage(data[2:], 2, Paginator(data, 2))
+        eq_(self.get_serialized_data(page)['next'], None)
+
     def test_without_request_path(self):
         data = ['a', 'b', 'c', 'd', 'e']
         per_page = 2
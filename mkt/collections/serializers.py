@@ -11,6 +11,7 @@ from tower import ugettext_lazy as _
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.core.files.base import File
+from django.db.models.query import QuerySet
 
 import amo
 import mkt
@@ -18,6 +19,7 @@ from mkt.api.fields import (SlugChoiceField, TranslationSerializerField,
                             UnicodeChoiceField)
 from mkt.constants.categories import CATEGORY_CHOICES
 from mkt.features.utils import get_feature_profile
+from mkt.search.utils import msearch
 from mkt.users.models import UserProfile
 from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.serializers import SimpleAppSerializer, SimpleESAppSerializer
@@ -42,10 +44,8 @@ class CollectionMembershipField(serializers.RelatedField):
 
     def to_native(self, qs, use_es=False):
         if use_es:
+            # The ES results, see field_to_native_es().
             serializer_class = self.app_serializer_classes['es']
-            # To work around elasticsearch default limit of 10, hardcode a
-            # higher limit.
-            qs = qs[:100].execute()
         else:
             serializer_class = self.app_serializer_classes['normal']
         return serializer_class(qs, context=self.context, many=True).data
@@ -95,9 +95,27 @@ class CollectionMembershipField(serializers.RelatedField):
         A version of field_to_native that uses ElasticSearch to fetch the apps
         belonging to the collection instead of SQL.
 
+        The apps of every collection serialized along with this one are
+        fetched at the same time and kept in self.context['es-collection-apps']
+        (see get_apps_es), where the view may also have stored them already.
+
         Relies on a FeaturedSearchView instance in self.context['view']
         to properly rehydrate results returned by ES.
         """
+        app_map = self.context.setdefault('es-collection-apps', {})
+        if obj.pk not in app_map:
+            collections = [obj]
+            siblings = getattr(getattr(self, 'parent', None), 'object', None)
+            if isinstance(siblings, (list, QuerySet)):
+                collections += [c for c in siblings if c.pk not in app_map]
+            app_map.update(self.get_apps_es(collections, request))
+        return self.to_native(app_map[obj.pk], use_es=True)
+
+    def get_es_query(self, obj, request):
+        """
+        Return the ES query for the apps belonging to the collection `obj`,
+        taking the device and feature profile of `request` into account.
+        """
         device = self._get_device(request)
 
         app_filters = {'profile': get_feature_profile(request)}
@@ -116,7 +134,21 @@ class CollectionMembershipField(serializers.RelatedField):
             }
         })
 
-        return self.to_native(qs, use_es=True)
+        # To work around elasticsearch default limit of 10, hardcode a
+        # higher limit.
+        return qs[:100]
+
+    def get_apps_es(self, collections, request):
+        """
+        Fetch the apps of all the `collections` from ES in a single msearch.
+        Return a dict mapping collection pks to ES results, to be stored in
+        the serializer context as `es-collection-apps`.
+        """
+        collections = dict((c.pk, c) for c in collections).values()
+        if not collections:
+            return {}
+        return dict(zip([c.pk for c in collections], msearch(
+            [self.get_es_query(c, request) for c in collections])))
 
 
 class CollectionImageField(serializers.HyperlinkedRelatedField):
@@ -5,6 +5,7 @@ import json
 from django.contrib.auth.models import AnonymousUser
 from django.test.utils import override_settings
 
+import mock
 from nose.tools import eq_, ok_
 from rest_framework import serializers
 from test_utils import RequestFactory
@@ -203,6 +204,28 @@ class TestCollectionMembershipFieldES(BaseTestCollectionMembershipField,
         eq_(int(result[1]['id']), self.app.id)
         eq_(int(result[2]['id']), self.app3.id)
 
+    def test_get_apps_es(self):
+        extra_collection = Collection.objects.create(**self.collection_data)
+        extra_collection.add_app(self.app)
+        self.refresh('webapp')
+
+        app_map = self.field.get_apps_es([self.collection, extra_collection],
+                                         self.get_request())
+        eq_(sorted(app_map), sorted([self.collection.pk, extra_collection.pk]))
+        eq_([int(app.id) for app in app_map[extra_collection.pk]],
+            [self.app.id])
+
+    def test_field_to_native_es_fetched(self):
+        request = self.get_request()
+        self.field.context['request'] = request
+        self.field.context['es-collection-apps'] = self.field.get_apps_es(
+            [self.collection], request)
+        with mock.patch('mkt.collections.serializers.msearch') as msearch:
+            result = self.field.field_to_native_es(self.collection, request)
+        ok_(not msearch.called)
+        eq_(len(result), 1)
+        eq_(int(result[0]['id']), self.app.id)
+
     def test_app_delete(self):
         self.app.delete()
         self.refresh('webapp')
@@ -113,3 +113,10 @@ HOME_NUM_APPS_SHELF = 0
 
 # Minimum number of apps needed after filtering to be displayed for colls.
 MIN_APPS_COLLECTION = 3
+
+# Apps per feed element fetched along with the feed elements. If the feed has
+# more, they are fetched again by ID in an extra search.
+MAX_APPS_FEED_ELEMENT = 50
+
+# Namespace of the cached feeds, incremented when the feed changes.
+FEED_CACHE_NAMESPACE = 'mkt.feed'
@@ -21,6 +21,7 @@ from django.dispatch import receiver
 import amo
 import mkt.carriers
 import mkt.regions
+from amo.utils import cache_ns_key
 from mkt.collections.fields import ColorField
 from mkt.constants.categories import CATEGORY_CHOICES
 from mkt.feed import indexers
@@ -32,7 +33,7 @@ from mkt.webapps.models import clean_slug, Preview, Webapp
 from mkt.webapps.tasks import index_webapps
 
 from .constants import (BRAND_LAYOUT_CHOICES, BRAND_TYPE_CHOICES,
-                        COLLECTION_TYPE_CHOICES,
+                        COLLECTION_TYPE_CHOICES, FEED_CACHE_NAMESPACE,
                         FEEDAPP_TYPE_CHOICES)
 
 
@@ -442,6 +443,44 @@ def delete_search_index(sender, instance, **kw):
     instance.get_indexer().unindex(instance.id)
 
 
+# Start a new generation of the cached feeds when the feed changes.
+@receiver(models.signals.post_save, sender=FeedApp,
+          dispatch_uid='feedapp.feed.cache')
+@receiver(models.signals.post_save, sender=FeedBrand,
+          dispatch_uid='feedbrand.feed.cache')
+@receiver(models.signals.post_save, sender=FeedCollection,
+          dispatch_uid='feedcollection.feed.cache')
+@receiver(models.signals.post_save, sender=FeedShelf,
+          dispatch_uid='feedshelf.feed.cache')
+@receiver(models.signals.post_save, sender=FeedItem,
+          dispatch_uid='feeditem.feed.cache')
+@receiver(models.signals.post_save, sender=FeedBrandMembership,
+          dispatch_uid='feedbrandmembership.feed.cache')
+@receiver(models.signals.post_save, sender=FeedCollectionMembership,
+          dispatch_uid='feedcollectionmembership.feed.cache')
+@receiver(models.signals.post_save, sender=FeedShelfMembership,
+          dispatch_uid='feedshelfmembership.feed.cache')
+@receiver(models.signals.post_delete, sender=FeedApp,
+          dispatch_uid='feedapp.feed.cache.delete')
+@receiver(models.signals.post_delete, sender=FeedBrand,
+          dispatch_uid='feedbrand.feed.cache.delete')
+@receiver(models.signals.post_delete, sender=FeedCollection,
+          dispatch_uid='feedcollection.feed.cache.delete')
+@receiver(models.signals.post_delete, sender=FeedShelf,
+          dispatch_uid='feedshelf.feed.cache.delete')
+@receiver(models.signals.post_delete, sender=FeedItem,
+          dispatch_uid='feeditem.feed.cache.delete')
+@receiver(models.signals.post_delete, sender=FeedBrandMembership,
+          dispatch_uid='feedbrandmembership.feed.cache.delete')
+@receiver(models.signals.post_delete, sender=FeedCollectionMembership,
+          dispatch_uid='feedcollectionmembership.feed.cache.delete')
+@receiver(models.signals.post_delete, sender=FeedShelfMembership,
+          dispatch_uid='feedshelfmembership.feed.cache.delete')
+def invalidate_feed_cache(sender=None, **kw):
+    if not kw.get('raw'):
+        cache_ns_key(FEED_CACHE_NAMESPACE, increment=True)
+
+
 # Save translations when saving instance with translated fields.
 models.signals.pre_save.connect(
     save_signal, sender=FeedApp,
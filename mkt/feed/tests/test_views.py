@@ -2,12 +2,14 @@
 import json
 import os
 
+from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.utils.text import slugify
 
 import mock
 from elasticsearch_dsl.search import Search
 from nose.tools import eq_, ok_
+from rest_framework import response, status
 
 import amo.tests
 import mkt.carriers
@@ -1289,6 +1291,49 @@ class TestFeedView(BaseTestFeedESView, BaseTestFeedItemViewSet):
         eq_(data['objects'][0]['item_type'],
             feed.FEED_TYPE_SHELF)
 
+    def test_cached(self):
+        feed_items = self.feed_factory()
+        res, data = self._get()
+        with mock.patch.object(FeedView, '_get') as _get:
+            res, cached = self._get()
+        ok_(not _get.called)
+        eq_(res.status_code, 200)
+        eq_(cached, data)
+
+        # Other query parameters get their own feed.
+        res, data = self._get(region='us')
+        eq_(len(data['objects']), len(feed_items))
+
+    def test_cache_invalidated_by_feed_change(self):
+        feed_items = self.feed_factory()
+        self._get()
+        self.feed_item_factory()
+        res, data = self._get()
+        eq_(len(data['objects']), len(feed_items) + 1)
+
+    @mock.patch('mkt.feed.views.time.time')
+    def test_cache_stale(self, time_mock):
+        time_mock.return_value = 1000
+        self.feed_factory()
+        res, data = self._get()
+        time_mock.return_value += settings.FEED_CACHE_TIMEOUT
+
+        # Another request is already rebuilding the stale feed.
+        with mock.patch('mkt.feed.views.cache.add') as add:
+            add.return_value = False
+            with mock.patch.object(FeedView, '_get') as _get:
+                res, stale = self._get()
+        ok_(not _get.called)
+        eq_(stale, data)
+
+        # This request rebuilds it.
+        with mock.patch.object(FeedView, '_get') as _get:
+            _get.return_value = response.Response(
+                status=status.HTTP_404_NOT_FOUND)
+            res, data = self._get()
+        ok_(_get.called)
+        eq_(res.status_code, 404)
+
     @mock.patch('mkt.feed.views.FeedView.get_paginate_by')
     def test_limit_honored(self, mock_paginate_by):
         PAGINATE_BY = 3
@@ -1485,6 +1530,26 @@ class TestFeedView(BaseTestFeedESView, BaseTestFeedItemViewSet):
         for obj in data['objects']:
             eq_(obj['collection']['app_count'], 3)
 
+    @mock.patch('mkt.feed.constants.MAX_APPS_FEED_ELEMENT', 1)
+    def test_many_apps_fetched_by_id(self):
+        coll = self.feed_collection_factory(
+            app_ids=[amo.tests.app_factory().id for x in range(3)])
+        FeedItem.objects.create(collection=coll,
+                                item_type=feed.FEED_TYPE_COLL, region=1)
+
+        res, data = self._get(region=1)
+        eq_(res.status_code, 200)
+        eq_(data['objects'][0]['collection']['app_count'], 3)
+
+    def test_restofworld_fallback_if_apps_filtered(self):
+        self.feed_factory()
+        feed_item = self.feed_item_factory(item_type=feed.FEED_TYPE_APP,
+                                           region=mkt.regions.US.id)
+        feed_item.app.app.update(disabled_by_user=True)
+        res, data = self._get(region='us')
+        eq_(res.status_code, 200)
+        ok_(feed_item.id not in [obj['id'] for obj in data['objects']])
+
 
 class TestFeedViewDeviceFiltering(BaseTestFeedESView, BaseTestFeedItemViewSet):
     fixtures = BaseTestFeedItemViewSet.fixtures + FeedTestMixin.fixtures
@@ -1772,6 +1837,20 @@ class TestFeedViewQueries(BaseTestFeedItemViewSet, amo.tests.TestCase):
         eq_(sq['from'], 0)
         eq_(sq['size'], 1)
 
+    def test_app_query(self):
+        feed_item = self.feed_item_factory()
+        item = feed_item.get_indexer().extract_document(None, obj=feed_item)
+        sq = self.fv.get_es_feed_app_query(self.sq, [item]).to_dict()
+        eq_(sq['query']['filtered']['filter']['bool']['should'],
+            [{'terms': {'id': {
+                'index': settings.ES_INDEXES['mkt_feed_app'],
+                'type': 'mkt_feed_app',
+                'id': feed_item.app_id,
+                'path': 'app',
+                'cache': False}}}])
+        eq_(sq['from'], 0)
+        eq_(sq['size'], feed.MAX_APPS_FEED_ELEMENT)
+
 
 class TestFeedElementGetView(BaseTestFeedESView, BaseTestFeedItemViewSet):
     fixtures = BaseTestFeedItemViewSet.fixtures + FeedTestMixin.fixtures
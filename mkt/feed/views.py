@@ -1,6 +1,14 @@
+import copy
+import hashlib
+import itertools
+import time
+
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
+from django.core.paginator import Page
 from django.db.models import Q
+from django.utils import translation
 
 from django_statsd.clients import statsd
 from elasticsearch_dsl import filter as es_filter
@@ -14,6 +22,7 @@ from rest_framework.views import APIView
 
 import mkt
 import mkt.feed.constants as feed
+from amo.utils import cache_ns_key
 from mkt.api.authentication import (RestAnonymousAuthentication,
                                     RestOAuthAuthentication,
                                     RestSharedSecretAuthentication)
@@ -23,8 +32,11 @@ from mkt.api.paginator import ESPaginator
 from mkt.collections.views import CollectionImageViewSet
 from mkt.constants.applications import DEVICE_LOOKUP
 from mkt.developers.tasks import pngcrush_image
-from mkt.feed.indexers import FeedItemIndexer
+from mkt.feed.indexers import (FeedAppIndexer, FeedBrandIndexer,
+                               FeedCollectionIndexer, FeedItemIndexer,
+                               FeedShelfIndexer)
 from mkt.operators.authorization import OperatorShelfAuthorization
+from mkt.search.utils import msearch
 from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.models import Webapp
 
@@ -421,24 +433,32 @@ class BaseFeedESView(CORSMixin, APIView):
             app_ids += self.get_app_ids(elm)
         return app_ids
 
-    def get_apps(self, request, app_ids):
+    def get_apps_query(self, request, app_ids=None):
         """
-        Takes a list of app_ids. Gets the apps, including filters.
-        Returns an app_map for serializer context.
+        Takes a list of app_ids. Returns the ES query for the apps, including
+        filters. Without app_ids, the query is for all the apps.
         """
         if request.QUERY_PARAMS.get('filtering', '1') == '0':
             # Without filtering.
-            sq = WebappIndexer.search().filter(es_filter.Bool(
-                should=[es_filter.Terms(id=app_ids)]
-            ))[0:len(app_ids)]
-        else:
-            # With filtering.
-            sq = WebappIndexer.get_app_filter(request, {
-                'device': self._get_device(request)
-            }, app_ids=app_ids)
+            sq = WebappIndexer.search()
+            if app_ids is not None:
+                sq = sq.filter(es_filter.Bool(
+                    should=[es_filter.Terms(id=app_ids)]
+                ))[0:len(app_ids)]
+            return sq
+
+        # With filtering.
+        return WebappIndexer.get_app_filter(request, {
+            'device': self._get_device(request)
+        }, app_ids=app_ids)
 
+    def get_apps(self, request, app_ids):
+        """
+        Takes a list of app_ids. Gets the apps, including filters.
+        Returns an app_map for serializer context.
+        """
         # Store the apps to attach to feed elements later.
-        apps = sq.execute().hits
+        apps = self.get_apps_query(request, app_ids).execute().hits
         return dict((app.id, app) for app in apps)
 
     def filter_feed_items(self, request, feed_items):
@@ -547,12 +567,43 @@ class FeedElementSearchView(BaseFeedESView):
         return response.Response(res, status=status.HTTP_200_OK)
 
 
+FEED_ELEMENT_INDEXERS = {
+    feed.FEED_TYPE_APP: FeedAppIndexer,
+    feed.FEED_TYPE_BRAND: FeedBrandIndexer,
+    feed.FEED_TYPE_COLL: FeedCollectionIndexer,
+    feed.FEED_TYPE_SHELF: FeedShelfIndexer,
+}
+
+
+class FeedFallbackSearch(object):
+    """
+    Wraps the feed query of a region along with the query of the RoW feed it
+    falls back to. Both are paginated alike and sent to ES in one msearch;
+    `execute()` returns the results of the region's feed and keeps the RoW
+    ones in `responses`, shared by every slice.
+    """
+
+    def __init__(self, sq, fallback, responses=None):
+        self.sq = sq
+        self.fallback = fallback
+        self.responses = {} if responses is None else responses
+
+    def __getitem__(self, n):
+        return self.__class__(self.sq[n], self.fallback[n], self.responses)
+
+    def execute(self):
+        (self.responses['feed'],
+         self.responses['fallback']) = msearch([self.sq, self.fallback])
+        return self.responses['feed']
+
+
 class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
     """
     THE feed view. It hits ES with:
-    - a weighted function score query to get feed items
-    - a filter to deserialize feed elements
-    - a filter to deserialize apps
+    - a weighted function score query to get feed items, along with the one
+      of the RoW feed to fall back to
+    - a filter to deserialize feed elements, along with a filter looking their
+      apps up to deserialize apps
     """
     authentication_classes = []
     cors_allowed_methods = ('get',)
@@ -620,59 +671,71 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
 
         return sq.filter(es_filter.Bool(should=filters))[0:len(feed_items)]
 
-    def _check_empty_feed(self, items, rest_of_world):
+    def get_es_feed_app_query(self, sq, feed_items):
         """
-        Return -1 if feed is empty and we are already falling back to RoW.
-        Return 0 if feed is empty and we are not falling back to RoW yet.
-        Return 1 if at least one feed item and the only feed item is not shelf.
+        From a list of FeedItems with normalized feed element IDs,
+        return an ES query that fetches the apps of each feed item's feed
+        element. ES looks the app IDs up from the feed element documents, so
+        the apps can be fetched in the same round trip as the feed elements.
         """
-        if not items or (len(items) == 1 and items[0].get('shelf')):
-            # Empty feed.
-            if rest_of_world:
-                return -1
-            return 0
-        return 1
-
-    def _handle_empty_feed(self, empty_feed_code, region, request, args,
-                           kwargs):
+        filters = []
+        for feed_item in feed_items:
+            item_type = feed_item['item_type']
+            indexer = FEED_ELEMENT_INDEXERS[item_type]
+            filters.append(es_filter.Terms(id={
+                'index': indexer.get_index(),
+                'type': indexer.get_mapping_type_name(),
+                'id': feed_item[item_type],
+                'path': 'app' if item_type == feed.FEED_TYPE_APP else 'apps',
+                # Feed elements change, don't keep their apps around.
+                'cache': False,
+            }))
+
+        return sq.filter(es_filter.Bool(should=filters))[
+            0:len(feed_items) * feed.MAX_APPS_FEED_ELEMENT]
+
+    def _is_empty_feed(self, items):
         """
-        If feed is empty, this method handles appropriately what to return.
-        If empty_feed_code == 0: try to fallback to RoW.
-        If empty_feed_code == -1: 404.
+        Return True if feed is empty or if the only feed item is a shelf.
         """
-        if empty_feed_code == 0:
-            return self._get(request, rest_of_world=True,
-                             original_region=region, *args, **kwargs)
-        return response.Response(status=status.HTTP_404_NOT_FOUND)
+        return not items or (len(items) == 1 and bool(items[0].get('shelf')))
+
+    def get_fallback_page(self, page, results):
+        """
+        Return the page of the RoW feed matching `page`, from the `results`
+        of the RoW feed query sent along with the region's one.
+        """
+        paginator = copy.copy(page.paginator)
+        paginator._count = results.hits.total
+        return Page(results.hits, page.number, paginator)
 
-    def _get(self, request, rest_of_world=False, original_region=None,
-             *args, **kwargs):
+    def _get(self, request, *args, **kwargs):
         es = FeedItemIndexer.get_es()
 
         # Parse region.
-        if rest_of_world:
-            region = mkt.regions.RESTOFWORLD.id
-        else:
-            region = request.REGION.id
+        region = request.REGION.id
         # Parse carrier.
         carrier = None
         q = request.QUERY_PARAMS
         if q.get('carrier') and q['carrier'] in mkt.carriers.CARRIER_MAP:
             carrier = mkt.carriers.CARRIER_MAP[q['carrier']].id
 
-        # Fetch FeedItems.
+        # Fetch FeedItems. Unless we are already in RoW, the RoW feed we fall
+        # back to when the region's feed is empty is fetched along with it.
         sq = self.get_es_feed_query(FeedItemIndexer.search(using=es),
-                                    region=region, carrier=carrier,
-                                    original_region=original_region)
-        feed_items = self.paginate_queryset(sq)
-        feed_ok = self._check_empty_feed(feed_items, rest_of_world)
-        if feed_ok != 1:
-            return self._handle_empty_feed(feed_ok, region, request, args,
-                                           kwargs)
-
-        # Build the meta object.
-        meta = mkt.api.paginator.CustomPaginationSerializer(
-            feed_items, context={'request': request}).data['meta']
+                                    region=region, carrier=carrier)
+        if region != mkt.regions.RESTOFWORLD.id:
+            sq = FeedFallbackSearch(sq, self.get_es_feed_query(
+                FeedItemIndexer.search(using=es), carrier=carrier,
+                original_region=region))
+        pages = [self.paginate_queryset(sq)]
+        if isinstance(sq, FeedFallbackSearch):
+            pages.append(self.get_fallback_page(
+                pages[0], sq.responses['fallback']))
+        pages = [page for page in pages if not self._is_empty_feed(page)]
+        if not pages:
+            return response.Response(status=status.HTTP_404_NOT_FOUND)
+        feed_items = list(itertools.chain(*pages))
 
         # Set up serializer context.
         feed_element_map = {
@@ -682,40 +745,87 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
             feed.FEED_TYPE_SHELF: {},
         }
 
-        # Fetch feed elements to attach to FeedItems later.
-        apps = []
-        sq = self.get_es_feed_element_query(
-            Search(using=es, index=self.get_feed_element_index()), feed_items)
-        for feed_elm in sq.execute().hits:
+        # Fetch feed elements to attach to FeedItems later, along with their
+        # apps to attach to feed elements later.
+        feed_elements, apps = msearch([
+            self.get_es_feed_element_query(
+                Search(using=es, index=self.get_feed_element_index()),
+                feed_items),
+            self.get_es_feed_app_query(self.get_apps_query(request),
+                                       feed_items)
+        ], es=es)
+        app_ids = []
+        for feed_elm in feed_elements.hits:
             # Store the feed elements to attach to FeedItems later.
             feed_element_map[feed_elm['item_type']][feed_elm['id']] = feed_elm
-            # Store the apps to retrieve later.
-            apps += self.get_app_ids(feed_elm)
-
-        # Fetch apps to attach to feed elements later.
-        app_map = self.get_apps(request, apps)
+            # Store the apps in case we need to retrieve them again.
+            app_ids += self.get_app_ids(feed_elm)
 
-        # Super serialize.
-        feed_items = FeedItemESSerializer(feed_items, many=True, context={
-            'app_map': app_map,
-            'feed_element_map': feed_element_map,
-            'request': request
-        }).data
+        if apps.hits.total > len(apps.hits):
+            # Too many apps to fetch in one go, fetch them by ID.
+            app_map = self.get_apps(request, app_ids)
+        else:
+            app_map = dict((app.id, app) for app in apps.hits)
+
+        for page in pages:
+            # Build the meta object.
+            meta = mkt.api.paginator.CustomPaginationSerializer(
+                page, context={'request': request}).data['meta']
+
+            # Super serialize.
+            feed_items = FeedItemESSerializer(page, many=True, context={
+                'app_map': app_map,
+                'feed_element_map': feed_element_map,
+                'request': request
+            }).data
+
+            # Filter excluded apps. If there are feed items that have all
+            # their apps excluded, they will be removed from the feed. If the
+            # feed ends up empty, fall back to RoW.
+            feed_items = self.filter_feed_items(request, feed_items)
+            if not self._is_empty_feed(feed_items):
+                return response.Response({'meta': meta, 'objects': feed_items},
+                                         status=status.HTTP_200_OK)
 
-        # Filter excluded apps. If there are feed items that have all their
-        # apps excluded, they will be removed from the feed.
-        feed_items = self.filter_feed_items(request, feed_items)
-        feed_ok = self._check_empty_feed(feed_items, rest_of_world)
-        if feed_ok != 1:
-            return self._handle_empty_feed(feed_ok, region, request, args,
-                                           kwargs)
+        return response.Response(status=status.HTTP_404_NOT_FOUND)
 
-        return response.Response({'meta': meta, 'objects': feed_items},
-                                 status=status.HTTP_200_OK)
+    def get_cache_key(self, request):
+        """
+        Return the key of the cached response to this request. The feed is
+        the same for every anonymous user sharing a region, a language, the
+        device flags and the query string (carrier, device, feature profile,
+        page...). Changes to the feed start a new generation of keys.
+        """
+        data = (getattr(request, 'REGION', mkt.regions.RESTOFWORLD).id,
+                translation.get_language(),
+                getattr(request, 'GAIA', False),
+                getattr(request, 'MOBILE', False),
+                getattr(request, 'TABLET', False),
+                sorted(request.QUERY_PARAMS.lists()))
+        return 'feed:%s:%s' % (cache_ns_key(feed.FEED_CACHE_NAMESPACE),
+                               hashlib.md5(repr(data)).hexdigest())
 
     def get(self, request, *args, **kwargs):
         with statsd.timer('mkt.feed.view'):
-            return self._get(request, *args, **kwargs)
+            key = self.get_cache_key(request)
+            cached = cache.get(key)
+            if cached is not None:
+                data, status_code, fresh_until = cached
+                # Once stale, the first request rebuilds the feed while the
+                # others keep getting the stale one.
+                if (time.time() < fresh_until or not cache.add(
+                        key + ':lock', 1, settings.FEED_CACHE_TIMEOUT)):
+                    statsd.incr('mkt.feed.cache.hit')
+                    return response.Response(data, status=status_code)
+
+            statsd.incr('mkt.feed.cache.miss')
+            res = self._get(request, *args, **kwargs)
+            cache.set(key, (res.data, res.status_code,
+                            time.time() + settings.FEED_CACHE_TIMEOUT),
+                      settings.FEED_CACHE_TIMEOUT +
+                      settings.FEED_CACHE_STALE_TIMEOUT)
+            cache.delete(key + ':lock')
+            return res
 
 
 class FeedElementGetView(BaseFeedESView):
@@ -772,6 +882,7 @@ class FeedElementListView(BaseFeedESView, MarketplaceView,
     permission_classes = [GroupPermission('Feed', 'Curate')]
     cors_allowed_methods = ('get',)
     paginator_class = ESPaginator
+    cursor_pagination = True
 
     def get_recent_feed_elements(self, sq):
         """Matches all sorted by recent."""
@@ -9,12 +9,15 @@ from nose.tools import eq_, ok_
 from django.core.urlresolvers import reverse
 from django.test import client
 
+import amo.tests
 from amo.tests import TestCase
 from mkt.api.tests.test_oauth import RestOAuth
+from mkt.ratings.models import Review
 from mkt.site.fixtures import fixture
+from mkt.users.models import UserProfile
 
 from .models import MonolithRecord, record_stat
-from .views import daterange
+from .views import _get_query_result, daterange
 
 
 class RequestFactory(client.RequestFactory):
@@ -215,6 +218,50 @@ class TestMonolithResource(RestOAuth):
         eq_(data['meta']['limit'], 2)
 
 
+class TestGetQueryResult(TestCase):
+
+    def setUp(self):
+        self.app = amo.tests.app_factory()
+        self.day = datetime.date(2013, 2, 10)
+        self.next_day = self.day + datetime.timedelta(days=1)
+
+    def review(self, rating, created):
+        user = UserProfile.objects.create(username=uuid.uuid4().hex)
+        review = Review.objects.create(addon=self.app, user=user,
+                                       rating=rating)
+        Review.objects.filter(pk=review.pk).update(created=created)
+
+    def test_slice(self):
+        self.review(4, self.day)
+        self.review(2, self.day)
+        self.review(5, self.day - datetime.timedelta(days=1))
+        data = _get_query_result('apps_ratings', self.day,
+                                 self.next_day + datetime.timedelta(days=1))
+        eq_(data, [{'key': 'apps_ratings', 'recorded': self.day,
+                    'user_hash': None,
+                    'value': {'count': 2, 'app-id': self.app.pk}}])
+
+    def test_total(self):
+        self.review(5, self.day - datetime.timedelta(days=3))
+        self.review(1, self.next_day)
+        data = _get_query_result('apps_average_rating', self.day,
+                                 self.next_day + datetime.timedelta(days=1))
+        eq_([(d['recorded'], d['value']['count'], d['value']['app-id'])
+             for d in data],
+            [(self.day, 5.0, self.app.pk), (self.next_day, 3.0, self.app.pk)])
+
+    def test_total_null_rating(self):
+        self.review(None, self.day - datetime.timedelta(days=3))
+        self.review(None, self.day)
+        self.review(4, self.next_day)
+        self.review(None, self.next_day)
+        data = _get_query_result('apps_average_rating', self.day,
+                                 self.next_day + datetime.timedelta(days=1))
+        eq_([(d['recorded'], d['value']['count'], d['value']['app-id'])
+             for d in data],
+            [(self.day, None, self.app.pk), (self.next_day, 4.0, self.app.pk)])
+
+
 class TestDateRange(TestCase):
 
     def setUp(self):
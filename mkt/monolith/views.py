@@ -1,7 +1,8 @@
 import datetime
 import logging
+from collections import defaultdict
 
-from django.db.models import Avg, Count
+from django.db.models import Count, Sum
 from rest_framework import status
 from rest_framework.exceptions import ParseError
 from rest_framework.generics import ListAPIView
@@ -22,35 +23,23 @@ log = logging.getLogger('z.monolith')
 
 # TODO: Move the stats that can be calculated on the fly from
 # apps/stats/tasks.py here.
+#
+# The 'slice' stats count the objects created on each day, for each app. The
+# 'total' stats average the 'field' of all the objects created up to the end
+# of each day, for each app.
 STATS = {
     'apps_ratings': {
-        'qs': Review.objects
-            .filter(editorreview=0)
-            .values('addon')
-            .annotate(count=Count('addon')),
+        'qs': Review.objects.filter(editorreview=0),
         'type': 'slice',
-        'field_map': {
-            'count': 'count',
-            'app-id': 'addon'},
     },
     'apps_average_rating': {
-        'qs': Review.objects
-            .filter(editorreview=0)
-            .values('addon')
-            .annotate(avg=Avg('rating')),
+        'qs': Review.objects.filter(editorreview=0),
         'type': 'total',
-        'field_map': {
-            'count': 'avg',
-            'app-id': 'addon'},
+        'field': 'rating',
     },
     'apps_abuse_reports': {
-        'qs': AbuseReport.objects
-            .values('addon')
-            .annotate(count=Count('addon')),
+        'qs': AbuseReport.objects.all(),
         'type': 'slice',
-        'field_map': {
-            'count': 'count',
-            'app-id': 'addon'},
     }
 }
 
@@ -60,10 +49,24 @@ def daterange(start, end):
         yield start + datetime.timedelta(n)
 
 
+def _by_day(qs, start, end, **aggregates):
+    """
+    Returns the `aggregates` of the objects of `qs` created between `start`
+    and `end`, grouped by day and app, as a {day: [values]} dict.
+    """
+    qs = (qs.filter(created__gte=start, created__lt=end)
+            .extra(select={'day': 'DATE(created)'})
+            .order_by().values('day', 'addon').annotate(**aggregates))
+    days = defaultdict(list)
+    for values in qs:
+        days[values['day']].append(values)
+    return days
+
+
 def _get_query_result(key, start, end):
     # To do on-the-fly queries we have to produce results as if they
-    # were calculated daily, which means we need to iterate over each
-    # day in the range and perform an aggregation on this date.
+    # were calculated daily. The objects are aggregated by day in a single
+    # query, and the totals are accumulated over the days.
 
     data = []
     today = datetime.date.today()
@@ -75,27 +78,38 @@ def _get_query_result(key, start, end):
     if not end:
         end = today
 
-    for day in daterange(start, end):
-        if stat['type'] == 'total':
-            # If it's a totalling queryset, we want to filter by the
-            # end date until the beginning of time to get the total
-            # objects up until this point in time.
-            date_filtered = stat['qs'].filter(
-                created__lt=(day + datetime.timedelta(days=1)))
-        else:
-            # Otherwise, we want to filter by both start/end to get
-            # counts on a specific day.
-            date_filtered = stat['qs'].filter(
-                created__gte=day,
-                created__lt=(day + datetime.timedelta(days=1)))
-
-        data.extend([{
-            'key': key,
-            'recorded': day,
-            'user_hash': None,
-            'value': {'count': d.get(stat['field_map']['count']),
-                      'app-id': d.get(stat['field_map']['app-id'])}}
-            for d in date_filtered])
+    row = lambda day, count, app_id: {
+        'key': key,
+        'recorded': day,
+        'user_hash': None,
+        'value': {'count': count, 'app-id': app_id}}
+
+    if stat['type'] == 'total':
+        field = stat['field']
+        # The sum and count of the objects created before `start`, by app.
+        # Like Avg, only the objects with a value of `field` are counted,
+        # the sum is None when there is none.
+        totals = dict(
+            (values['addon'], [values['sum'] or 0, values['count']])
+            for values in stat['qs'].filter(created__lt=start).order_by()
+                                    .values('addon')
+                                    .annotate(sum=Sum(field),
+                                              count=Count(field)))
+        days = _by_day(stat['qs'], start, end, sum=Sum(field),
+                       count=Count(field))
+        for day in daterange(start, end):
+            for values in days.get(day, []):
+                total = totals.setdefault(values['addon'], [0, 0])
+                total[0] += values['sum'] or 0
+                total[1] += values['count']
+            data.extend(row(day, float(sum_) / count if count else None,
+                            app_id)
+                        for app_id, (sum_, count) in sorted(totals.items()))
+    else:
+        days = _by_day(stat['qs'], start, end, count=Count('id'))
+        for day in daterange(start, end):
+            data.extend(row(day, values['count'], values['addon'])
+                        for values in days.get(day, []))
 
     return data
 
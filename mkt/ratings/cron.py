@@ -6,6 +6,7 @@ import commonware.log
 import cronjobs
 
 from mkt.site.mail import send_mail_jinja
+from mkt.ratings import tasks
 from mkt.ratings.models import Review
 
 
@@ -42,3 +43,9 @@ def email_daily_ratings():
         send_mail_jinja(subject, 'ratings/emails/daily_digest.html',
                         context, recipient_list=author_emails,
                         perm_setting='app_new_review', async=True)
+
+
+@cronjobs.register
+def update_bayesian_ratings():
+    """Recompute the Bayesian rating of every app in one task."""
+    tasks.update_bayesian_ratings.delay()
@@ -1,11 +1,18 @@
+import itertools
 import logging
+from collections import defaultdict
 
+from django.db import connection
 from django.db.models import Count, Avg, F
 
 import caching.base as caching
 from celeryutils import task
 
+from amo.utils import chunked
+from mkt.site.decorators import write
+from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.models import Webapp
+from mkt.webapps.tasks import index_webapps
 
 from .models import Review
 
@@ -18,23 +25,40 @@ def update_denorm(*pairs, **kw):
     """
     Takes a bunch of (addon, user) pairs and sets the denormalized fields for
     all reviews matching that pair.
+
+    The reviews of all the pairs are fetched in one query, and the changed
+    fields are set with one UPDATE per value, without sending signals.
     """
     log.info('[%s@%s] Updating review denorms.' %
              (len(pairs), update_denorm.rate_limit))
     using = kw.get('using')
-    for addon, user in pairs:
-        reviews = list(Review.objects.valid().no_cache().using(using)
-                       .filter(addon=addon, user=user).order_by('created'))
-        if not reviews:
-            continue
-
-        for idx, review in enumerate(reviews):
-            review.previous_count = idx
-            review.is_latest = False
-        reviews[-1].is_latest = True
+    pairs = set(pairs)
+    if not pairs:
+        return
 
-        for review in reviews:
-            review.save()
+    addons, users = zip(*pairs)
+    reviews = defaultdict(list)
+    for review in (Review.objects.valid().no_cache().using(using)
+                   .filter(addon__in=set(addons), user__in=set(users))
+                   .order_by('created')):
+        if (review.addon_id, review.user_id) in pairs:
+            reviews[review.addon_id, review.user_id].append(review)
+
+    # The ids of the reviews to update, by (previous_count, is_latest).
+    updates = defaultdict(list)
+    changed = []
+    for pair_reviews in reviews.values():
+        for idx, review in enumerate(pair_reviews):
+            is_latest = idx == len(pair_reviews) - 1
+            if (review.previous_count, review.is_latest) != (idx, is_latest):
+                updates[idx, is_latest].append(review.id)
+                changed.append(review)
+
+    for (previous_count, is_latest), ids in updates.items():
+        (Review.objects.no_cache().using(using).filter(id__in=ids)
+         .update(previous_count=previous_count, is_latest=is_latest))
+    if changed:
+        Review.objects.invalidate(*changed)
 
 
 @task
@@ -42,15 +66,32 @@ def addon_review_aggregates(*addons, **kw):
     log.info('[%s@%s] Updating total reviews and average ratings.' %
              (len(addons), addon_review_aggregates.rate_limit))
     using = kw.get('using')
-    addon_objs = list(Webapp.objects.filter(pk__in=addons))
+    addon_objs = list(Webapp.objects.no_cache().filter(pk__in=addons)
+                      .no_transforms())
     stats = dict((x[0], x[1:]) for x in
                  Review.objects.valid().no_cache().using(using)
                  .filter(addon__in=addons, is_latest=True)
                  .values_list('addon')
                  .annotate(Avg('rating'), Count('addon')))
+
+    # The ids of the apps to update, by (average_rating, total_reviews).
+    updates = defaultdict(list)
+    changed = []
     for addon in addon_objs:
         rating, reviews = stats.get(addon.id, [0, 0])
-        addon.update(total_reviews=reviews, average_rating=rating)
+        if (addon.average_rating, addon.total_reviews) != (rating, reviews):
+            updates[rating, reviews].append(addon.id)
+            changed.append(addon)
+
+    for (rating, reviews), ids in updates.items():
+        Webapp.objects.filter(id__in=ids).update(total_reviews=reviews,
+                                                 average_rating=rating)
+    if changed:
+        Webapp.objects.invalidate(*changed)
+
+    # Review counts have changed, reindex the apps all at once.
+    if addon_objs:
+        index_webapps.delay([addon.id for addon in addon_objs])
 
     # Delay bayesian calculations to avoid slave lag.
     addon_bayesian_rating.apply_async(args=addons, countdown=5)
@@ -67,15 +108,63 @@ def addon_bayesian_rating(*addons, **kw):
     if avg['rating'] is None:
         return
     mc = avg['reviews'] * avg['rating']
-    for addon in Webapp.objects.no_cache().filter(id__in=addons):
-        if addon.average_rating is None:
+
+    # Ignoring addons with no average rating.
+    qs = Webapp.objects.no_cache().filter(id__in=addons,
+                                          average_rating__isnull=False)
+    num = mc + F('total_reviews') * F('average_rating')
+    denom = avg['reviews'] + F('total_reviews')
+    qs.filter(total_reviews__gt=0).update(bayesian_rating=num / denom)
+    qs.filter(total_reviews=0).update(bayesian_rating=0)
+
+
+def _save_bayesian_ratings(ratings):
+    """
+    Update the Bayesian ratings from a dict of app id => rating, in one query
+    per chunk of apps.
+    """
+    cursor = connection.cursor()
+    for chunk in chunked(sorted(ratings.items()), 500):
+        ids = [app_id for app_id, _ in chunk]
+        cursor.execute(
+            'UPDATE addons SET bayesian_rating = CASE id %s END '
+            'WHERE id IN (%s)' % (' '.join(['WHEN %s THEN %s'] * len(chunk)),
+                                  ', '.join(['%s'] * len(chunk))),
+            list(itertools.chain(*chunk)) + ids)
+        # The raw query doesn't go through cache-machine.
+        Webapp.objects.invalidate(*Webapp.objects.no_cache()
+                                  .filter(id__in=ids).no_transforms())
+
+
+@task
+@write
+def update_bayesian_ratings(**kw):
+    """
+    Recompute the Bayesian rating of every app in one pass over the apps,
+    then save and reindex the apps whose rating changed.
+    """
+    apps = list(Webapp.objects.no_cache()
+                .values_list('id', 'total_reviews', 'average_rating',
+                             'bayesian_rating'))
+    # The same averages as addon_bayesian_rating, but not cached.
+    ratings = [average for _, _, average, _ in apps if average is not None]
+    if not ratings:
+        return
+    avg_rating = sum(ratings) / len(ratings)
+    avg_reviews = float(sum(total for _, total, _, _ in apps)) / len(apps)
+    mc = avg_reviews * avg_rating
+
+    changed = {}
+    for app_id, total, average, bayesian in apps:
+        if average is None:
             # Ignoring addons with no average rating.
             continue
-
-        q = Webapp.objects.filter(id=addon.id)
-        if addon.total_reviews:
-            num = mc + F('total_reviews') * F('average_rating')
-            denom = avg['reviews'] + F('total_reviews')
-            q.update(bayesian_rating=num / denom)
-        else:
-            q.update(bayesian_rating=0)
+        rating = (mc + total * average) / (avg_reviews + total) if total else 0
+        if bayesian is None or abs(rating - bayesian) > 1e-6:
+            changed[app_id] = rating
+
+    _save_bayesian_ratings(changed)
+    if changed:
+        WebappIndexer.index_ids(changed.keys())
+    log.info('Bayesian ratings updated for %s out of %s apps.'
+             % (len(changed), len(apps)))
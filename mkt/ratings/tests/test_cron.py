@@ -9,10 +9,10 @@ import mock
 from nose.tools import eq_
 
 import amo.tests
-from mkt.ratings.cron import email_daily_ratings
+from mkt.ratings.cron import email_daily_ratings, update_bayesian_ratings
 from mkt.ratings.models import Review
 from mkt.site.fixtures import fixture
-from mkt.webapps.models import AddonUser
+from mkt.webapps.models import AddonUser, Webapp
 from mkt.users.models import UserProfile
 
 
@@ -59,3 +59,38 @@ class TestEmailDailyRatings(amo.tests.TestCase):
             True)
         eq_(str(self.app2_review.body) not in smart_str(mail.outbox[0].body),
             True)
+
+
+class TestUpdateBayesianRatings(amo.tests.TestCase):
+
+    def setUp(self):
+        self.app = amo.tests.app_factory()
+        self.app2 = amo.tests.app_factory()
+        Webapp.objects.filter(pk=self.app.pk).update(
+            total_reviews=4, average_rating=5, bayesian_rating=0)
+        Webapp.objects.filter(pk=self.app2.pk).update(
+            total_reviews=0, average_rating=1, bayesian_rating=0)
+
+    @mock.patch('mkt.ratings.tasks.WebappIndexer.index_ids')
+    def test_update(self, index_ids):
+        update_bayesian_ratings()
+        # The averages are 3 for the ratings and 2 for the reviews.
+        eq_(Webapp.objects.no_cache().get(pk=self.app.pk).bayesian_rating,
+            (2 * 3 + 4 * 5) / 6.0)
+        eq_(Webapp.objects.no_cache().get(pk=self.app2.pk).bayesian_rating,
+            0)
+        index_ids.assert_called_with([self.app.pk])
+
+    @mock.patch('mkt.ratings.tasks.WebappIndexer.index_ids')
+    def test_invalidated(self, index_ids):
+        eq_(Webapp.objects.get(pk=self.app.pk).bayesian_rating, 0)
+        update_bayesian_ratings()
+        eq_(Webapp.objects.get(pk=self.app.pk).bayesian_rating,
+            (2 * 3 + 4 * 5) / 6.0)
+
+    @mock.patch('mkt.ratings.tasks.WebappIndexer.index_ids')
+    def test_unchanged(self, index_ids):
+        update_bayesian_ratings()
+        index_ids.reset_mock()
+        update_bayesian_ratings()
+        assert not index_ids.called
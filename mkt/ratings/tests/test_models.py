@@ -2,6 +2,7 @@ from mock import patch
 from nose.tools import eq_
 
 import amo.tests
+from mkt.ratings import tasks
 from mkt.ratings.models import check_spam, Review, Spam
 from mkt.site.fixtures import fixture
 from mkt.webapps.models import Webapp
@@ -31,3 +32,52 @@ class TestSpamTest(amo.tests.TestCase):
         review = Review.objects.latest('pk')
         review.refresh()
         assert index_webapps_apply_async.called
+
+
+class TestReviewDenorm(amo.tests.TestCase):
+    fixtures = fixture('webapp_337141')
+
+    def setUp(self):
+        self.app = Webapp.objects.get(pk=337141)
+        self.user = UserProfile.objects.get(pk=31337)
+        self.other = UserProfile.objects.create(username='other')
+
+    def test_update_denorm(self):
+        for rating in (1, 2, 3):
+            review = Review.objects.create(addon=self.app, user=self.user,
+                                           rating=rating)
+            Review.objects.filter(pk=review.pk).update(
+                created=self.days_ago(3 - rating))
+        Review.objects.create(addon=self.app, user=self.other, rating=5)
+        Review.objects.update(previous_count=0, is_latest=True)
+
+        tasks.update_denorm((self.app.id, self.user.id),
+                            (self.app.id, self.other.id))
+        eq_(list(Review.objects.no_cache().filter(user=self.user)
+                 .order_by('rating')
+                 .values_list('previous_count', 'is_latest')),
+            [(0, False), (1, False), (2, True)])
+        eq_(list(Review.objects.no_cache().filter(user=self.other)
+                 .values_list('previous_count', 'is_latest')),
+            [(0, True)])
+
+    def test_update_denorm_no_signals(self):
+        Review.objects.create(addon=self.app, user=self.user, rating=1)
+        Review.objects.create(addon=self.app, user=self.user, rating=2)
+        Review.objects.update(is_latest=True)
+        with patch.object(Review, 'refresh') as refresh:
+            tasks.update_denorm((self.app.id, self.user.id))
+        assert not refresh.called
+        eq_(Review.objects.no_cache().filter(is_latest=True).count(), 1)
+
+    def test_aggregates(self):
+        Review.objects.create(addon=self.app, user=self.user, rating=1)
+        Review.objects.create(addon=self.app, user=self.user, rating=3)
+        Review.objects.create(addon=self.app, user=self.other, rating=5)
+        Webapp.objects.filter(pk=self.app.pk).update(total_reviews=0,
+                                                     average_rating=0)
+        tasks.addon_review_aggregates(self.app.id)
+        app = Webapp.objects.no_cache().get(pk=self.app.pk)
+        eq_(app.total_reviews, 2)
+        eq_(app.average_rating, 4)
+        assert app.bayesian_rating > 0
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import calendar
+import json
 import time
 import uuid
 from urllib import urlencode
@@ -37,6 +38,7 @@ class ReceiptTest(amo.tests.TestCase):
     fixtures = fixture('prices', 'webapp_337141', 'user_999')
 
     def setUp(self):
+        verify.clear_caches()
         self.app = Webapp.objects.get(pk=337141)
         self.inapp = InAppProduct.objects.create(logo_url='image.png',
                                                  name='Kiwii',
@@ -55,6 +57,27 @@ class ReceiptTest(amo.tests.TestCase):
                                    flavour='inapp',
                                    contrib=contribution)
 
+    def make_purchase(self):
+        return AddonPurchase.objects.create(addon=self.app, user=self.user,
+                                            uuid='some-uuid')
+
+    def make_contribution(self, type=amo.CONTRIB_PURCHASE):
+        contribution = Contribution.objects.create(addon=self.app,
+                                                   user=self.user,
+                                                   type=type)
+        # This was created by the contribution, but we need to tweak
+        # the uuid to ensure its correct.
+        AddonPurchase.objects.get().update(uuid='some-uuid')
+        return contribution
+
+    def make_inapp_contribution(self, type=amo.CONTRIB_PURCHASE):
+        return Contribution.objects.create(
+            addon=self.app,
+            inapp_product=self.inapp,
+            type=type,
+            user=self.user,
+        )
+
 
 # There are two "different" settings files that need to be patched,
 # even though they are the same file.
@@ -86,27 +109,6 @@ class TestVerify(ReceiptTest):
         # decoder will spit out the actual receipt
         return self.verify_signed_receipt('', check_purchase=check_purchase)
 
-    def make_purchase(self):
-        return AddonPurchase.objects.create(addon=self.app, user=self.user,
-                                            uuid='some-uuid')
-
-    def make_contribution(self, type=amo.CONTRIB_PURCHASE):
-        contribution = Contribution.objects.create(addon=self.app,
-                                                   user=self.user,
-                                                   type=type)
-        # This was created by the contribution, but we need to tweak
-        # the uuid to ensure its correct.
-        AddonPurchase.objects.get().update(uuid='some-uuid')
-        return contribution
-
-    def make_inapp_contribution(self, type=amo.CONTRIB_PURCHASE):
-        return Contribution.objects.create(
-            addon=self.app,
-            inapp_product=self.inapp,
-            type=type,
-            user=self.user,
-        )
-
     @mock.patch.object(utils.settings, 'SIGNING_SERVER_ACTIVE', True)
     def test_invalid_receipt(self):
         eq_(self.verify_signed_receipt('blah')['status'], 'invalid')
@@ -273,6 +275,29 @@ class TestVerify(ReceiptTest):
             eq_(res['status'], 'refunded')
         eq_(log.call_count, 2)
 
+    def test_premium_app_purchase_cached(self):
+        self.app.update(premium_type=amo.ADDON_PREMIUM)
+        purchase = self.make_purchase()
+        eq_(self.verify_receipt_data(self.sample_app_receipt())['status'],
+            'ok')
+        purchase.update(type=amo.CONTRIB_REFUND)
+        eq_(self.verify_receipt_data(self.sample_app_receipt())['status'],
+            'ok')
+        verify.purchase_cache.clear()
+        eq_(self.verify_receipt_data(self.sample_app_receipt())['status'],
+            'refunded')
+
+    def test_premium_app_no_purchase_cached(self):
+        self.app.update(premium_type=amo.ADDON_PREMIUM)
+        eq_(self.verify_receipt_data(self.sample_app_receipt())['reason'],
+            'NO_PURCHASE')
+        self.make_purchase()
+        eq_(self.verify_receipt_data(self.sample_app_receipt())['reason'],
+            'NO_PURCHASE')
+        verify.purchase_cache.clear()
+        eq_(self.verify_receipt_data(self.sample_app_receipt())['status'],
+            'ok')
+
     def test_premium_no_charge(self):
         self.app.update(premium_type=amo.ADDON_PREMIUM)
         purchase = self.make_purchase()
@@ -357,6 +382,27 @@ class TestVerify(ReceiptTest):
                 self.app, self.user, str(uuid.uuid4())))
         assert trunion_verify.called
 
+    @mock.patch('services.verify.jwt.decode')
+    def test_crack_receipt_cached(self, decode):
+        decode.return_value = {'typ': u'purchase-receipt'}
+        eq_(verify.decode_receipt('receipt')['typ'], u'purchase-receipt')
+        eq_(verify.decode_receipt('receipt')['typ'], u'purchase-receipt')
+        eq_(decode.call_count, 1)
+        verify.decode_receipt('another receipt')
+        eq_(decode.call_count, 2)
+
+    @mock.patch('services.verify.jwt.decode')
+    def test_crack_receipt_cached_copy(self, decode):
+        decode.return_value = {'exp': 1}
+        verify.decode_receipt('receipt')['exp'] = 2
+        eq_(verify.decode_receipt('receipt')['exp'], 1)
+
+    @mock.patch.object(utils.settings, 'SIGNING_SERVER_ACTIVE', True)
+    @mock.patch('services.verify.receipts.certs.ReceiptVerifier')
+    def test_verifier_built_once(self, trunion_verify):
+        eq_(verify.get_verifier(), verify.get_verifier())
+        eq_(trunion_verify.call_count, 1)
+
     def test_crack_borked_receipt(self):
         self.app.update(manifest_url='http://a.com')
         purchase = self.make_purchase()
@@ -383,6 +429,85 @@ class TestVerify(ReceiptTest):
         assert ('Cache-Control', 'no-cache') in hdrs, 'No cache header needed'
 
 
+@mock.patch.object(utils.settings, 'WEBAPPS_RECEIPT_KEY',
+                   amo.tests.AMOPaths.sample_key())
+@mock.patch.object(settings, 'SITE_URL', 'http://foo.com/')
+@mock.patch.object(settings, 'WEBAPPS_RECEIPT_URL', '/verifyme/')
+class TestBatchVerify(ReceiptTest):
+
+    def setUp(self):
+        super(TestBatchVerify, self).setUp()
+        self.app.update(premium_type=amo.ADDON_PREMIUM)
+
+    @mock.patch.object(verify, 'decode_receipt')
+    def verify_receipts_data(self, receipts_data, decode_receipt):
+        receipts = [str(i) for i in range(len(receipts_data))]
+        decode_receipt.side_effect = lambda r: receipts_data[int(r)]
+        verifier = verify.BatchVerify(
+            receipts, RequestFactory().get('/verifyme/').META)
+        verifier.cursor = connection.cursor()
+        return verifier.check_full()
+
+    def test_statuses_in_order(self):
+        self.make_purchase().update(type=amo.CONTRIB_REFUND)
+        contribution = self.make_inapp_contribution(
+            type=amo.CONTRIB_NO_CHARGE)
+        invalid = self.sample_app_receipt()
+        invalid['typ'] = 'anything'
+        res = self.verify_receipts_data([
+            self.sample_inapp_receipt(contribution),
+            invalid,
+            self.sample_app_receipt(),
+        ])
+        eq_([r['status'] for r in res], ['ok', 'invalid', 'refunded'])
+        eq_(res[1]['reason'], 'WRONG_TYPE')
+
+    def test_no_purchase(self):
+        receipt = self.sample_app_receipt()
+        receipt['user']['value'] = 'ugh'
+        res = self.verify_receipts_data([receipt])
+        eq_(res, [{'status': 'invalid', 'reason': 'NO_PURCHASE'}])
+
+    def test_queries(self):
+        self.make_purchase()
+        contribution = self.make_inapp_contribution()
+        receipts = [self.sample_app_receipt(),
+                    self.sample_inapp_receipt(contribution)] * 5
+        with self.assertNumQueries(2):
+            res = self.verify_receipts_data(receipts)
+        eq_([r['status'] for r in res], ['ok'] * 10)
+
+    def test_empty(self):
+        eq_(self.verify_receipts_data([]), [])
+
+
+class TestBatchApplication(amo.tests.TestCase):
+
+    def application(self, data, method='post'):
+        request = getattr(RequestFactory(), method)(
+            '/verify/batch/', data=data, content_type='application/json')
+        start_response = mock.Mock()
+        body = verify.application(request.environ, start_response)
+        return start_response.call_args[0][0], body[0]
+
+    def test_get(self):
+        eq_(self.application('', method='get')[0], '405 Method Not Allowed')
+
+    def test_invalid(self):
+        for data in ('not json', 'null', '{}', '[1]',
+                     json.dumps(['r'] * 51)):
+            eq_(self.application(data)[0], '400 Bad Request')
+
+    @mock.patch('services.verify.BatchVerify')
+    def test_batch(self, batch):
+        batch.return_value.check_full.return_value = [{'status': 'ok'}]
+        status, body = self.application(json.dumps(['receipt']))
+        eq_(status, '200 OK')
+        eq_(json.loads(body), [{'status': 'ok'}])
+        eq_(batch.call_args[0][0], ['receipt'])
+        eq_(batch.call_args[0][1]['PATH_INFO'], '/verify/')
+
+
 class TestBase(amo.tests.TestCase):
 
     def create(self, data, request=None):
@@ -438,6 +563,42 @@ class TestURL(TestBase):
         self.create(sample, request=self.req).check_url('f.com')
 
 
+class TestLRUCache(amo.tests.TestCase):
+
+    def test_get_set(self):
+        cache = utils.LRUCache(2, 10)
+        eq_(cache.get('foo'), None)
+        eq_(cache.get('foo', 'default'), 'default')
+        cache.set('foo', None)
+        eq_(cache.get('foo', 'default'), None)
+
+    def test_least_recently_used(self):
+        cache = utils.LRUCache(2, 10)
+        cache.set('foo', 1)
+        cache.set('bar', 2)
+        cache.get('foo')
+        cache.set('baz', 3)
+        eq_(len(cache), 2)
+        eq_(cache.get('bar'), None)
+        eq_(cache.get('foo'), 1)
+        eq_(cache.get('baz'), 3)
+
+    @mock.patch('services.utils.time')
+    def test_timeout(self, time_):
+        time_.return_value = 100
+        cache = utils.LRUCache(2, 10)
+        cache.set('foo', 1)
+        time_.return_value = 105
+        eq_(cache.get('foo'), 1)
+        time_.return_value = 111
+        eq_(cache.get('foo'), None)
+
+    def test_disabled(self):
+        cache = utils.LRUCache(2, 0)
+        cache.set('foo', 1)
+        eq_(cache.get('foo'), None)
+
+
 class TestServices(amo.tests.TestCase):
 
     def test_wrong_settings(self):
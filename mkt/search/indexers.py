@@ -25,6 +25,9 @@ class BaseIndexer(object):
     - get_mapping(cls)
     - extract_document(cls, pk=None, obj=None)
 
+    and can override extract_documents(cls, objs) to extract many documents
+    at once.
+
     """
     _es = {}
 
@@ -84,6 +87,36 @@ class BaseIndexer(object):
 
         helpers.bulk(es, actions)
 
+    @classmethod
+    def streaming_bulk(cls, actions, es=None, chunk_size=None):
+        """
+        Sends the bulk actions to ES in chunks of `chunk_size` actions
+        (defaults to `settings.ES_BULK_CHUNK_SIZE`), logging every action
+        that failed. Deleting a document that isn't in the index is not
+        considered a failure.
+
+        Returns the number of failed actions.
+        """
+        es = es or cls.get_es()
+        errors = 0
+        for ok, item in helpers.streaming_bulk(
+                es, actions, raise_on_error=False,
+                chunk_size=chunk_size or settings.ES_BULK_CHUNK_SIZE):
+            if ok:
+                continue
+            op_type, result = item.items()[0]
+            if op_type == 'delete' and result.get('status') == 404:
+                task_log.info(u'[%s:%s] object not found in index' %
+                              (cls.get_model()._meta.model_name,
+                               result.get('_id')))
+                continue
+            errors += 1
+            task_log.error(u'[%s:%s] %s in %s failed: %s' %
+                           (cls.get_model()._meta.model_name,
+                            result.get('_id'), op_type, result.get('_index'),
+                            result.get('error')))
+        return errors
+
     @classmethod
     def index_ids(cls, ids, no_delay=False):
         """
@@ -271,14 +304,15 @@ class BaseIndexer(object):
         indices = Reindexing.get_indices(index)
 
         es = cls.get_es(urls=settings.ES_URLS)
-        for id_ in ids:
-            for idx in indices:
-                try:
-                    cls.unindex(id_=id_, es=es, index=idx)
-                except elasticsearch.exceptions.NotFoundError:
-                    # Ignore if it's not there.
-                    task_log.info(u'[%s:%s] object not found in index' %
-                                  (cls.get_model()._meta.model_name, id_))
+        doc_type = cls.get_mapping_type_name()
+        cls.streaming_bulk(
+            ({'_op_type': 'delete', '_index': idx, '_type': doc_type,
+              '_id': id_} for id_ in ids for idx in indices), es=es)
+
+    @classmethod
+    def extract_documents(cls, objs):
+        """Extracts the documents for a list of objects."""
+        return [cls.extract_document(obj.id, obj=obj) for obj in objs]
 
     @classmethod
     def run_indexing(cls, ids, ES, index=None, **kw):
@@ -323,7 +357,7 @@ class BaseIndexer(object):
         return mapping
 
 
-@post_request_task(acks_late=True)
+@post_request_task(acks_late=True, coalesce=True)
 @write
 def index(ids, indexer, **kw):
     """
@@ -337,7 +371,9 @@ def index(ids, indexer, **kw):
     indices = Reindexing.get_indices(indexer.get_index())
 
     es = indexer.get_es(urls=settings.ES_URLS)
-    for obj in indexer.get_indexable().filter(id__in=ids):
-        doc = indexer.extract_document(obj.id, obj)
-        for idx in indices:
-            indexer.index(doc, id_=obj.id, es=es, index=idx)
+    doc_type = indexer.get_mapping_type_name()
+    objs = indexer.get_indexable().filter(id__in=ids)
+    indexer.streaming_bulk(
+        ({'_index': idx, '_type': doc_type, '_id': doc['id'], '_source': doc}
+         for doc in indexer.extract_documents(objs) for idx in indices),
+        es=es)
@@ -0,0 +1,146 @@
+"""
+Compares the relevance of the app search query with another version of it,
+on the apps indexed locally (e.g. from the test fixtures).
+
+Dump the templates of the current query before changing name_query(), then
+compare the new query against them:
+
+    ./manage.py compare_search_queries --dump > old.json
+    ./manage.py compare_search_queries --old=old.json facebook "photo editor"
+
+Without --old, the compiled query is compared with the query built by
+name_query(), which should rank the apps the same way.
+
+For each query string, the apps found by either query are listed with their
+rank and score by each of them. With --explain, the ES explanation of the
+scores of the apps that moved is printed too.
+"""
+import json
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import translation
+
+from elasticsearch_dsl import query
+
+from mkt.search.utils import CompiledQuery
+from mkt.search.views import (_get_locale_analyzer, get_search_query_template,
+                              name_query)
+from mkt.webapps.indexers import WebappIndexer
+
+
+def format_explanation(explanation, depth=0):
+    """Returns the lines of an ES score explanation, indented by depth."""
+    lines = ['%s%s: %s' % ('  ' * depth, explanation['value'],
+                           explanation['description'])]
+    for detail in explanation.get('details', []):
+        lines += format_explanation(detail, depth + 1)
+    return lines
+
+
+class Command(BaseCommand):
+    args = '<query> [<query> ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--old', action='store', dest='old', default=None,
+                    help='File with the templates of the old query, as '
+                         'printed by --dump'),
+        make_option('--dump', action='store_true', dest='dump',
+                    default=False,
+                    help='Print the templates of the current query'),
+        make_option('--explain', action='store_true', dest='explain',
+                    default=False,
+                    help='Explain the scores of the apps that moved'),
+        make_option('--lang', action='store', dest='lang', default='en-US',
+                    help='Language of the queries (default: en-US)'),
+        make_option('--size', action='store', type='int', dest='size',
+                    default=20,
+                    help='Number of apps compared per query (default: 20)'),
+    )
+    help = 'Compare the relevance of two versions of the app search query.'
+
+    def get_templates(self):
+        """
+        Returns the current templates, for single and multi-word queries.
+        """
+        analyzer = _get_locale_analyzer()
+        return {'single_word': get_search_query_template(analyzer, True),
+                'multi_word': get_search_query_template(analyzer, False)}
+
+    def get_old_query(self, q, templates):
+        fuzzy = ' ' not in q
+        if templates is None:
+            return query.FunctionScore(
+                query=name_query(q, fuzzy=fuzzy),
+                functions=[query.SF('field_value_factor', field='boost')])
+        return CompiledQuery(
+            templates['single_word' if fuzzy else 'multi_word'], q=q)
+
+    def get_new_query(self, q):
+        return CompiledQuery(
+            get_search_query_template(_get_locale_analyzer(), ' ' not in q),
+            q=q)
+
+    def search(self, search_query, size):
+        """Returns a list of (id, slug, score) tuples, by rank."""
+        hits = WebappIndexer.search().query(search_query)[0:size].execute()
+        return [(int(hit.id), hit.app_slug, hit._meta.score) for hit in hits]
+
+    def explain(self, search_query, app_id):
+        es = WebappIndexer.get_es()
+        res = es.explain(index=WebappIndexer.get_index(),
+                         doc_type=WebappIndexer.get_mapping_type_name(),
+                         id=app_id, body={'query': search_query.to_dict()})
+        return format_explanation(res['explanation'], depth=2)
+
+    def compare(self, q, templates, size, explain):
+        old_query = self.get_old_query(q, templates)
+        new_query = self.get_new_query(q)
+        old = self.search(old_query, size)
+        new = self.search(new_query, size)
+        old_ranks = dict((app[0], (rank, app)) for rank, app
+                         in enumerate(old, 1))
+        new_ranks = dict((app[0], (rank, app)) for rank, app
+                         in enumerate(new, 1))
+
+        self.stdout.write(u'\nQuery: %r\n' % q)
+        self.stdout.write('%5s %5s %10s %10s  %s\n' % (
+            'old', 'new', 'old score', 'new score', 'app'))
+        for app_id, slug, score in new + [app for app in old
+                                          if app[0] not in new_ranks]:
+            old_rank, old_app = old_ranks.get(app_id, ('-', None))
+            new_rank, new_app = new_ranks.get(app_id, ('-', None))
+            self.stdout.write(u'%5s %5s %10s %10s  %s (%s)\n' % (
+                old_rank, new_rank,
+                '%.4f' % old_app[2] if old_app else '-',
+                '%.4f' % new_app[2] if new_app else '-',
+                slug, app_id))
+            if explain and old_rank != new_rank:
+                for name, search_query in (('old', old_query),
+                                           ('new', new_query)):
+                    self.stdout.write('    %s:\n' % name)
+                    self.stdout.write(u'\n'.join(
+                        self.explain(search_query, app_id)) + '\n')
+
+    def handle(self, *args, **options):
+        translation.activate(options['lang'])
+
+        if options['dump']:
+            self.stdout.write(json.dumps(self.get_templates(), indent=2,
+                                         sort_keys=True) + '\n')
+            return
+
+        if not args:
+            raise CommandError('Give at least one query string.')
+
+        templates = None
+        if options['old']:
+            try:
+                with open(options['old']) as f:
+                    templates = json.load(f)
+            except (IOError, ValueError), e:
+                raise CommandError('Could not read %s: %s' % (options['old'],
+                                                               e))
+
+        for q in args:
+            self.compare(q.decode('utf-8').lower(), templates,
+                         options['size'], options['explain'])
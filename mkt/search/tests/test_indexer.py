@@ -1,7 +1,9 @@
+import mock
 from nose.tools import eq_
 
 import amo
-from mkt.search.indexers import BaseIndexer
+from mkt.search.indexers import BaseIndexer, index
+from mkt.webapps.indexers import WebappIndexer
 
 
 class TestBaseIndexer(amo.tests.TestCase):
@@ -13,3 +15,41 @@ class TestBaseIndexer(amo.tests.TestCase):
         es1 = self.indexer().get_es()
         es2 = self.indexer().get_es()
         eq_(id(es1), id(es2))
+
+
+@mock.patch('mkt.search.indexers.Reindexing.get_indices')
+@mock.patch('mkt.search.indexers.helpers.streaming_bulk')
+class TestStreamingBulk(amo.tests.TestCase):
+    fixtures = amo.tests.fixture('webapp_337141')
+
+    def actions(self, bulk_mock):
+        return list(bulk_mock.call_args[0][1])
+
+    def test_index(self, bulk_mock, indices_mock):
+        indices_mock.return_value = ['old', 'new']
+        index([337141], WebappIndexer)
+        eq_(bulk_mock.call_count, 1)
+        eq_([(a['_index'], a['_id']) for a in self.actions(bulk_mock)],
+            [('old', 337141), ('new', 337141)])
+
+    def test_unindexer(self, bulk_mock, indices_mock):
+        indices_mock.return_value = ['old', 'new']
+        WebappIndexer.unindexer([1, 2])
+        eq_(bulk_mock.call_count, 1)
+        eq_([(a['_op_type'], a['_index'], a['_id'])
+             for a in self.actions(bulk_mock)],
+            [('delete', 'old', 1), ('delete', 'new', 1),
+             ('delete', 'old', 2), ('delete', 'new', 2)])
+
+    def test_errors(self, bulk_mock, indices_mock):
+        bulk_mock.return_value = [
+            (True, {'index': {'_id': 1, 'status': 201}}),
+            (False, {'delete': {'_id': 2, 'status': 404}}),
+            (False, {'index': {'_id': 3, 'status': 400, 'error': 'Nope'}}),
+        ]
+        eq_(WebappIndexer.streaming_bulk([]), 1)
+
+    def test_chunk_size(self, bulk_mock, indices_mock):
+        with self.settings(ES_BULK_CHUNK_SIZE=42):
+            WebappIndexer.streaming_bulk([])
+        eq_(bulk_mock.call_args[1]['chunk_size'], 42)
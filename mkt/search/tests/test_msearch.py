@@ -0,0 +1,41 @@
+import mock
+from elasticsearch import TransportError
+from nose.tools import eq_
+
+import amo.tests
+from mkt.search.utils import msearch, Search
+
+
+class TestMsearch(amo.tests.TestCase):
+
+    def setUp(self):
+        self.es = mock.Mock()
+        self.searches = [
+            Search(using=self.es, index='apps', doc_type='webapp')[0:5],
+            Search(using=self.es, index=['feed_app', 'feed_brand']),
+        ]
+
+    def _response(self, total):
+        return {'took': 1, 'timed_out': False,
+                'hits': {'total': total, 'hits': []}}
+
+    def test_body(self):
+        self.es.msearch.return_value = {
+            'responses': [self._response(1), self._response(2)]}
+        msearch(self.searches)
+        body = self.es.msearch.call_args[1]['body']
+        eq_(body, [{'index': 'apps', 'type': 'webapp'},
+                   self.searches[0].to_dict(),
+                   {'index': 'feed_app,feed_brand'},
+                   self.searches[1].to_dict()])
+
+    def test_responses(self):
+        self.es.msearch.return_value = {
+            'responses': [self._response(1), self._response(2)]}
+        eq_([res.hits.total for res in msearch(self.searches)], [1, 2])
+
+    def test_error(self):
+        self.es.msearch.return_value = {
+            'responses': [self._response(1), {'error': 'Oops'}]}
+        with self.assertRaises(TransportError):
+            msearch(self.searches)
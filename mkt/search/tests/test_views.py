@@ -3,13 +3,14 @@ import json
 from urlparse import urlparse
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.db.models.query import QuerySet
 from django.http import QueryDict
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
 
-from elasticsearch_dsl import Search
+from elasticsearch_dsl import query, Search
 from mock import patch
 from nose.tools import eq_, ok_
 
@@ -27,7 +28,9 @@ from mkt.constants import regions
 from mkt.constants.applications import DEVICE_CHOICES_IDS
 from mkt.constants.features import FeatureProfile
 from mkt.regions.middleware import RegionMiddleware
-from mkt.search.views import DEFAULT_SORTING, SearchView
+from mkt.search.utils import index_cache_key, msearch
+from mkt.search.views import (DEFAULT_SORTING, name_query, search_query,
+                              SearchView)
 from mkt.site.fixtures import fixture
 from mkt.site.helpers import absolutify
 from mkt.tags.models import AddonTag, Tag
@@ -118,6 +121,35 @@ class TestGetRegion(TestCase):
 
 
 @patch('mkt.versions.models.Version.is_privileged', False)
+class TestSearchQuery(TestCase):
+
+    def test_name_query_matches(self):
+        should = name_query('term').to_dict()['bool']['should']
+        ok_({'match': {'name': {'query': 'term', 'boost': 3,
+                                'analyzer': 'standard'}}} in should)
+        ok_({'match': {'name': {'query': 'term', 'boost': 4,
+                                'type': 'phrase', 'slop': 1}}} in should)
+
+    def test_name_query_order(self):
+        should = name_query('term').to_dict()['bool']['should']
+        eq_([clause.keys()[0] for clause in should[:12]],
+            ['match'] * 6 + ['prefix'] * 3 + ['fuzzy'] * 3)
+
+    def test_search_query(self):
+        for q in ('term', 'search terms', u'"{{q}}" \\ caf\xe9'):
+            eq_(search_query(q).to_dict(), query.FunctionScore(
+                query=name_query(q),
+                functions=[query.SF('field_value_factor', field='boost')]
+            ).to_dict())
+
+    def test_search_query_compiled_once(self):
+        search_query('term')
+        with patch('mkt.search.views.name_query') as name_query_mock:
+            eq_(search_query('other').to_dict()['function_score']['query']
+                ['bool']['should'][0]['match']['name']['query'], 'other')
+        ok_(not name_query_mock.called)
+
+
 class TestSearchView(RestOAuth, ESTestCase):
     fixtures = fixture('user_2519', 'webapp_337141')
 
@@ -148,11 +180,47 @@ class TestSearchView(RestOAuth, ESTestCase):
         eq_(set(res.json.keys()), set(['objects', 'meta']))
         eq_(res.json['meta']['total_count'], 1)
 
+    def test_cursor(self):
+        res = self.anon.get(self.url, {'cursor': '', 'limit': 1})
+        eq_(res.status_code, 200)
+        eq_(len(res.json['objects']), 1)
+        eq_(res.json['meta']['next'], None)
+
+    def test_export_requires_authentication(self):
+        res = self.anon.get(self.url, {'cursor': '', 'export': 1})
+        eq_(res.status_code, 403)
+        res = self.client.get(self.url, {'cursor': '', 'export': 1})
+        eq_(res.status_code, 200)
+        eq_(len(res.json['objects']), 1)
+
     @patch('mkt.search.utils.statsd.timer')
     def test_statsd(self, _mock):
         self.anon.get(self.url)
         assert _mock.called
 
+    @override_settings(SEARCH_CACHE_TIMEOUT=60)
+    def test_cached(self):
+        self.anon.get(self.url)
+        self.webapp.update(app_slug='cached')
+        self.refresh('webapp')
+        with patch('mkt.search.utils.dslSearch.execute') as execute:
+            res = self.anon.get(self.url)
+        ok_(not execute.called)
+        eq_(res.json['meta']['total_count'], 1)
+        # Only the hits are cached, the apps are fetched again.
+        eq_(res.json['objects'][0]['slug'], 'cached')
+
+    @override_settings(SEARCH_CACHE_TIMEOUT=60)
+    def test_cached_reindexed(self):
+        self.anon.get(self.url)
+        # Pretend the alias now points to another index.
+        cache.set(index_cache_key(settings.ES_INDEXES['webapp']),
+                  ['apps-new'])
+        with patch('mkt.search.utils.Search.get_cached_results') as cached:
+            res = self.anon.get(self.url)
+        ok_(not cached.called)
+        eq_(res.json['meta']['total_count'], 1)
+
     def test_search_published_apps(self):
         res = self.anon.get(self.url)
         eq_(res.status_code, 200)
@@ -903,6 +971,13 @@ class TestFeaturedSearchView(BaseFeaturedTests):
 
         return res, json
 
+    @patch('mkt.collections.serializers.msearch', wraps=msearch)
+    def test_apps_fetched_at_once(self, msearch_mock):
+        self.col.add_app(self.app)
+        self.refresh('webapp')
+        self.make_request()
+        eq_(msearch_mock.call_count, 1)
+
     def test_features_filtered(self):
         """
         Test that the app list is passed through feature profile filtering.
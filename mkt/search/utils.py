@@ -1,11 +1,172 @@
+import hashlib
+import json
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+from elasticsearch import TransportError
+from elasticsearch_dsl import query
+from elasticsearch_dsl.result import Response
 from elasticsearch_dsl.search import Search as dslSearch
 from statsd import statsd
 
 
+def index_cache_key(alias):
+    return 'search:index:%s' % alias
+
+
+def get_indices(es, aliases):
+    """
+    Return the names of the indices behind the `aliases`, which change when
+    they are reindexed. The reindex command clears them from the cache once
+    it points the aliases to the new indices.
+    """
+    indices = []
+    for alias in aliases:
+        key = index_cache_key(alias)
+        names = cache.get(key)
+        if names is None:
+            names = sorted(es.indices.get_alias(index=alias).keys())
+            cache.set(key, names, settings.SEARCH_INDEX_CACHE_TIMEOUT)
+        indices += names
+    return indices
+
+
+class CompiledQuery(query.Query):
+    """
+    A query compiled once to the JSON sent to ES, like an ES search template.
+    The `{{name}}` placeholders of the template are filled with the string
+    `values` the query is created with, so that building the query of a
+    search is a string substitution instead of many DSL objects.
+
+    Use compile() to turn a query built with `{{name}}` strings into a
+    template.
+    """
+    placeholder_re = re.compile(r'{{(\w+)}}')
+
+    def __init__(self, template, **values):
+        super(CompiledQuery, self).__init__()
+        self._template = template
+        self._values = values
+
+    @classmethod
+    def compile(cls, q):
+        """Returns the template of the `q` query object."""
+        return json.dumps(q.to_dict(), sort_keys=True)
+
+    def _clone(self):
+        return self.__class__(self._template, **self._values)
+
+    def __repr__(self):
+        return 'CompiledQuery(%r, %r)' % (self._template, self._values)
+
+    def to_dict(self):
+        return json.loads(self.placeholder_re.sub(
+            # Values are escaped like the JSON strings they are put in.
+            lambda m: json.dumps(self._values[m.group(1)])[1:-1],
+            self._template))
+
+
 class Search(dslSearch):
+    _cache_timeout = None
+
+    def _clone(self):
+        s = super(Search, self)._clone()
+        s._cache_timeout = self._cache_timeout
+        return s
+
+    def cache(self, timeout):
+        """
+        Return a copy of the search whose hits are cached for `timeout`
+        seconds. Only the ids of the hits are cached, the documents are
+        fetched again by id so they are always up to date.
+        """
+        s = self._clone()
+        s._cache_timeout = timeout
+        return s
+
+    def get_cache_key(self):
+        """
+        The body of the search holds the query, filters, sort and page, so
+        along with the indices it runs on it identifies the hits. The indices
+        are looked up behind their aliases, so that a reindexing invalidates
+        the cache.
+        """
+        data = (get_indices(self._using, self._index or []), self._doc_type,
+                self.to_dict())
+        return 'search:%s' % hashlib.md5(
+            json.dumps(data, sort_keys=True, default=unicode)).hexdigest()
 
     def execute(self):
+        if self._cache_timeout:
+            return self.execute_cached()
         with statsd.timer('search.execute'):
             results = super(Search, self).execute()
             statsd.timing('search.took', results.took)
             return results
+
+    def execute_cached(self):
+        key = self.get_cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            total, docs = cached
+            results = self.get_cached_results(total, docs)
+            if results is not None:
+                statsd.incr('search.cache.hit')
+                return results
+
+        statsd.incr('search.cache.miss')
+        s = self._clone()
+        s._cache_timeout = None
+        results = s.execute()
+        cache.set(key, (results.hits.total, [
+            {'_index': hit._meta.index, '_type': hit._meta.doc_type,
+             '_id': hit._meta.id} for hit in results.hits]),
+            self._cache_timeout)
+        return results
+
+    def get_cached_results(self, total, docs):
+        """
+        Return the results of a cached search from the `total` number of
+        hits and the `docs` of the hits, or None if some are gone.
+        """
+        hits = []
+        if docs:
+            with statsd.timer('search.mget'):
+                hits = self._using.mget(body={'docs': docs})['docs']
+            if not all(hit.get('found') for hit in hits):
+                return None
+        return Response({'took': 0, 'timed_out': False,
+                         '_shards': {'failed': 0},
+                         'hits': {'total': total, 'max_score': None,
+                                  'hits': hits}})
+
+
+def msearch(searches, es=None):
+    """
+    Send all the `searches` to ES in a single msearch request and return
+    their responses, in the same order, like `Search.execute()` would.
+
+    es -- the ES client to use, defaults to the one of the first search.
+    """
+    es = es or searches[0]._using
+    body = []
+    for sq in searches:
+        header = dict(sq._params)
+        if sq._index:
+            header['index'] = ','.join(sq._index)
+        if sq._doc_type:
+            header['type'] = ','.join(sq._doc_type)
+        body += [header, sq.to_dict()]
+
+    with statsd.timer('search.msearch'):
+        responses = es.msearch(body=body)['responses']
+
+    results = []
+    for raw in responses:
+        if 'error' in raw:
+            raise TransportError(500, raw['error'])
+        statsd.timing('search.took', raw['took'])
+        results.append(Response(raw))
+    return results
@@ -24,6 +24,7 @@ from mkt.collections.filters import CollectionFilterSetWithFallback
 from mkt.collections.models import Collection
 from mkt.collections.serializers import CollectionSerializer
 from mkt.search.forms import ApiSearchForm, TARAKO_CATEGORIES_MAPPING
+from mkt.search.utils import CompiledQuery
 from mkt.translations.helpers import truncate
 from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.serializers import (ESAppSerializer, RocketbarESAppSerializer,
@@ -58,24 +59,37 @@ def get_custom_analyzer(language):
     return language
 
 
-def name_query(q):
+# Compiled search queries, by locale analyzer and single word or not, see
+# search_query().
+_search_query_templates = {}
+
+
+def name_query(q, analyzer=None, fuzzy=None):
     """
     Returns a boolean should query `elasticsearch_dsl.query.Bool` given a
     query string.
-    """
-    should = []
 
-    rules = {
-        query.Match: {'query': q, 'boost': 3, 'analyzer': 'standard'},
-        query.Match: {'query': q, 'boost': 4, 'type': 'phrase', 'slop': 1},
-        query.Prefix: {'value': q, 'boost': 1.5}
-    }
-    # Only add fuzzy queries if q is a single word. It doesn't make sense to do
-    # a fuzzy query for multi-word queries.
-    if ' ' not in q:
-        rules[query.Fuzzy] = {'value': q, 'boost': 2, 'prefix_length': 1}
+    analyzer -- the locale analyzer, defaults to the one of the language.
+    fuzzy -- whether to add fuzzy queries, defaults to True if q is a single
+        word. It doesn't make sense to do a fuzzy query for multi-word
+        queries.
+    """
+    if analyzer is None:
+        analyzer = _get_locale_analyzer()
+    if fuzzy is None:
+        fuzzy = ' ' not in q
+
+    rules = [
+        (query.Match, {'query': q, 'boost': 3, 'analyzer': 'standard'}),
+        (query.Match, {'query': q, 'boost': 4, 'type': 'phrase', 'slop': 1}),
+        (query.Prefix, {'value': q, 'boost': 1.5}),
+    ]
+    if fuzzy:
+        rules.append((query.Fuzzy, {'value': q, 'boost': 2,
+                                    'prefix_length': 1}))
 
-    for k, v in rules.iteritems():
+    should = []
+    for k, v in rules:
         for field in ('name', 'app_slug', 'author'):
             should.append(k(**{field: v}))
 
@@ -84,7 +98,6 @@ def name_query(q):
     # give it a good boost since this is likely what the user wants.
     should.append(query.Term(name_sort={'value': q, 'boost': 10}))
 
-    analyzer = _get_locale_analyzer()
     if analyzer:
         should.append(query.Match(
             **{'name_%s' % analyzer: {'query': q, 'boost': 2.5}}))
@@ -93,7 +106,6 @@ def name_query(q):
     should.append(query.Match(
         description={'query': q, 'boost': 0.8, 'type': 'phrase'}))
 
-    analyzer = _get_locale_analyzer()
     if analyzer:
         should.append(query.Match(
             **{'description_%s' % analyzer: {
@@ -102,12 +114,37 @@ def name_query(q):
 
     # Add searches on tag field.
     should.append(query.Match(tags={'query': q}))
-    if ' ' not in q:
+    if fuzzy:
         should.append(query.Fuzzy(tags={'value': q, 'prefix_length': 1}))
 
     return query.Bool(should=should)
 
 
+def get_search_query_template(analyzer, fuzzy):
+    """
+    Returns the template of the search query for a locale analyzer, with
+    or without fuzzy queries: name_query() in a function score boosting
+    popular apps (defaults to multiply), for the `{{q}}` query string.
+    """
+    key = (analyzer, fuzzy)
+    if key not in _search_query_templates:
+        _search_query_templates[key] = CompiledQuery.compile(
+            query.FunctionScore(
+                query=name_query('{{q}}', analyzer=analyzer, fuzzy=fuzzy),
+                functions=[query.SF('field_value_factor', field='boost')]))
+    return _search_query_templates[key]
+
+
+def search_query(q):
+    """
+    Returns the query for the app search of the query string `q`, filled in
+    from a template compiled once per locale analyzer and query shape.
+    """
+    analyzer = _get_locale_analyzer()
+    return CompiledQuery(get_search_query_template(analyzer, ' ' not in q),
+                         q=q)
+
+
 def _sort_search(request, sq, data):
     """
     Sort webapp search based on query + region.
@@ -165,6 +202,7 @@ class SearchView(CORSMixin, MarketplaceView, GenericAPIView):
     serializer_class = ESAppSerializer
     form_class = ApiSearchForm
     paginator_class = ESPaginator
+    cursor_pagination = True
 
     def search(self, request):
         """
@@ -187,6 +225,10 @@ class SearchView(CORSMixin, MarketplaceView, GenericAPIView):
         # Sort.
         sq = _sort_search(request, sq, form_data)
 
+        # Popular searches are made over and over, cache their hits.
+        if settings.SEARCH_CACHE_TIMEOUT:
+            sq = sq.cache(settings.SEARCH_CACHE_TIMEOUT)
+
         # Done.
         page = self.paginate_queryset(sq)
         return self.get_pagination_serializer(page), form_data.get('q', '')
@@ -199,7 +241,11 @@ class SearchView(CORSMixin, MarketplaceView, GenericAPIView):
 class FeaturedSearchView(SearchView):
     collections_serializer_class = CollectionSerializer
 
-    def collections(self, request, collection_type=None, limit=1):
+    def get_collections(self, request, collection_type=None, limit=1):
+        """
+        Return the list of collections to feature and the filters they fell
+        back from, if any.
+        """
         filters = request.GET.dict()
         region = self.get_region_from_request(request)
         if region:
@@ -209,14 +255,23 @@ class FeaturedSearchView(SearchView):
         else:
             qs = Collection.public.all()
         qs = CollectionFilterSetWithFallback(filters, queryset=qs).qs
-        preview_mode = filters.get('preview', False)
-        serializer = self.collections_serializer_class(
-            qs[:limit], many=True, context={
-                'request': request,
-                'view': self,
-                'use-es-for-apps': not preview_mode}
-        )
-        return serializer.data, getattr(qs, 'filter_fallback', None)
+        return list(qs[:limit]), getattr(qs, 'filter_fallback', None)
+
+    def get_collections_context(self, request, collections):
+        """
+        Return the context to serialize `collections` with. Unless in preview
+        mode, the apps of all the collections are fetched from ES at once.
+        """
+        preview_mode = request.GET.get('preview', False)
+        context = {
+            'request': request,
+            'view': self,
+            'use-es-for-apps': not preview_mode}
+        if collections and not preview_mode:
+            field = self.collections_serializer_class().fields['apps']
+            context['es-collection-apps'] = field.get_apps_es(collections,
+                                                              request)
+        return context
 
     def get(self, request, *args, **kwargs):
         serializer, _ = self.search(request)
@@ -236,13 +291,22 @@ class FeaturedSearchView(SearchView):
             ('featured', COLLECTIONS_TYPE_FEATURED),
             ('operator', COLLECTIONS_TYPE_OPERATOR),
         )
+        collections = {}
         filter_fallbacks = {}
         for name, col_type in types:
-            data[name], fallback = self.collections(request,
-                                                    collection_type=col_type)
+            collections[name], fallback = self.get_collections(
+                request, collection_type=col_type)
             if fallback:
                 filter_fallbacks[name] = fallback
 
+        # Serialize all the collections with the same context, so their apps
+        # are fetched in one go.
+        context = self.get_collections_context(
+            request, sum(collections.values(), []))
+        for name, col_type in types:
+            data[name] = self.collections_serializer_class(
+                collections[name], many=True, context=context).data
+
         return data, filter_fallbacks
 
 
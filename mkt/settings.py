@@ -427,6 +427,13 @@ CELERYD_HIJACK_ROOT_LOGGER = False
 # a separate, shorter timeout for validation tasks.
 CELERYD_TASK_SOFT_TIME_LIMIT = 60 * 2
 
+# Maximum number of ids in each call of a coalescing post request task, e.g.
+# index_webapps, once the calls made during a request have been merged.
+POST_REQUEST_TASK_CHUNK_SIZE = 100
+# Outside of requests and tasks (cron jobs, management commands), the post
+# request tasks are sent once they have been queued for that many seconds.
+POST_REQUEST_TASK_FLUSH_INTERVAL = 10
+
 
 ###########################################
 # Recommendations
@@ -674,6 +681,8 @@ ENABLE_API_ERROR_SERVICE = False
 ENGAGE_ROBOTS = True
 
 # ElasticSearch
+# Number of actions sent in each request to the ES bulk API.
+ES_BULK_CHUNK_SIZE = 500
 # Locally we typically don't run more than 1 elasticsearch node. So we set
 # replicas to zero.
 ES_DEFAULT_NUM_REPLICAS = 0
@@ -692,10 +701,30 @@ ES_INDEXES = {
 ES_URLS = ['http://%s' % h for h in ES_HOSTS]
 ES_USE_PLUGINS = False
 ES_TIMEOUT = 30
+# How long ES keeps the scroll behind the export mode of a cursor paginated
+# search between two pages, see ESPaginator.scroll_page().
+ES_SCROLL_TIMEOUT = '5m'
+# A reindexing chunk that hasn't started or finished for that many seconds
+# since it was queued or started is considered lost, and queued again by
+# `reindex --resume`. It has to be longer than chunks may wait in the queue.
+ES_REINDEX_CHUNK_TIMEOUT = 60 * 60
+# Number of seconds the hits of the searches made through the API are cached,
+# and the names of the indices behind the ES aliases they run on.
+SEARCH_CACHE_TIMEOUT = 60
+SEARCH_INDEX_CACHE_TIMEOUT = 60 * 5
+
+# Number of seconds the ids of the apps excluded from a region are cached.
+# Saving or deleting an excluded region invalidates that region's cache.
+EXCLUDED_IN_CACHE_TIMEOUT = 60 * 60
 
 # When True include full tracebacks in JSON. This is useful for QA on preview.
 EXPOSE_VALIDATOR_TRACEBACKS = True
 
+# Number of seconds the feed served to anonymous users is cached, and how
+# much longer a stale feed is served while a new one is built.
+FEED_CACHE_STALE_TIMEOUT = 60 * 10
+FEED_CACHE_TIMEOUT = 60
+
 # Django cache machine settings.
 FETCH_BY_ID = True
 
@@ -917,6 +946,16 @@ MINIFY_MOZMARKET = True
 MONOLITH_SERVER = None
 MONOLITH_INDEX = 'time_*'
 MONOLITH_MAX_DATE_RANGE = 365
+# Number of seconds each request to Monolith may take.
+MONOLITH_TIMEOUT = 10
+# Number of seconds the time series fetched from Monolith are cached. Series
+# ending before yesterday no longer change and are cached for longer.
+MONOLITH_CACHE_TIMEOUT = 60 * 5
+MONOLITH_CLOSED_CACHE_TIMEOUT = 60 * 60 * 24
+# Number of threads requesting the lines of multi-line stats concurrently, and
+# the number of seconds to wait for them.
+MONOLITH_THREADS = 8
+MONOLITH_LINE_TIMEOUT = 10
 
 # The issuer for unverified Persona email addresses.
 # We only trust one issuer to grant us unverified emails.
@@ -1150,6 +1189,14 @@ TOWER_KEYWORDS = {
 }
 TOWER_ADD_HEADERS = True
 
+# Number of seconds the translations attached to objects are cached. Saving or
+# deleting a translation invalidates its cache.
+TRANSLATION_CACHE_TIMEOUT = 60 * 60
+
+# Number of seconds the sanitized HTML of purified and linkified translations
+# is cached, by source string.
+TRANSLATION_CLEAN_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
 # Path to uglifyjs (our JS minifier).
 UGLIFY_BIN = os.environ.get('UGLIFY_BIN',
                             path('node_modules/uglify-js/bin/uglifyjs'))
@@ -1184,6 +1231,14 @@ VIDEO_LIBRARIES = ['lib.video.totem', 'lib.video.ffmpeg']
 # Default app name for our webapp as specified in `manifest.webapp`.
 WEBAPP_MANIFEST_NAME = 'Marketplace'
 
+# The maximum number of receipts that can be verified in one request.
+WEBAPPS_RECEIPT_BATCH_SIZE = 50
+
+# How many decoded receipts the receipt verification service keeps in memory
+# and for how long, in seconds.
+WEBAPPS_RECEIPT_CACHE_SIZE = 10000
+WEBAPPS_RECEIPT_CACHE_TIMEOUT = 60 * 10
+
 # Send a new receipt back when it expires.
 WEBAPPS_RECEIPT_EXPIRED_SEND = False
 
@@ -1194,6 +1249,11 @@ WEBAPPS_RECEIPT_EXPIRY_SECONDS = 60 * 60 * 24 * 182
 # The key we'll use to sign webapp receipts.
 WEBAPPS_RECEIPT_KEY = os.path.join(ROOT, 'mkt/webapps/tests/sample.key')
 
+# How long, in seconds, the receipt verification service remembers whether an
+# app was purchased (or not) by a user. Keep it short so that purchases and
+# refunds are noticed quickly.
+WEBAPPS_RECEIPT_PURCHASE_CACHE_TIMEOUT = 60
+
 WEBAPPS_UNIQUE_BY_DOMAIN = False
 
 # Whitelist IP addresses of the allowed clients that can post email
@@ -7,13 +7,22 @@ from mkt.stats import tasks
 
 
 @cronjobs.register
-def update_monolith_stats(date=None):
-    """Update monolith statistics."""
+def update_monolith_stats(date=None, end=None):
+    """
+    Update monolith statistics.
+
+    When an `end` date is given, the statistics of every day from `date` to
+    `end` included are backfilled.
+    """
     if date:
         date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
     today = date or datetime.date.today()
-    jobs = [{'metric': metric,
-             'date': today} for metric in tasks._get_monolith_jobs(date)]
+    if end:
+        end = datetime.datetime.strptime(end, '%Y-%m-%d').date()
+    days = [today + datetime.timedelta(days=n)
+            for n in range(((end or today) - today).days + 1)]
+    jobs = [{'metric': metric, 'date': day}
+            for day in days for metric in tasks._get_monolith_jobs(date)]
 
     ts = [tasks.update_monolith_stats.subtask(kwargs=kw) for kw in jobs]
     TaskSet(ts).apply_async()
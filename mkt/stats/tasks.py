@@ -1,15 +1,19 @@
 import json
 import logging
 import datetime
+from functools import partial
+
+from django.db.models import Count
 
 from celeryutils import task
 
 import amo
-from mkt.constants.regions import REGIONS_CHOICES_SLUG
+from mkt.constants.regions import (REGIONS_CHOICES_ID_DICT,
+                                   REGIONS_CHOICES_SLUG)
 from mkt.monolith.models import MonolithRecord
 from mkt.site.decorators import write
 from mkt.ratings.models import Review
-from mkt.webapps.models import AddonUser, Webapp
+from mkt.webapps.models import AddonExcludedRegion, AddonUser, Webapp
 from mkt.users.models import UserProfile
 
 
@@ -23,6 +27,7 @@ def update_monolith_stats(metric, date, **kw):
 
     jobs = _get_monolith_jobs(date)[metric]
 
+    records = []
     for job in jobs:
         try:
             # Only record if count is greater than zero.
@@ -32,8 +37,8 @@ def update_monolith_stats(metric, date, **kw):
                 if 'dimensions' in job:
                     value.update(job['dimensions'])
 
-                MonolithRecord.objects.create(recorded=date, key=metric,
-                                              value=json.dumps(value))
+                records.append(MonolithRecord(recorded=date, key=metric,
+                                              value=json.dumps(value)))
 
                 log.info('Monolith stats details: (%s) has (%s) for (%s). '
                          'Value: %s' % (metric, count, date, value))
@@ -45,6 +50,56 @@ def update_monolith_stats(metric, date, **kw):
             log.critical('Update of monolith table failed: (%s): %s'
                          % ([metric, date], e))
 
+    # Replace the records of a previous run, e.g. when backfilling.
+    MonolithRecord.objects.filter(recorded=date, key=metric).delete()
+    MonolithRecord.objects.bulk_create(records)
+
+
+def _count_apps_by_region(filters):
+    """
+    Counts the apps matching `filters` in each region, by package type and
+    by premium type, from two grouped queries.
+
+    Returns a function taking a region id and either a package type or a
+    premium type, and returning the count. The queries are only run on the
+    first call.
+    """
+    counts = {}
+
+    def keys(region_id, is_packaged, premium_type):
+        return [(region_id, 'packaged' if is_packaged else 'hosted', None),
+                (region_id, None, premium_type)]
+
+    def count(region_id, package_type=None, premium_type=None):
+        if not counts:
+            # The apps by package type and premium type...
+            apps = (Webapp.objects.filter(**filters).order_by()
+                    .values_list('is_packaged', 'premium_type')
+                    .annotate(Count('id')))
+            # ...minus the apps excluded from each region.
+            excluded = (AddonExcludedRegion.objects
+                        .filter(**dict(('addon__' + k, v)
+                                       for k, v in filters.items()))
+                        .exclude(addon__status=amo.STATUS_DELETED)
+                        .order_by()
+                        .values_list('region', 'addon__is_packaged',
+                                     'addon__premium_type')
+                        .annotate(Count('id')))
+
+            # Marks the queries as run, even when no app matches.
+            counts[None] = 0
+            for is_packaged, premium, total in apps:
+                for region in REGIONS_CHOICES_ID_DICT:
+                    for key in keys(region, is_packaged, premium):
+                        counts[key] = counts.get(key, 0) + total
+            for region, is_packaged, premium, total in excluded:
+                for key in keys(region, is_packaged, premium):
+                    counts[key] = counts.get(key, 0) - total
+
+        return counts.get((region_id, package_type, premium_type), 0)
+
+    return count
+
 
 def _get_monolith_jobs(date=None):
     """
@@ -102,7 +157,7 @@ def _get_monolith_jobs(date=None):
     }
 
     # Add various "Apps Added" for all the dimensions we need.
-    apps = Webapp.objects.filter(created__range=(date, next_date))
+    count = _count_apps_by_region({'created__range': (date, next_date)})
 
     package_counts = []
     premium_counts = []
@@ -115,10 +170,7 @@ def _get_monolith_jobs(date=None):
         # Apps added by package type and region.
         for package_type in package_types.values():
             package_counts.append({
-                'count': (apps
-                          .filter(is_packaged=package_type == 'packaged')
-                          .exclude(addonexcludedregion__region=region.id)
-                          .count),
+                'count': partial(count, region.id, package_type=package_type),
                 'dimensions': {'region': region_slug,
                                'package_type': package_type},
             })
@@ -126,10 +178,7 @@ def _get_monolith_jobs(date=None):
         # Apps added by premium type and region.
         for premium_type, pt_name in amo.ADDON_PREMIUM_API.items():
             premium_counts.append({
-                'count': (apps
-                          .filter(premium_type=premium_type)
-                          .exclude(addonexcludedregion__region=region.id)
-                          .count),
+                'count': partial(count, region.id, premium_type=premium_type),
                 'dimensions': {'region': region_slug,
                                'premium_type': pt_name},
             })
@@ -138,9 +187,10 @@ def _get_monolith_jobs(date=None):
     stats.update({'apps_added_by_premium_type': premium_counts})
 
     # Add various "Apps Available" for all the dimensions we need.
-    apps = Webapp.objects.filter(_current_version__reviewed__lt=next_date,
-                                 status__in=amo.LISTED_STATUSES,
-                                 disabled_by_user=False)
+    count = _count_apps_by_region({
+        '_current_version__reviewed__lt': next_date,
+        'status__in': amo.LISTED_STATUSES,
+        'disabled_by_user': False})
     package_counts = []
     premium_counts = []
 
@@ -148,10 +198,7 @@ def _get_monolith_jobs(date=None):
         # Apps available by package type and region.
         for package_type in package_types.values():
             package_counts.append({
-                'count': (apps
-                          .filter(is_packaged=package_type == 'packaged')
-                          .exclude(addonexcludedregion__region=region.id)
-                          .count),
+                'count': partial(count, region.id, package_type=package_type),
                 'dimensions': {'region': region_slug,
                                'package_type': package_type},
             })
@@ -159,10 +206,7 @@ def _get_monolith_jobs(date=None):
         # Apps available by premium type and region.
         for premium_type, pt_name in amo.ADDON_PREMIUM_API.items():
             premium_counts.append({
-                'count': (apps
-                          .filter(premium_type=premium_type)
-                          .exclude(addonexcludedregion__region=region.id)
-                          .count),
+                'count': partial(count, region.id, premium_type=premium_type),
                 'dimensions': {'region': region_slug,
                                'premium_type': pt_name},
             })
@@ -4,9 +4,11 @@ import mock
 from nose.tools import eq_
 
 import amo.tests
+import mkt.regions
 from mkt.constants.regions import REGIONS_CHOICES_SLUG
+from mkt.monolith.models import MonolithRecord
 from mkt.ratings.models import Review
-from mkt.stats import tasks
+from mkt.stats import cron, tasks
 from mkt.users.models import UserProfile
 from mkt.versions.models import Version
 from mkt.webapps.models import AddonUser, Webapp
@@ -20,8 +22,36 @@ class TestMonolithStats(amo.tests.TestCase):
         metric = 'mmo_user_count_total'
 
         tasks.update_monolith_stats(metric, datetime.date.today())
-        self.assertTrue(record.objects.create.called)
-        eq_(record.objects.create.call_args[1]['value'], '{"count": 1}')
+        self.assertTrue(record.objects.bulk_create.called)
+        eq_(record.call_args[1]['value'], '{"count": 1}')
+
+    def test_update_replaces_records(self):
+        today = datetime.date.today()
+        UserProfile.objects.create(source=amo.LOGIN_SOURCE_MMO_BROWSERID)
+        tasks.update_monolith_stats('mmo_user_count_total', today)
+        tasks.update_monolith_stats('mmo_user_count_total', today)
+        eq_(MonolithRecord.objects.filter(key='mmo_user_count_total')
+                                  .count(), 1)
+
+    @mock.patch('mkt.stats.cron.TaskSet')
+    @mock.patch('mkt.stats.tasks.update_monolith_stats')
+    def test_backfill(self, update, task_set):
+        cron.update_monolith_stats('2013-01-30', '2013-02-01')
+        dates = set(c[1]['kwargs']['date']
+                    for c in update.subtask.call_args_list)
+        eq_(dates, set([datetime.date(2013, 1, 30),
+                        datetime.date(2013, 1, 31),
+                        datetime.date(2013, 2, 1)]))
+
+    def test_app_added_counts_queries(self):
+        app = Webapp.objects.create()
+        app.addonexcludedregion.create(region=mkt.regions.BR.id)
+        jobs = tasks._get_monolith_jobs()
+        with self.assertNumQueries(2):
+            counts = [job['count']()
+                      for job in jobs['apps_added_by_package_type'] +
+                                 jobs['apps_added_by_premium_type']]
+        eq_(sum(counts), 2 * (len(REGIONS_CHOICES_SLUG) - 1))
 
     def test_app_new(self):
         Webapp.objects.create()
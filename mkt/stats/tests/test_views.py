@@ -1,13 +1,17 @@
 import json
+import time
 
 import mock
 import requests
 from nose.tools import eq_, ok_
+from rest_framework.exceptions import ParseError
 from rest_framework.reverse import reverse
 
 from django.conf import settings
 
 import amo
+from lib.metrics import reset_monolith_clients
+from mkt.api.exceptions import ServiceUnavailable
 from mkt.purchase.models import Contribution
 
 from mkt.api.tests.test_oauth import RestOAuth
@@ -19,6 +23,8 @@ class StatsAPITestMixin(object):
 
     def setUp(self):
         super(StatsAPITestMixin, self).setUp()
+        # The clients of every thread must be created with the mocks below.
+        reset_monolith_clients()
         patches = [
             mock.patch('monolith.client.Client'),
             mock.patch.object(settings, 'MONOLITH_SERVER', 'http://0.0.0.0:0'),
@@ -84,7 +90,11 @@ class TestGlobalStatsResource(StatsAPITestMixin, RestOAuth):
         res = self.client.get(self.url('apps_added_by_package'), data=data)
         eq_(res.status_code, 200)
         ok_(client.called)
-        eq_(client.call_args[1], {'region': 'br', 'package_type': 'hosted'})
+        # Each line is requested with its own package type.
+        eq_(sorted(c[1]['package_type'] for c in client.call_args_list),
+            ['hosted', 'packaged', 'privileged'])
+        for call in client.call_args_list:
+            eq_(call[1]['region'], 'br')
 
     @mock.patch('monolith.client.Client')
     def test_dimensions_default(self, mocked):
@@ -95,7 +105,8 @@ class TestGlobalStatsResource(StatsAPITestMixin, RestOAuth):
                               data=self.data)
         eq_(res.status_code, 200)
         ok_(client.called)
-        eq_(client.call_args[1], {'region': 'us', 'package_type': 'hosted'})
+        ok_({'region': 'us', 'package_type': 'hosted'} in
+            [c[1] for c in client.call_args_list])
 
     @mock.patch('monolith.client.Client')
     def test_dimensions_default_is_none(self, mocked):
@@ -126,6 +137,67 @@ class TestGlobalStatsResource(StatsAPITestMixin, RestOAuth):
             '2013-10-10', 'day', {})
         eq_(type(data['objects'][0]['count']), str)
 
+    @mock.patch('monolith.client.Client')
+    def test_lines(self, mocked):
+        client = mock.MagicMock()
+        client.side_effect = lambda *args, **kw: [
+            {'count': 1, 'date': kw['package_type']}]
+        mocked.return_value = client
+
+        dimensions = {'region': 'us'}
+        data = _get_monolith_data(STATS['apps_added_by_package'],
+                                  '2013-10-10', '2013-10-10', 'day',
+                                  dimensions)
+        eq_(data, {'hosted': [{'count': 1, 'date': 'hosted'}],
+                   'packaged': [{'count': 1, 'date': 'packaged'}],
+                   'privileged': [{'count': 1, 'date': 'privileged'}]})
+        eq_(dimensions, {'region': 'us'})
+
+    @mock.patch('monolith.client.Client')
+    def test_lines_partial(self, mocked):
+        def get_line(*args, **kw):
+            if kw['package_type'] == 'packaged':
+                raise ValueError
+            return []
+
+        client = mock.MagicMock()
+        client.side_effect = get_line
+        mocked.return_value = client
+
+        failed_lines = []
+        data = _get_monolith_data(STATS['apps_added_by_package'],
+                                  '2013-10-10', '2013-10-10', 'day', {},
+                                  failed_lines)
+        eq_(data, {'hosted': [], 'privileged': []})
+        eq_(failed_lines, ['packaged'])
+
+        res = self.client.get(self.url('apps_added_by_package'),
+                              data=self.data)
+        eq_(res.status_code, 200)
+        eq_(sorted(json.loads(res.content)), ['hosted', 'privileged'])
+        eq_(res['API-Failed-Lines'], 'packaged')
+
+    @mock.patch('monolith.client.Client')
+    def test_lines_error(self, mocked):
+        client = mock.MagicMock()
+        client.side_effect = ValueError
+        mocked.return_value = client
+
+        with self.assertRaises(ParseError):
+            _get_monolith_data(STATS['apps_added_by_package'],
+                               '2013-10-10', '2013-10-10', 'day', {})
+
+    @mock.patch('monolith.client.Client')
+    def test_lines_timeout(self, mocked):
+        client = mock.MagicMock()
+        client.side_effect = lambda *args, **kw: time.sleep(1) or []
+        mocked.return_value = client
+
+        with self.settings(MONOLITH_LINE_TIMEOUT=0):
+            with self.assertRaises(ServiceUnavailable):
+                _get_monolith_data(STATS['apps_added_by_package'],
+                                   '2013-10-10', '2013-10-10', 'day', {})
+
 
 class TestAppStatsResource(StatsAPITestMixin, RestOAuth):
     fixtures = fixture('user_2519')
@@ -1,4 +1,10 @@
+import threading
+import time
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
 from django import http
+from django.conf import settings
 
 import commonware
 import requests
@@ -23,6 +29,10 @@ from .forms import StatsForm
 
 log = commonware.log.getLogger('z.stats')
 
+# Thread pool used to request the lines of multi-line stats concurrently.
+_pool = None
+_pool_lock = threading.Lock()
+
 
 class PublicStats(BasePermission):
     """
@@ -145,10 +155,28 @@ APP_STATS_TOTAL = {
 }
 
 
-def _get_monolith_data(stat, start, end, interval, dimensions):
-    # If stat has a 'lines' attribute, it's a multi-line graph. Do a
-    # request for each item in 'lines' and compose them in a single
-    # response.
+def _get_pool():
+    """
+    Returns the thread pool fetching the lines of multi-line stats, created
+    on the first call.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPool(settings.MONOLITH_THREADS)
+    return _pool
+
+
+def _get_line(metric, start, end, interval, dimensions):
+    # Called from the thread pool, each thread has its own client.
+    return get_monolith_client()(metric, start, end, interval, **dimensions)
+
+
+def _get_monolith_data(stat, start, end, interval, dimensions,
+                       failed_lines=None):
+    # If stat has a 'lines' attribute, it's a multi-line graph. The lines are
+    # requested concurrently and composed in a single response. The names of
+    # the lines that failed are appended to the `failed_lines` list.
     try:
         client = get_monolith_client()
     except requests.ConnectionError as e:
@@ -162,30 +190,63 @@ def _get_monolith_data(stat, start, end, interval, dimensions):
 
         return data
 
-    try:
-        data = {}
-        if 'lines' in stat:
-            for line_name, line_dimension in stat['lines'].items():
-                dimensions.update(line_dimension)
-                data[line_name] = map(_coerce,
-                                      client(stat['metric'], start, end,
-                                             interval, **dimensions))
-
-        else:
-            data['objects'] = map(_coerce,
-                                  client(stat['metric'], start, end, interval,
-                                         **dimensions))
-
-    except ValueError as e:
-        # This occurs if monolith doesn't have our metric and we get an
-        # elasticsearch SearchPhaseExecutionException error.
-        log.info('Monolith ValueError for metric {0}: {1}'.format(
-            stat['metric'], e))
-        raise ParseError('Invalid metric at this time. Try again later.')
+    if 'lines' not in stat:
+        try:
+            return {'objects': map(_coerce,
+                                   client(stat['metric'], start, end,
+                                          interval, **dimensions))}
+        except ValueError as e:
+            # This occurs if monolith doesn't have our metric and we get an
+            # elasticsearch SearchPhaseExecutionException error.
+            log.info('Monolith ValueError for metric {0}: {1}'.format(
+                stat['metric'], e))
+            raise ParseError('Invalid metric at this time. Try again later.')
+
+    pool = _get_pool()
+    results = {}
+    for line_name, line_dimension in stat['lines'].items():
+        results[line_name] = pool.apply_async(
+            _get_line, (stat['metric'], start, end, interval,
+                        dict(dimensions, **line_dimension)))
+
+    # The lines that fail or are not received in time are left out of the
+    # response, unless they all are. The requests themselves time out after
+    # MONOLITH_TIMEOUT, which frees their threads.
+    deadline = time.time() + settings.MONOLITH_LINE_TIMEOUT
+    data, failed, error = {}, [], None
+    for line_name, result in results.items():
+        try:
+            data[line_name] = map(_coerce,
+                                  result.get(max(deadline - time.time(), 0)))
+        except (ValueError, requests.RequestException, TimeoutError) as e:
+            log.info('Monolith error for line {0} of metric {1}: {2!r}'.format(
+                line_name, stat['metric'], e))
+            failed.append(line_name)
+            error = e
+
+    if not data:
+        if isinstance(error, ValueError):
+            raise ParseError('Invalid metric at this time. Try again later.')
+        raise ServiceUnavailable
 
+    if failed_lines is not None:
+        failed_lines.extend(sorted(failed))
     return data
 
 
+def _get_monolith_response(stat, start, end, interval, dimensions):
+    """
+    Returns the response of the Monolith data of `stat`, the lines of it that
+    could not be fetched are listed in its API-Failed-Lines header.
+    """
+    failed_lines = []
+    response = Response(_get_monolith_data(stat, start, end, interval,
+                                           dimensions, failed_lines))
+    if failed_lines:
+        response['API-Failed-Lines'] = ', '.join(failed_lines)
+    return response
+
+
 class GlobalStats(CORSMixin, APIView):
     authentication_classes = (RestOAuthAuthentication,
                               RestSharedSecretAuthentication)
@@ -214,9 +275,8 @@ class GlobalStats(CORSMixin, APIView):
                     # dimension is None to avoid facet filters being applied.
                     dimensions[key] = request.GET.get(key, default)
 
-        return Response(_get_monolith_data(stat, qs.get('start'),
-                                           qs.get('end'), qs.get('interval'),
-                                           dimensions))
+        return _get_monolith_response(stat, qs.get('start'), qs.get('end'),
+                                      qs.get('interval'), dimensions)
 
 
 class AppStats(CORSMixin, SlugOrIdMixin, ListAPIView):
@@ -253,9 +313,8 @@ class AppStats(CORSMixin, SlugOrIdMixin, ListAPIView):
                     # dimension is None to avoid facet filters being applied.
                     dimensions[key] = request.GET.get(key, default)
 
-        return Response(_get_monolith_data(stat, qs.get('start'),
-                                           qs.get('end'), qs.get('interval'),
-                                           dimensions))
+        return _get_monolith_response(stat, qs.get('start'), qs.get('end'),
+                                      qs.get('interval'), dimensions)
 
 
 class StatsTotalBase(object):
@@ -1,6 +1,9 @@
 import collections
+import hashlib
 from itertools import groupby
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import connections, models, router
 from django.db.models.deletion import Collector
 from django.utils import encoding
@@ -17,6 +20,23 @@ from . import utils
 log = commonware.log.getLogger('z.translations')
 
 
+def trans_cache_key(id, locale):
+    """
+    Cache key of the translation row `id` in `locale`, as attached to objects
+    by `transformer.get_trans`. The locale '*' stands for any locale.
+
+    The locale is lowercased: the current language is 'pt-br' when the
+    locale of the rows is 'pt-BR'.
+    """
+    return 'trans:%s:%s' % (id, locale.lower() if locale else locale)
+
+
+def invalidate_trans_cache(id, locales):
+    """Invalidates the cached rows of translation `id` in `locales`."""
+    cache.delete_many([trans_cache_key(id, locale)
+                       for locale in list(locales) + ['*']])
+
+
 class TranslationManager(ManagerBase):
 
     def remove_for(self, obj, locale):
@@ -25,6 +45,8 @@ class TranslationManager(ManagerBase):
         qs = Translation.objects.filter(id__in=filter(None, ids),
                                         locale=locale)
         qs.update(localized_string=None, localized_string_clean=None)
+        for id in filter(None, ids):
+            invalidate_trans_cache(id, [locale])
 
 
 class Translation(ModelBase):
@@ -47,6 +69,11 @@ class Translation(ModelBase):
         db_table = 'translations'
         unique_together = ('id', 'locale')
 
+    def __init__(self, *args, **kwargs):
+        super(Translation, self).__init__(*args, **kwargs)
+        # The locale as loaded, its cache is invalidated if it changes.
+        self._loaded_locale = self.__dict__.get('locale')
+
     def __unicode__(self):
         return self.localized_string and unicode(self.localized_string) or ''
 
@@ -73,9 +100,15 @@ class Translation(ModelBase):
 
     def save(self, **kwargs):
         self.clean()
-        return super(Translation, self).save(**kwargs)
+        rv = super(Translation, self).save(**kwargs)
+        invalidate_trans_cache(self.id, set([self.locale,
+                                             self._loaded_locale]))
+        self._loaded_locale = self.locale
+        return rv
 
     def delete(self, using=None):
+        invalidate_trans_cache(self.id, set([self.locale,
+                                             self._loaded_locale]))
         # FIXME: if the Translation is the one used as default/fallback,
         # then deleting it will mean the corresponding field on the related
         # model will stay empty even if there are translations in other
@@ -193,8 +226,28 @@ class PurifiedTranslation(Translation):
 
     def clean(self):
         super(PurifiedTranslation, self).clean()
-        cleaned = self.clean_localized_string()
-        self.localized_string_clean = utils.clean_nl(cleaned).strip()
+        if self.localized_string is None:
+            cleaned = self.clean_localized_string()
+            self.localized_string_clean = utils.clean_nl(cleaned).strip()
+            return
+
+        # The same string is always cleaned the same way by the same class,
+        # so the cleaned strings are cached by their source.
+        key = self.clean_cache_key(self.localized_string)
+        cleaned = cache.get(key)
+        if cleaned is None:
+            cleaned = utils.clean_nl(self.clean_localized_string()).strip()
+            cache.set(key, cleaned, settings.TRANSLATION_CLEAN_CACHE_TIMEOUT)
+        self.localized_string_clean = cleaned
+
+    @classmethod
+    def clean_cache_key(cls, string):
+        # The outgoing links depend on the redirect settings.
+        policy = repr((cls.__name__, cls.allowed_tags,
+                       sorted(cls.allowed_attributes.items()),
+                       settings.REDIRECT_URL, settings.REDIRECT_SECRET_KEY))
+        return 'trans-clean:%s' % hashlib.md5(
+            policy + encoding.smart_str(string)).hexdigest()
 
     def clean_localized_string(self):
         # All links (text and markup) are normalized.
@@ -259,7 +312,9 @@ def delete_translation(obj, fieldname):
     trans_id = getattr(obj, field.attname)
     obj.update(**{field.name: None})
     if trans_id:
-        Translation.objects.filter(id=trans_id).delete()
+        qs = Translation.objects.filter(id=trans_id)
+        invalidate_trans_cache(trans_id, qs.values_list('locale', flat=True))
+        qs.delete()
 
 
 def _sorted_groupby(seq, key):
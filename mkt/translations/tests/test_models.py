@@ -16,7 +16,7 @@ from mock import patch
 from nose import SkipTest
 from nose.tools import eq_, ok_
 
-from mkt.translations import widgets
+from mkt.translations import transformer, widgets
 from mkt.translations.models import (attach_trans_dict, LinkifiedTranslation,
                                      NoLinksTranslation,
                                      NoLinksNoMarkupTranslation,
@@ -127,6 +127,65 @@ class TranslationTestCase(TestCase):
         finally:
             translation.deactivate()
 
+    def test_fetch_translations_cached(self):
+        TranslatedModel.objects.no_cache().get(id=1)
+        with self.assertNumQueries(1):
+            o = TranslatedModel.objects.no_cache().get(id=1)
+        trans_eq(o.name, 'some name', 'en-US')
+        trans_eq(o.description, 'some description', 'en-US')
+        eq_(unicode(o.no_locale), 'blammo')
+
+    def test_fetch_translations_cached_de_locale(self):
+        TranslatedModel.objects.no_cache().get(id=1)
+        translation.activate('de')
+        TranslatedModel.objects.no_cache().get(id=1)
+        with self.assertNumQueries(1):
+            o = TranslatedModel.objects.no_cache().get(id=1)
+        trans_eq(o.name, 'German!! (unst unst)', 'de')
+        trans_eq(o.description, 'some description', 'en-US')
+
+    def test_fetch_translations_cached_region_locale(self):
+        o = TranslatedModel.objects.no_cache().get(id=1)
+        Translation.objects.create(id=o.name.id, locale='pt-BR',
+                                   localized_string='algum nome')
+        translation.activate('pt-BR')
+        TranslatedModel.objects.no_cache().get(id=1)
+        with self.assertNumQueries(1):
+            o = TranslatedModel.objects.no_cache().get(id=1)
+        trans_eq(o.name, 'algum nome', 'pt-BR')
+        trans_eq(o.description, 'some description', 'en-US')
+
+        # The pt-BR translation isn't cached as the en-US one.
+        translation.activate('en-US')
+        o = TranslatedModel.objects.no_cache().get(id=1)
+        trans_eq(o.name, 'some name', 'en-US')
+
+        # Saving the pt-BR translation invalidates its cached row.
+        translation.activate('pt-BR')
+        o = TranslatedModel.objects.no_cache().get(id=1)
+        o.name.localized_string = 'novo nome'
+        o.name.save()
+        o = TranslatedModel.objects.no_cache().get(id=1)
+        trans_eq(o.name, 'novo nome', 'pt-BR')
+
+    def test_save_invalidates_cached_translation(self):
+        o = TranslatedModel.objects.no_cache().get(id=1)
+        o.name.localized_string = 'new name'
+        o.name.save()
+        o = TranslatedModel.objects.no_cache().get(id=1)
+        trans_eq(o.name, 'new name', 'en-US')
+
+    def test_build_query_memoized(self):
+        connection = connections['default']
+        sql, params = transformer.build_query(TranslatedModel, connection)
+        eq_(sorted(params), ['en-US'] * 5)
+        translation.activate('de')
+        sql_de, params_de = transformer.build_query(TranslatedModel,
+                                                    connection)
+        eq_(sql_de, sql)
+        # The current language, then the fallback of each field.
+        eq_(sorted(params_de), ['de'] * 3 + ['en-US'] * 2)
+
     def test_create_translation(self):
         o = TranslatedModel.objects.create(name='english name')
         get_model = lambda: TranslatedModel.objects.get(id=o.id)
@@ -498,6 +557,18 @@ class PurifiedTranslationTest(TestCase):
         x = PurifiedTranslation(localized_string=s)
         eq_(x.__html__(), 'This is some text')
 
+    @patch('mkt.translations.models.bleach.clean')
+    def test_clean_cached(self, clean):
+        clean.return_value = u'<b>bold</b>'
+        s = u'<b>bold</b>'
+        eq_(PurifiedTranslation(localized_string=s).__html__(), s)
+        eq_(PurifiedTranslation(localized_string=s).__html__(), s)
+        eq_(clean.call_count, 1)
+
+        # Another class cleans the same string with its own policy.
+        eq_(LinkifiedTranslation(localized_string=s).__html__(), s)
+        eq_(clean.call_count, 2)
+
     def test_allowed_tags(self):
         s = u'<b>bold text</b> or <code>code</code>'
         x = PurifiedTranslation(localized_string=s)
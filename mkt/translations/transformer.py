@@ -1,9 +1,10 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.db import connections, models, router
 from django.utils import translation
 
 from mkt.translations.fields import TranslatedField
-from mkt.translations.models import Translation
+from mkt.translations.models import Translation, trans_cache_key
 
 isnull = """IF(!ISNULL({t1}.localized_string), {t1}.{col}, {t2}.{col})
             AS {name}_{col}"""
@@ -15,20 +16,41 @@ no_locale_join = """LEFT OUTER JOIN translations {t}
 trans_fields = [f.name for f in Translation._meta.fields]
 
 
-def build_query(model, connection):
-    qn = connection.ops.quote_name
-    selects, joins, params = [], [], []
+# The built queries, by model, database and fallback locale.
+_queries = {}
 
+# Caches a translation row as missing.
+MISSING = ()
+
+
+def get_fallback(model):
     # The model can define a fallback locale (which may be a Field).
     if hasattr(model, 'get_fallback'):
-        fallback = model.get_fallback()
-    else:
-        fallback = settings.LANGUAGE_CODE
+        return model.get_fallback()
+    return settings.LANGUAGE_CODE
+
 
+def build_query(model, connection):
     if not hasattr(model._meta, 'translated_fields'):
         model._meta.translated_fields = [f for f in model._meta.fields
                                          if isinstance(f, TranslatedField)]
 
+    fallback = get_fallback(model)
+    key = (model, connection.alias,
+           fallback.name if isinstance(fallback, models.Field) else fallback)
+    if key not in _queries:
+        _queries[key] = _build_query(model, connection, fallback)
+
+    # The current language is None in the params of the built query.
+    sql, params = _queries[key]
+    lang = translation.get_language()
+    return sql, [lang if p is None else p for p in params]
+
+
+def _build_query(model, connection, fallback):
+    qn = connection.ops.quote_name
+    selects, joins, params = [], [], []
+
     # Add the selects and joins for each translated field on the model.
     for field in model._meta.translated_fields:
         if isinstance(fallback, models.Field):
@@ -44,7 +66,7 @@ def build_query(model, connection):
         selects.extend(isnull.format(col=f, **d) for f in trans_fields)
 
         joins.append(join.format(t=d['t1'], locale='%s', **d))
-        params.append(translation.get_language())
+        params.append(None)
 
         if field.require_locale:
             joins.append(join.format(t=d['t2'], locale=fallback_str, **d))
@@ -61,6 +83,36 @@ def build_query(model, connection):
     return s, params
 
 
+def _trans_locales(item, field, fallback):
+    """
+    The locales in which the translation of `field` is looked up for `item`:
+    the current language, then the fallback locale or any locale.
+    """
+    if not field.require_locale:
+        return translation.get_language(), '*'
+    if isinstance(fallback, models.Field):
+        return translation.get_language(), getattr(item, fallback.attname)
+    return translation.get_language(), fallback
+
+
+def _cached_trans(cached, keys):
+    """
+    Returns the first translation row of `keys` that is not cached as
+    missing, MISSING if they all are, or None if one of them isn't cached.
+    """
+    for key in keys:
+        row = cached.get(key)
+        if row is None or row != MISSING:
+            return row
+    return MISSING
+
+
+def _attach_trans(item, field, row):
+    t = Translation(*row) if row else None
+    if t and t.id is not None and t.localized_string is not None:
+        setattr(item, field.name, t)
+
+
 def get_trans(items):
     if not items:
         return
@@ -71,17 +123,63 @@ def get_trans(items):
     dbname = router.db_for_read(model)
     connection = connections[dbname]
     sql, params = build_query(model, connection)
-    item_dict = dict((item.pk, item) for item in items)
-    ids = ','.join(map(str, item_dict.keys()))
+    fields = model._meta.translated_fields
+    fallback = get_fallback(model)
+
+    # The cache keys of the translations of each item and field.
+    keys = {}
+    for item in items:
+        for field in fields:
+            trans_id = getattr(item, field.attname)
+            if trans_id is not None:
+                keys[item.pk, field.name] = [
+                    trans_cache_key(trans_id, locale)
+                    for locale in _trans_locales(item, field, fallback)]
+    cached = cache.get_many([key for k in keys.values() for key in k])
+
+    # Attach the cached translations, the items missing any are queried.
+    item_dict = {}
+    for item in items:
+        rows = [_cached_trans(cached, keys[item.pk, field.name])
+                if (item.pk, field.name) in keys else MISSING
+                for field in fields]
+        if None in rows:
+            item_dict[item.pk] = item
+        else:
+            for field, row in zip(fields, rows):
+                _attach_trans(item, field, row)
+    if not item_dict:
+        return
 
+    ids = ','.join(map(str, item_dict.keys()))
     cursor = connection.cursor()
     cursor.execute(sql.format(ids='(%s)' % ids), tuple(params))
     step = len(trans_fields)
+    to_cache = {}
     for row in cursor.fetchall():
         # We put the item's pk as the first selected field.
         item = item_dict[row[0]]
-        for index, field in enumerate(model._meta.translated_fields):
+        for index, field in enumerate(fields):
             start = 1 + step * index
-            t = Translation(*row[start:start+step])
-            if t.id is not None and t.localized_string is not None:
-                setattr(item, field.name, t)
+            trans_row = row[start:start+step]
+            _attach_trans(item, field, trans_row)
+
+            # Cache the translation found, and the ones found missing.
+            if (item.pk, field.name) not in keys:
+                continue
+            lang_key, fallback_key = keys[item.pk, field.name]
+            t = Translation(*trans_row)
+            if t.id is None:
+                to_cache[lang_key] = to_cache[fallback_key] = MISSING
+                continue
+            # Compare the keys, they don't depend on the case of the locales.
+            row_key = trans_cache_key(t.id, t.locale)
+            if row_key == lang_key and t.localized_string is not None:
+                to_cache[lang_key] = trans_row
+            else:
+                to_cache[lang_key] = MISSING
+                # Another locale than the fallback one is only found when
+                # the field doesn't require a locale.
+                if fallback_key in (row_key, trans_cache_key(t.id, '*')):
+                    to_cache[fallback_key] = trans_row
+    cache.set_many(to_cache, settings.TRANSLATION_CACHE_TIMEOUT)
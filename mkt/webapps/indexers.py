@@ -3,8 +3,8 @@ from operator import attrgetter
 
 from django.conf import settings
 from django.core.urlresolvers import reverse
-from django.db.models import Min
-from elasticsearch_dsl import F, filter as es_filter, query
+from django.db.models import Count
+from elasticsearch_dsl import F, filter as es_filter
 
 import commonware.log
 
@@ -222,19 +222,140 @@ class WebappIndexer(BaseIndexer):
     @classmethod
     def extract_document(cls, pk=None, obj=None):
         """Extracts the ElasticSearch index document for this instance."""
-        from mkt.webapps.models import (AppFeatures, attach_devices,
-                                        attach_prices, attach_tags,
-                                        attach_translations, Geodata,
-                                        Installed, RatingDescriptors,
-                                        RatingInteractives)
-
         if obj is None:
             obj = cls.get_model().objects.no_cache().get(pk=pk)
+        return cls.extract_documents([obj])[0]
+
+    @classmethod
+    def extract_documents(cls, objs):
+        """
+        Extracts the ElasticSearch index documents for a list of instances.
+
+        The related objects are fetched for all the instances at once, so the
+        number of queries doesn't grow with the number of instances.
+        """
+        related = cls.get_related(objs)
+        return [cls._extract_document(obj, related) for obj in objs]
+
+    @classmethod
+    def get_related(cls, objs):
+        """
+        Fetch everything needed to extract the documents of `objs`, in a
+        fixed number of queries.
+
+        Some of it is attached to the instances, the rest is returned as a
+        dict of maps keyed by app id.
+        """
+        from mkt.collections.models import CollectionMembership
+        from mkt.reviewers.models import EscalationQueue, RereviewQueue
+        from mkt.webapps.models import (AddonUpsell, AddonUser,
+                                        attach_devices, attach_prices,
+                                        attach_tags, attach_translations,
+                                        Geodata, get_excluded_regions,
+                                        Installed, Preview, Webapp)
+
+        objs = list(objs)
+        ids = [obj.id for obj in objs]
 
         # Attach everything we need to index apps.
         for transform in (attach_devices, attach_prices, attach_tags,
                           attach_translations):
-            transform([obj])
+            transform(objs)
+
+        installed = dict(Installed.objects.no_cache()
+                         .filter(addon__in=ids).values('addon')
+                         .annotate(count=Count('id'))
+                         .values_list('addon', 'count'))
+
+        collections = {}
+        memberships = (CollectionMembership.objects.no_cache()
+                       .filter(app__in=ids).order_by('order')
+                       .values_list('app', 'collection', 'order'))
+        for app_id, collection_id, order in memberships:
+            collections.setdefault(app_id, []).append(
+                {'id': collection_id, 'order': order})
+
+        owners = {}
+        for app_id, user_id in (AddonUser.objects.no_cache()
+                                .filter(addon__in=ids,
+                                        role=amo.AUTHOR_ROLE_OWNER)
+                                .values_list('addon', 'user')):
+            owners.setdefault(app_id, []).append(user_id)
+
+        previews = {}
+        qs = (Preview.objects.no_cache().no_transforms()
+              .filter(addon__in=ids).order_by('position', 'created'))
+        for preview in qs:
+            previews.setdefault(preview.addon_id, []).append(
+                {'filetype': preview.filetype, 'modified': preview.modified,
+                 'id': preview.id, 'sizes': preview.sizes})
+
+        versions = {}
+        reviewed = {}
+        qs = (Version.objects.no_cache().filter(addon__in=ids)
+              .values_list('addon', 'id', 'version', 'reviewed'))
+        for app_id, version_id, version, date in qs:
+            versions.setdefault(app_id, []).append(
+                {'version': version,
+                 'resource_uri': reverse('version-detail',
+                                         kwargs={'pk': version_id})})
+            if date and (app_id not in reviewed or date < reviewed[app_id]):
+                reviewed[app_id] = date
+
+        escalated = set(EscalationQueue.objects.no_cache()
+                        .filter(addon__in=ids)
+                        .values_list('addon', flat=True))
+        rereviewed = set(RereviewQueue.objects.no_cache()
+                         .filter(addon__in=ids)
+                         .values_list('addon', flat=True))
+
+        # Attach the geodata, creating the missing ones like `geodata` does.
+        geodata = dict((g.addon_id, g) for g in
+                       Geodata.objects.no_cache().filter(addon__in=ids))
+        for obj in objs:
+            obj._geodata = geodata.get(obj.id) or obj.geodata
+        attach_trans_dict(Geodata, [obj._geodata for obj in objs])
+
+        current_versions = filter(None, (obj.current_version for obj in objs))
+        attach_trans_dict(Version, current_versions)
+
+        # Attach the upsells along with their premium apps.
+        upsells = dict((u.free_id, u) for u in
+                       AddonUpsell.objects.no_cache().filter(free__in=ids))
+        premiums = dict((app.id, app) for app in
+                        Webapp.objects.no_cache().filter(
+                            id__in=[u.premium_id for u in upsells.values()]))
+        for obj in objs:
+            upsell = upsells.get(obj.id)
+            if upsell and upsell.premium_id in premiums:
+                upsell.premium = premiums[upsell.premium_id]
+            else:
+                upsell = None
+            # `upsell` is a read-only cached property, fill its cache.
+            obj.__dict__['upsell'] = upsell
+
+        region_exclusions = get_excluded_regions(objs + premiums.values())
+
+        return {
+            'collections': collections,
+            'escalated': escalated,
+            'installed': installed,
+            'owners': owners,
+            'previews': previews,
+            'region_exclusions': region_exclusions,
+            'rereviewed': rereviewed,
+            'reviewed': reviewed,
+            'versions': versions,
+        }
+
+    @classmethod
+    def _extract_document(cls, obj, related):
+        """
+        Extracts the ElasticSearch index document for an instance, using the
+        related objects returned by `get_related`.
+        """
+        from mkt.webapps.models import (AppFeatures, RatingDescriptors,
+                                        RatingInteractives)
 
         latest_version = obj.latest_version
         version = obj.current_version
@@ -247,22 +368,20 @@ class WebappIndexer(BaseIndexer):
         except IndexError:
             status = None
 
-        installed_ids = list(Installed.objects.filter(addon=obj)
-                             .values_list('id', flat=True))
+        installs = related['installed'].get(obj.id, 0)
 
         attrs = ('app_slug', 'bayesian_rating', 'created', 'id', 'is_disabled',
                  'last_updated', 'modified', 'premium_type', 'status',
                  'uses_flash', 'weekly_downloads')
         d = dict(zip(attrs, attrgetter(*attrs)(obj)))
 
-        d['boost'] = len(installed_ids) or 1
+        d['boost'] = installs or 1
         d['app_type'] = obj.app_type_id
         d['author'] = obj.developer_name
         d['banner_regions'] = geodata.banner_regions_slugs()
         d['category'] = obj.categories if obj.categories else []
         if obj.is_published:
-            d['collection'] = [{'id': cms.collection_id, 'order': cms.order}
-                               for cms in obj.collectionmembership_set.all()]
+            d['collection'] = related['collections'].get(obj.id, [])
         else:
             d['collection'] = []
         d['content_ratings'] = (obj.get_content_ratings_by_body(es=True) or
@@ -283,10 +402,10 @@ class WebappIndexer(BaseIndexer):
             d['interactive_elements'] = obj.rating_interactives.to_keys()
         except RatingInteractives.DoesNotExist:
             d['interactive_elements'] = []
-        d['is_escalated'] = obj.escalationqueue_set.exists()
+        d['is_escalated'] = obj.id in related['escalated']
         d['is_offline'] = getattr(obj, 'is_offline', False)
         d['is_priority'] = obj.priority_review
-        d['is_rereviewed'] = obj.rereviewqueue_set.exists()
+        d['is_rereviewed'] = obj.id in related['rereviewed']
         if latest_version:
             d['latest_version'] = {
                 'status': status,
@@ -310,12 +429,9 @@ class WebappIndexer(BaseIndexer):
         d['name'] = list(
             set(string for _, string in obj.translations[obj.name_id]))
         d['name_sort'] = unicode(obj.name).lower()
-        d['owners'] = [au.user.id for au in
-                       obj.addonuser_set.filter(role=amo.AUTHOR_ROLE_OWNER)]
-        d['popularity'] = len(installed_ids)
-        d['previews'] = [{'filetype': p.filetype, 'modified': p.modified,
-                          'id': p.id, 'sizes': p.sizes}
-                         for p in obj.previews.all()]
+        d['owners'] = related['owners'].get(obj.id, [])
+        d['popularity'] = installs
+        d['previews'] = related['previews'].get(obj.id, [])
         try:
             p = obj.addonpremium.price
             d['price_tier'] = p.name
@@ -326,9 +442,8 @@ class WebappIndexer(BaseIndexer):
             'average': obj.average_rating,
             'count': obj.total_reviews,
         }
-        d['region_exclusions'] = obj.get_excluded_region_ids()
-        d['reviewed'] = obj.versions.filter(
-            deleted=False).aggregate(Min('reviewed')).get('reviewed__min')
+        d['region_exclusions'] = related['region_exclusions'][obj.id]
+        d['reviewed'] = related['reviewed'].get(obj.id)
         if version:
             d['supported_locales'] = filter(
                 None, version.supported_locales.split(','))
@@ -344,12 +459,11 @@ class WebappIndexer(BaseIndexer):
                 'icon_url': upsell_obj.get_icon_url(128),
                 # TODO: Store all localizations of upsell.name.
                 'name': unicode(upsell_obj.name),
-                'region_exclusions': upsell_obj.get_excluded_region_ids()
+                'region_exclusions':
+                    related['region_exclusions'][upsell_obj.id]
             }
 
-        d['versions'] = [dict(version=v.version,
-                              resource_uri=reverse_version(v))
-                         for v in obj.versions.all()]
+        d['versions'] = related['versions'].get(obj.id, [])
 
         # Handle our localized fields.
         for field in ('description', 'homepage', 'name', 'support_email',
@@ -360,14 +474,12 @@ class WebappIndexer(BaseIndexer):
                 in obj.translations[getattr(obj, '%s_id' % field)]
                 if string]
         if version:
-            attach_trans_dict(Version, [version])
             d['release_notes_translations'] = [
                 {'lang': to_language(lang), 'string': string}
                 for lang, string
                 in version.translations[version.releasenotes_id]]
         else:
             d['release_notes_translations'] = None
-        attach_trans_dict(Geodata, [geodata])
         d['banner_message_translations'] = [
             {'lang': to_language(lang), 'string': string}
             for lang, string
@@ -428,12 +540,23 @@ class WebappIndexer(BaseIndexer):
         from mkt.webapps.models import Webapp
         sys.stdout.write('Indexing %s webapps\n' % len(ids))
 
-        qs = Webapp.with_deleted.no_cache().filter(id__in=ids)
+        qs = list(Webapp.with_deleted.no_cache().filter(id__in=ids))
+        try:
+            related = cls.get_related(qs)
+        except Exception as e:
+            # Only skip the webapps it fails for, not the whole chunk.
+            sys.stdout.write('Failed to fetch the related objects of {0} '
+                             'webapps, extracting them one by one: {1}\n'
+                             .format(len(qs), e))
+            related = None
 
         docs = []
         for obj in qs:
             try:
-                docs.append(cls.extract_document(obj.id, obj=obj))
+                if related is None:
+                    docs.extend(cls.extract_documents([obj]))
+                else:
+                    docs.append(cls._extract_document(obj, related))
             except Exception as e:
                 sys.stdout.write('Failed to index webapp {0}: {1}\n'.format(
                     obj.id, e))
@@ -456,7 +579,7 @@ class WebappIndexer(BaseIndexer):
         no_filter -- doesn't apply the consumer-side excludes (public/region).
         """
         from mkt.api.base import get_region_from_request
-        from mkt.search.views import name_query
+        from mkt.search.views import search_query
 
         sq = sq or cls.search()
         additional_data = additional_data or {}
@@ -491,11 +614,8 @@ class WebappIndexer(BaseIndexer):
 
         # QUERY.
         if data['q']:
-            # Function score for popularity boosting (defaults to multiply).
-            sq = sq.query(
-                'function_score',
-                query=name_query(data['q'].lower()),
-                functions=[query.SF('field_value_factor', field='boost')])
+            # Function score for popularity boosting, see search_query().
+            sq = sq.query(search_query(data['q'].lower()))
 
         # MUST.
         must = [
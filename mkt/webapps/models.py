@@ -22,15 +22,14 @@ from django.utils.translation import trans_real as translation
 import caching.base as caching
 import commonware.log
 import json_field
-from cache_nuggets.lib import memoize, memoize_key
 from jinja2.filters import do_dictsort
 from tower import ugettext as _
 from tower import ugettext_lazy as _lazy
 
 import amo
 import mkt
-from amo.utils import (JSONEncoder, slugify, smart_path, sorted_groupby,
-                       urlparams)
+from amo.utils import (cache_ns_key, JSONEncoder, slugify, smart_path,
+                       sorted_groupby, urlparams)
 from lib.crypto import packaged
 from lib.iarc.client import get_iarc_client
 from lib.iarc.utils import get_iarc_app_title, render_xml
@@ -41,7 +40,8 @@ from mkt.constants.applications import DEVICE_TYPES
 from mkt.constants.payments import PROVIDER_CHOICES
 from mkt.files.models import File, nfd_str
 from mkt.files.utils import parse_addon, WebAppParser
-from mkt.prices.models import AddonPremium, Price
+from mkt.prices.models import (AddonPremium, default_providers, Price,
+                               PriceCurrency)
 from mkt.ratings.models import Review
 from mkt.regions.utils import parse_region
 from mkt.site.decorators import skip_cache, use_master, write
@@ -1655,23 +1655,7 @@ class Webapp(UUIDModelMixin, OnChangeMixin, ModelBase):
 
         Note: free and in-app are not included in this.
         """
-        excluded = set(self.addonexcludedregion
-                           .values_list('region', flat=True))
-
-        if self.is_premium():
-            all_regions = set(mkt.regions.ALL_REGION_IDS)
-            # Find every region that does not have payments supported
-            # and add that into the exclusions.
-            excluded = excluded.union(
-                all_regions.difference(self.get_price_region_ids()))
-
-        geo = self.geodata
-        if geo.region_de_iarc_exclude or geo.region_de_usk_exclude:
-            excluded.add(mkt.regions.DE.id)
-        if geo.region_br_iarc_exclude:
-            excluded.add(mkt.regions.BR.id)
-
-        return sorted(list(excluded))
+        return get_excluded_regions([self])[self.id]
 
     def get_price_region_ids(self):
         tier = self.get_tier()
@@ -2390,23 +2374,91 @@ class AddonExcludedRegion(ModelBase):
         return mkt.regions.REGIONS_CHOICES_ID_DICT.get(self.region)
 
 
-@memoize(prefix='get_excluded_in')
+# The Geodata flags excluding apps from a region: pre-IARC unrated games in
+# Brazil and Germany, and USK_RATING_REFUSED apps in Germany.
+GEODATA_EXCLUSIONS = (
+    ('region_br_iarc_exclude', mkt.regions.BR),
+    ('region_de_iarc_exclude', mkt.regions.DE),
+    ('region_de_usk_exclude', mkt.regions.DE),
+)
+
+
+def get_excluded_regions(apps):
+    """
+    Return a dict of app id => sorted list of the IDs of the regions each app
+    is excluded from, see `Webapp.get_excluded_region_ids`.
+
+    The excluded regions, geodata and price tiers of all the apps are fetched
+    at once.
+    """
+    apps = list(apps)
+    ids = [app.id for app in apps]
+    excluded = dict((app_id, set()) for app_id in ids)
+
+    for app_id, region in (AddonExcludedRegion.objects
+                           .filter(addon__in=ids)
+                           .values_list('addon', 'region')):
+        excluded[app_id].add(region)
+
+    # Find every region that does not have payments supported for premium
+    # apps and add that into the exclusions.
+    premium_ids = [app.id for app in apps if app.is_premium()]
+    if premium_ids:
+        tiers = dict(AddonPremium.objects.filter(addon__in=premium_ids)
+                     .exclude(price=None).values_list('addon', 'price'))
+        paid_regions = {}
+        for tier_id, region in (PriceCurrency.objects
+                                .filter(tier__in=set(tiers.values()),
+                                        provider__in=default_providers(),
+                                        paid=True)
+                                .values_list('tier', 'region')):
+            paid_regions.setdefault(tier_id, set()).add(region)
+        all_regions = set(mkt.regions.ALL_REGION_IDS)
+        for app_id in premium_ids:
+            excluded[app_id].update(all_regions.difference(
+                paid_regions.get(tiers.get(app_id), ())))
+
+    fields = [field for field, region in GEODATA_EXCLUSIONS]
+    for row in (Geodata.objects.filter(addon__in=ids)
+                .values_list('addon', *fields)):
+        for flag, (field, region) in zip(row[1:], GEODATA_EXCLUSIONS):
+            if flag:
+                excluded[row[0]].add(region.id)
+
+    return dict((app_id, sorted(regions))
+                for app_id, regions in excluded.items())
+
+
 def get_excluded_in(region_id):
     """
     Return IDs of Webapp objects excluded from a particular region or excluded
     due to Geodata flags.
+
+    The result is cached under a namespace per region, invalidated by the
+    changes to the exclusions of that region only.
+
+    Unlike `get_excluded_regions`, the regions where the price of a premium
+    app is not paid are not included: they depend on the price tiers, whose
+    changes do not invalidate this cache. Both share `GEODATA_EXCLUSIONS`
+    for the other exclusions.
     """
+    key = cache_ns_key('get_excluded_in:%s' % region_id)
+    excluded = cache.get(key)
+    if excluded is None:
+        excluded = _get_excluded_in(region_id)
+        cache.set(key, excluded, settings.EXCLUDED_IN_CACHE_TIMEOUT)
+    return excluded
+
+
+def _get_excluded_in(region_id):
     aers = list(AddonExcludedRegion.objects.filter(region=region_id)
                 .values_list('addon', flat=True))
 
-    # For pre-IARC unrated games in Brazil/Germany.
     geodata_qs = Q()
     region = parse_region(region_id)
-    if region in (mkt.regions.BR, mkt.regions.DE):
-        geodata_qs |= Q(**{'region_%s_iarc_exclude' % region.slug: True})
-    # For USK_RATING_REFUSED apps in Germany.
-    if region == mkt.regions.DE:
-        geodata_qs |= Q(**{'region_de_usk_exclude': True})
+    for field, excluded_region in GEODATA_EXCLUSIONS:
+        if region == excluded_region:
+            geodata_qs |= Q(**{field: True})
 
     geodata_exclusions = []
     if geodata_qs:
@@ -2415,13 +2467,19 @@ def get_excluded_in(region_id):
     return set(aers + geodata_exclusions)
 
 
+def invalidate_excluded_in(region_ids):
+    """Invalidate the cached `get_excluded_in` of these regions."""
+    for region_id in region_ids:
+        cache_ns_key('get_excluded_in:%s' % region_id, increment=True)
+
+
 @receiver(models.signals.post_save, sender=AddonExcludedRegion,
           dispatch_uid='clean_memoized_exclusions')
+@receiver(models.signals.post_delete, sender=AddonExcludedRegion,
+          dispatch_uid='clean_memoized_exclusions_delete')
 def clean_memoized_exclusions(sender, **kw):
     if not kw.get('raw'):
-        for k in mkt.regions.ALL_REGION_IDS:
-            cache.delete_many([memoize_key('get_excluded_in', k)
-                               for k in mkt.regions.ALL_REGION_IDS])
+        invalidate_excluded_in([kw['instance'].region])
 
 
 class IARCInfo(ModelBase):
@@ -2804,3 +2862,11 @@ for region in (mkt.regions.BR, mkt.regions.DE):
 # Save geodata translations when a Geodata instance is saved.
 models.signals.pre_save.connect(save_signal, sender=Geodata,
                                 dispatch_uid='geodata_translations')
+
+
+@receiver(models.signals.post_save, sender=Geodata,
+          dispatch_uid='geodata_clean_memoized_exclusions')
+def geodata_clean_memoized_exclusions(sender, **kw):
+    if not kw.get('raw'):
+        invalidate_excluded_in(set(region.id for field, region
+                                   in GEODATA_EXCLUSIONS))
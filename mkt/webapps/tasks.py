@@ -15,6 +15,7 @@ from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.core.files.storage import default_storage as storage
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.template import Context, loader
 
 import pytz
@@ -48,7 +49,7 @@ from mkt.site.helpers import absolutify
 from mkt.users.models import UserProfile
 from mkt.users.utils import get_task_user
 from mkt.webapps.indexers import WebappIndexer
-from mkt.webapps.models import AppManifest, Preview, Webapp
+from mkt.webapps.models import AppManifest, Preview, Trending, Webapp
 from mkt.webapps.utils import get_locale_properties
 
 
@@ -337,14 +338,14 @@ def update_supported_locales(ids, **kw):
                 _log(app, u'Updating supported locales failed.', exc_info=True)
 
 
-@post_request_task(acks_late=True)
+@post_request_task(acks_late=True, coalesce=True)
 @write
 def index_webapps(ids, **kw):
     # DEPRECATED: call WebappIndexer.index_ids directly.
     WebappIndexer.index_ids(ids, no_delay=True)
 
 
-@post_request_task(acks_late=True)
+@post_request_task(acks_late=True, coalesce=True)
 @write
 def unindex_webapps(ids, **kw):
     # DEPRECATED: call WebappIndexer.unindexer directly.
@@ -634,169 +635,202 @@ def import_manifests(ids, **kw):
                               '%s: %s' % (app.id, version.id, e))
 
 
-def _get_trending(app_id, region=None):
+def _installs_facet(ids, start=None, end=None, region=None):
     """
-    Calculate trending.
+    Return a Monolith facet summing the installs of each of the apps,
+    between `start` and `end` and in `region` if given.
+    """
+    filters = [{'terms': {'app-id': list(ids)}}]
+    if start and end:
+        filters.append({'range': {'date': {
+            'gte': start.date().strftime('%Y-%m-%d'),
+            'lte': end.date().strftime('%Y-%m-%d'),
+        }}})
+    if region:
+        filters.append({'term': {'region': region.slug}})
+    return {
+        'terms_stats': {
+            'key_field': 'app-id',
+            'value_field': 'app_installs',
+            'size': len(ids),
+        },
+        'facet_filter': {'and': filters},
+    }
+
+
+def _facet_installs(resp, name):
+    """Return a dict of app id => installs from a `_installs_facet`."""
+    terms = resp.get('facets', {}).get(name, {}).get('terms', [])
+    return dict((int(term['term']), term['total']) for term in terms
+                if term.get('total'))
+
+
+def _get_installs(client, ids, start, end, regions=()):
+    """
+    Return a dict of (app id, region id) => installs of the apps between
+    `start` and `end`, in one Monolith query. Region id 0 is the installs
+    across all regions.
+    """
+    facets = {}
+    for region in [None] + list(regions):
+        facets[str(region.id if region else 0)] = _installs_facet(
+            ids, start, end, region)
+
+    resp = client.raw({'query': {'match_all': {}}, 'facets': facets,
+                       'size': 0})
+    installs = {}
+    for region_id in facets:
+        for app_id, count in _facet_installs(resp, region_id).items():
+            installs[(app_id, int(region_id))] = count
+    return installs
+
+
+def _get_trending(ids):
+    """
+    Calculate trending for the apps, globally and in every region.
 
     a = installs from 7 days ago to now
     b = installs from 28 days ago to 8 days ago, averaged per week
 
     trending = (a - b) / b if a > 100 and b > 1 else 0
 
+    Returns a dict of (app id, region id) => trending, leaving out the zeros.
+    Region id 0 is the global trending.
     """
     client = get_monolith_client()
-
-    kwargs = {'app-id': app_id}
-    if region:
-        kwargs['region'] = region.slug
-
+    regions = mkt.regions.REGIONS_DICT.values()
     today = datetime.datetime.today()
 
-    # If we query monolith with interval=week and the past 7 days
-    # crosses a Monday, Monolith splits the counts into two. We want
-    # the sum over the past week so we need to `sum` these.
     try:
-        count_1 = sum(
-            c['count'] for c in
-            client('app_installs', days_ago(7), today, 'week', **kwargs)
-            if c.get('count'))
-    except ValueError as e:
+        recent = _get_installs(client, ids, days_ago(7), today, regions)
+    except Exception as e:
         task_log.info('Call to ES failed: {0}'.format(e))
-        count_1 = 0
-
-    # If count_1 isn't more than 100, stop here to avoid extra Monolith calls.
-    if not count_1 > 100:
-        return 0.0
+        return {}
 
-    # Get the average installs for the prior 3 weeks. Don't use the `len` of
-    # the returned counts because of week boundaries.
+    # Only look at the prior 3 weeks of the apps above the threshold.
+    recent = dict((k, v) for k, v in recent.items() if v > 100)
+    if not recent:
+        return {}
     try:
-        count_3 = sum(
-            c['count'] for c in
-            client('app_installs', days_ago(28), days_ago(8), 'week', **kwargs)
-            if c.get('count')) / 3
-    except ValueError as e:
+        prior = _get_installs(client, set(app_id for app_id, _ in recent),
+                              days_ago(28), days_ago(8), regions)
+    except Exception as e:
         task_log.info('Call to ES failed: {0}'.format(e))
-        count_3 = 0
+        return {}
+
+    trending = {}
+    for key, count_1 in recent.items():
+        count_3 = prior.get(key, 0) / 3.0
+        if count_3 > 1:
+            trending[key] = (count_1 - count_3) / count_3
+    return dict((k, v) for k, v in trending.items() if v)
 
-    if count_3 > 1:
-        return (count_1 - count_3) / count_3
-    else:
-        return 0.0
+
+def _save_trending(values):
+    """
+    Insert or update the Trending rows from a dict of (app id, region id) =>
+    trending, in one query per chunk of rows.
+    """
+    existing = list(Trending.objects.no_cache().filter(
+        addon__in=set(app_id for app_id, _ in values)))
+    now = datetime.datetime.now()
+    cursor = connection.cursor()
+    for chunk in chunked(sorted(values.items()), 500):
+        cursor.execute(
+            'INSERT INTO addons_trending '
+            '(addon_id, region, value, created, modified) VALUES %s '
+            'ON DUPLICATE KEY UPDATE value=VALUES(value), '
+            'modified=VALUES(modified)'
+            % ', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk)),
+            list(itertools.chain(*[(app_id, region, value, now, now)
+                                   for (app_id, region), value in chunk])))
+    # The raw query bypasses cache-machine.
+    Trending.objects.invalidate(*existing)
 
 
 @task
 @write
 def update_trending(ids, **kw):
-    count = 0
-    times = []
-
-    for app in Webapp.objects.filter(id__in=ids).no_transforms():
-
-        count += 1
-        t_start = time.time()
+    t_start = time.time()
+    ids = list(Webapp.objects.filter(id__in=ids).no_transforms()
+               .values_list('id', flat=True))
+    if not ids:
+        return
 
-        # Calculate global trending, then per-region trending below.
-        value = _get_trending(app.id)
-        if value:
-            trending, created = app.trending.get_or_create(
-                region=0, defaults={'value': value})
-            if not created:
-                trending.update(value=value)
+    values = _get_trending(ids)
+    if values:
+        _save_trending(values)
 
-        for region in mkt.regions.REGIONS_DICT.values():
-            value = _get_trending(app.id, region)
-            if value:
-                trending, created = app.trending.get_or_create(
-                    region=region.id, defaults={'value': value})
-                if not created:
-                    trending.update(value=value)
+    task_log.info('Trending calculated for %s apps, %s values saved in '
+                  '%0.2fs.' % (len(ids), len(values), time.time() - t_start))
 
-        times.append(time.time() - t_start)
 
-    task_log.info('Trending calculated for %s apps. Avg time overall: '
-                  '%0.2fs' % (count, sum(times) / count))
+def _save_downloads(downloads):
+    """
+    Update the weekly and total downloads from a dict of app id => (weekly,
+    total), in one query per chunk of apps.
+    """
+    cursor = connection.cursor()
+    for chunk in chunked(sorted(downloads.items()), 500):
+        cases = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+        cursor.execute(
+            'UPDATE addons SET weekly_downloads = CASE id %s END, '
+            'total_downloads = CASE id %s END WHERE id IN (%s)'
+            % (cases, cases, ', '.join(['%s'] * len(chunk))),
+            list(itertools.chain(
+                *[(app_id, weekly) for app_id, (weekly, _) in chunk])) +
+            list(itertools.chain(
+                *[(app_id, total) for app_id, (_, total) in chunk])) +
+            [app_id for app_id, _ in chunk])
 
 
 @task
 @write
 def update_downloads(ids, **kw):
+    """
+    Update the weekly and total downloads of the apps from the installs in
+    Monolith, fetched for all of them in one query.
+    """
     client = get_monolith_client()
-    count = 0
-
-    for app in Webapp.objects.filter(id__in=ids).no_transforms():
-
-        appid = {'app-id': app.id}
-
-        # Get weekly downloads.
-        query = {
-            'query': {'match_all': {}},
-            'facets': {
-                'installs': {
-                    'date_histogram': {
-                        'value_field': 'app_installs',
-                        'interval': 'week',
-                        'key_field': 'date',
-                    },
-                    'facet_filter': {
-                        'and': [
-                            {'term': appid},
-                            {'range': {'date': {
-                                'gte': days_ago(8).date().strftime('%Y-%m-%d'),
-                                'lte': days_ago(1).date().strftime('%Y-%m-%d'),
-                            }}}
-                        ]
-                    }
-                }
-            },
-            'size': 0}
+    apps = list(Webapp.objects.no_cache().filter(id__in=ids)
+                .no_transforms())
+    if not apps:
+        return
 
-        try:
-            resp = client.raw(query)
-            # If we query monolith with interval=week and the past 7 days
-            # crosses a Monday, Monolith splits the counts into two. We want
-            # the sum over the past week so we need to `sum` these.
-            weekly = sum(
-                c['total'] for c in
-                resp.get('facets', {}).get('installs', {}).get('entries')
-                if c.get('total'))
-        except Exception as e:
-            task_log.info('Call to ES failed: {0}'.format(e))
-            weekly = 0
-
-        # Get total downloads.
-        query = {'query': {'match_all': {}},
-                 'facets': {
-                     'installs': {
-                         'statistical': {'field': 'app_installs'},
-                         'facet_filter': {'term': appid}}},
-                 'size': 0}
-        try:
-            resp = client.raw(query)
-            total = resp.get('facets', {}).get('installs', {}).get('total', 0)
-        except Exception as e:
-            task_log.info('Call to ES failed: {0}'.format(e))
-            total = 0
-
-        # Update Webapp object, if needed.
-        update = False
-        signal = False
-        if weekly != app.weekly_downloads:
-            update = True
-            signal = True
-        if total != app.total_downloads:
-            update = True
-
-        if update:
-            # Note: Calling `update` will trigger a reindex on the app if
-            # `_signal` is True. Since we only index `weekly_downloads`, we
-            # can skip reindexing if this hasn't changed.
-            count += 1
-            app.update(weekly_downloads=weekly, total_downloads=total,
-                       _signal=signal)
+    ids = [app.id for app in apps]
+    query = {
+        'query': {'match_all': {}},
+        'facets': {
+            'weekly': _installs_facet(ids, days_ago(8), days_ago(1)),
+            'total': _installs_facet(ids),
+        },
+        'size': 0,
+    }
+    try:
+        resp = client.raw(query)
+    except Exception as e:
+        task_log.info('Call to ES failed: {0}'.format(e))
+        return
+    weekly = _facet_installs(resp, 'weekly')
+    total = _facet_installs(resp, 'total')
+
+    changed = {}
+    for app in apps:
+        downloads = (int(weekly.get(app.id, 0)), int(total.get(app.id, 0)))
+        if downloads != (app.weekly_downloads, app.total_downloads):
+            changed[app.id] = downloads
+    if changed:
+        _save_downloads(changed)
+        Webapp.objects.invalidate(*[app for app in apps if app.id in changed])
+        # Only `weekly_downloads` is indexed, skip reindexing the apps for
+        # which it hasn't changed.
+        reindex = [app.id for app in apps if app.id in changed and
+                   changed[app.id][0] != app.weekly_downloads]
+        if reindex:
+            WebappIndexer.index_ids(reindex)
 
     task_log.info('App downloads updated for %s out of %s apps.'
-                  % (count, len(ids)))
+                  % (len(changed), len(ids)))
 
 
 class PreGenAPKError(Exception):
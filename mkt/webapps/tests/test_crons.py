@@ -1,14 +1,14 @@
 # -*- coding: utf-8 -*-
 import os
 import time
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.core.files.storage import default_storage as storage
 from django.core.management import call_command
 
 import mock
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
 import amo
 import amo.tests
@@ -128,55 +128,61 @@ class TestWeeklyDownloads(amo.tests.TestCase):
     def get_app(self):
         return Webapp.objects.get(pk=self.app.pk)
 
+    def installs(self, weekly, total):
+        return {'facets': {
+            'weekly': {'_type': 'terms_stats', 'terms': [
+                {'term': self.app.pk, 'count': 65, 'total': weekly}]},
+            'total': {'_type': 'terms_stats', 'terms': [
+                {'term': self.app.pk, 'count': 49, 'total': total}]},
+        }}
+
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.index_ids')
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
-    def test_weekly_downloads(self, _mock):
+    def test_downloads(self, _mock, index_mock):
         client = mock.Mock()
-        raw = {
-            'facets': {
-                'installs': {
-                    '_type': 'date_histogram',
-                    'entries': [
-                        {'count': 3,
-                         'time': 1390780800000,
-                         'total': 19.0},
-                        {'count': 62,
-                         'time': 1391385600000,
-                         'total': 236.0}
-                    ]
-                }
-            }
-        }
-        client.raw.return_value = raw
+        client.raw.return_value = self.installs(255.0, 6638.0)
         _mock.return_value = client
 
         eq_(self.app.weekly_downloads, 0)
+        eq_(self.app.total_downloads, 0)
 
         update_downloads([self.app.pk])
 
         self.app.reload()
         eq_(self.app.weekly_downloads, 255)
+        eq_(self.app.total_downloads, 6638)
+        index_mock.assert_called_with([self.app.pk])
 
+        # A single query for all the apps.
+        eq_(client.raw.call_count, 1)
+        facets = client.raw.call_args[0][0]['facets']
+        eq_(facets['total']['facet_filter'],
+            {'and': [{'terms': {'app-id': [self.app.pk]}}]})
+
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.index_ids')
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
-    def test_total_downloads(self, _mock):
+    def test_total_downloads_no_reindex(self, _mock, index_mock):
         client = mock.Mock()
-        raw = {
-            'facets': {
-                'installs': {
-                    u'_type': u'statistical',
-                    u'count': 49,
-                    u'total': 6638.0
-                }
-            }
-        }
-        client.raw.return_value = raw
+        client.raw.return_value = self.installs(0, 6638.0)
         _mock.return_value = client
 
-        eq_(self.app.total_downloads, 0)
-
         update_downloads([self.app.pk])
 
         self.app.reload()
+        eq_(self.app.weekly_downloads, 0)
         eq_(self.app.total_downloads, 6638)
+        ok_(not index_mock.called)
+
+    @mock.patch('mkt.webapps.tasks._save_downloads')
+    @mock.patch('mkt.webapps.tasks.get_monolith_client')
+    def test_unchanged(self, _mock, save_mock):
+        self.app.update(weekly_downloads=255, total_downloads=6638)
+        client = mock.Mock()
+        client.raw.return_value = self.installs(255.0, 6638.0)
+        _mock.return_value = client
+
+        update_downloads([self.app.pk])
+        ok_(not save_mock.called)
 
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
     def test_monolith_error(self, _mock):
@@ -250,9 +256,19 @@ class TestUpdateTrending(amo.tests.TestCase):
     def setUp(self):
         self.app = Webapp.objects.create(status=amo.STATUS_PUBLIC)
 
+    def trending(self, value):
+        values = {(self.app.id, 0): value}
+        for region in mkt.regions.REGIONS_DICT.values():
+            values[(self.app.id, region.id)] = value
+        return values
+
+    def installs(self, total, region_id=0):
+        return {'facets': {str(region_id): {'terms': [
+            {'term': self.app.id, 'total': total}]}}}
+
     @mock.patch('mkt.webapps.tasks._get_trending')
     def test_trending_saved(self, _mock):
-        _mock.return_value = 12.0
+        _mock.return_value = self.trending(12.0)
         update_app_trending()
 
         eq_(self.app.get_trending(), 12.0)
@@ -260,45 +276,59 @@ class TestUpdateTrending(amo.tests.TestCase):
             eq_(self.app.get_trending(region=region), 12.0)
 
         # Test running again updates the values as we'd expect.
-        _mock.return_value = 2.0
+        _mock.return_value = self.trending(2.0)
         update_app_trending()
         eq_(self.app.get_trending(), 2.0)
         for region in mkt.regions.REGIONS_DICT.values():
             eq_(self.app.get_trending(region=region), 2.0)
+        eq_(self.app.trending.count(),
+            len(mkt.regions.REGIONS_DICT.values()) + 1)
 
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
     def test_get_trending(self, _mock):
         client = mock.Mock()
-        client.return_value = [
-            {'count': 133.0, 'date': date(2013, 8, 26)},
-            {'count': 122.0, 'date': date(2013, 9, 2)},
-        ]
+        client.raw.side_effect = [self.installs(255.0),
+                                  self.installs(255.0)]
         _mock.return_value = client
 
-        # 1st week count: 133 + 122 = 255
-        # Prior 3 weeks get averaged: (133 + 122) / 3 = 85
+        # 1st week count: 255
+        # Prior 3 weeks get averaged: 255 / 3 = 85
         # (255 - 85) / 85 = 2.0
-        eq_(_get_trending(self.app.id), 2.0)
+        eq_(_get_trending([self.app.id]), {(self.app.id, 0): 2.0})
+
+    @mock.patch('mkt.webapps.tasks.get_monolith_client')
+    def test_get_trending_query(self, _mock):
+        client = mock.Mock()
+        client.raw.return_value = self.installs(255.0, mkt.regions.BR.id)
+        _mock.return_value = client
+        eq_(_get_trending([self.app.id]),
+            {(self.app.id, mkt.regions.BR.id): 2.0})
+
+        # One facet per region, plus the global one.
+        eq_(client.raw.call_count, 2)
+        facets = client.raw.call_args[0][0]['facets']
+        eq_(len(facets), len(mkt.regions.REGIONS_DICT.values()) + 1)
+        eq_(facets['0']['terms_stats']['key_field'], 'app-id')
+        ok_({'term': {'region': 'br'}} in
+            facets[str(mkt.regions.BR.id)]['facet_filter']['and'])
 
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
     def test_get_trending_threshold(self, _mock):
         client = mock.Mock()
-        client.return_value = [
-            {'count': 49.0, 'date': date(2013, 8, 26)},
-            {'count': 50.0, 'date': date(2013, 9, 2)},
-        ]
+        client.raw.return_value = self.installs(99.0)
         _mock.return_value = client
 
-        # 1st week count: 49 + 50 = 99
-        # 99 is less than 100 so we return 0.0.
-        eq_(_get_trending(self.app.id), 0.0)
+        # 1st week count: 99 is less than 100 so there is no trending, and
+        # no need to fetch the prior weeks.
+        eq_(_get_trending([self.app.id]), {})
+        eq_(client.raw.call_count, 1)
 
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
     def test_get_trending_monolith_error(self, _mock):
         client = mock.Mock()
-        client.side_effect = ValueError
+        client.raw.side_effect = ValueError
         _mock.return_value = client
-        eq_(_get_trending(self.app.id), 0.0)
+        eq_(_get_trending([self.app.id]), {})
 
 
 @mock.patch('os.stat')
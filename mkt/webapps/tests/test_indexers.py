@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import mock
 from nose.tools import eq_, ok_
 
 import amo.tests
@@ -175,6 +176,44 @@ class TestWebappIndexer(amo.tests.TestCase):
         eq_(doc['release_notes_translations'][1],
             {'lang': 'fr', 'string': release_notes['fr']})
 
+    def test_extract_documents(self):
+        app = amo.tests.app_factory()
+        EscalationQueue.objects.create(addon=app)
+        objs = list(Webapp.objects.no_cache()
+                    .filter(id__in=[self.app.pk, app.pk]).order_by('id'))
+        docs = WebappIndexer.extract_documents(objs)
+        eq_([doc['id'] for doc in docs], [self.app.pk, app.pk])
+        eq_([doc['is_escalated'] for doc in docs], [False, True])
+        for obj, doc in zip(objs, docs):
+            single = WebappIndexer.extract_document(obj.pk)
+            for key in ('owners', 'previews', 'reviewed', 'versions',
+                        'release_notes_translations', 'popularity'):
+                eq_(doc[key], single[key])
+
+    @mock.patch.object(WebappIndexer, 'bulk_index')
+    def test_run_indexing(self, bulk_index):
+        app = amo.tests.app_factory()
+        WebappIndexer.run_indexing([self.app.pk, app.pk], None)
+        eq_(sorted(doc['id'] for doc in bulk_index.call_args[0][0]),
+            [self.app.pk, app.pk])
+
+    @mock.patch.object(WebappIndexer, 'bulk_index')
+    def test_run_indexing_related_failure(self, bulk_index):
+        app = amo.tests.app_factory()
+        get_related = WebappIndexer.get_related.im_func
+
+        def fail_for_app(cls, objs):
+            if app.pk in [obj.pk for obj in objs]:
+                raise ValueError
+            return get_related(cls, objs)
+
+        with mock.patch.object(WebappIndexer, 'get_related',
+                               classmethod(fail_for_app)):
+            WebappIndexer.run_indexing([self.app.pk, app.pk], None)
+        # Only the webapp the related objects can't be fetched for is
+        # skipped.
+        eq_([doc['id'] for doc in bulk_index.call_args[0][0]], [self.app.pk])
+
 
 class TestAppFilter(amo.tests.ESTestCase):
 
@@ -56,7 +56,8 @@ from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.models import (AddonDeviceType, AddonExcludedRegion,
                                 AddonUpsell, AppFeatures, AppManifest,
                                 BlacklistedSlug, ContentRating, Geodata,
-                                get_excluded_in, IARCInfo, Installed, Preview,
+                                get_excluded_in, get_excluded_regions,
+                                IARCInfo, Installed, Preview,
                                 RatingDescriptors, RatingInteractives,
                                 version_changed, Webapp)
 from mkt.webapps.signals import version_changed as version_changed_signal
@@ -1436,6 +1437,43 @@ class TestExclusions(amo.tests.TestCase):
         ok_(mkt.regions.BR.id in excluded)
         ok_(mkt.regions.DE.id in excluded)
 
+    def test_get_excluded_regions(self):
+        self.make_tier()
+        free = Webapp.objects.create()
+        free.addonexcludedregion.create(region=mkt.regions.BR.id)
+        free._geodata.update(region_de_usk_exclude=True)
+        excluded = get_excluded_regions([self.app, free])
+        eq_(excluded[self.app.id], self.app.get_excluded_region_ids())
+        eq_(excluded[free.id], sorted([mkt.regions.BR.id,
+                                       mkt.regions.DE.id]))
+
+    def test_excluded_in_matches_excluded_regions(self):
+        free = Webapp.objects.create()
+        free.addonexcludedregion.create(region=mkt.regions.PL.id)
+        free._geodata.update(region_br_iarc_exclude=True,
+                             region_de_usk_exclude=True)
+        excluded = [region.id for region in mkt.regions.ALL_REGIONS
+                    if free.id in get_excluded_in(region.id)]
+        eq_(sorted(excluded), get_excluded_regions([free])[free.id])
+
+    def test_excluded_in_cache(self):
+        region = mkt.regions.PL.id
+        eq_(get_excluded_in(region), set())
+        aer = self.app.addonexcludedregion.create(region=region)
+        self.assertSetEqual(get_excluded_in(region), [self.app.id])
+        with self.assertNumQueries(0):
+            get_excluded_in(region)
+        aer.delete()
+        self.assertSetEqual(get_excluded_in(region), [])
+
+    def test_excluded_in_invalidates_one_region(self):
+        get_excluded_in(mkt.regions.PL.id)
+        get_excluded_in(mkt.regions.US.id)
+        self.app.addonexcludedregion.create(region=mkt.regions.PL.id)
+        with self.assertNumQueries(0):
+            self.assertSetEqual(get_excluded_in(mkt.regions.US.id),
+                                [self.app.id])
+
 
 class TestPackagedAppManifestUpdates(amo.tests.TestCase):
     # Note: More extensive tests for `.update_names` are above.
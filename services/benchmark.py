@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+"""
+Measures the latency and throughput of the receipt verification service.
+
+Signed purchase receipts are generated with the local receipt key and a
+SQLite database stands in for the `addon_purchase`, `stats_contributions` and
+`inapp_products` tables. The WSGI application from verify.py is then called
+in-process, by one or more worker processes, and the p50/p99 latencies and
+requests per second are reported for the ok, expired, refunded and invalid
+receipts.
+
+Run it from the services directory, with the same settings as the service:
+
+    DJANGO_SETTINGS_MODULE=settings_local python benchmark.py
+    DJANGO_SETTINGS_MODULE=settings_local python benchmark.py -n 500 -w 4
+
+Use --cold to clear the caches of the service before every request, so that
+every request decodes the receipt and looks up the purchase.
+"""
+import calendar
+import math
+import multiprocessing
+import optparse
+import os
+import re
+import site
+import sqlite3
+import tempfile
+import time
+from StringIO import StringIO
+from urllib import urlencode
+from urlparse import urlparse
+
+# Same paths as wsgi/receiptverify.py.
+servicesdir = os.path.dirname(os.path.abspath(__file__))
+for path in ['..', '../apps']:
+    site.addsitedir(os.path.abspath(os.path.join(servicesdir, path)))
+
+import jwt
+
+import verify
+from lib.utils import static_url
+from utils import CONTRIB_PURCHASE, CONTRIB_REFUND, settings
+
+
+# The app and in-app product every receipt is for.
+APP_ID = 337141
+INAPP_GUID = 'benchmark-inapp'
+
+SCHEMA = """
+CREATE TABLE addon_purchase (
+    id INTEGER PRIMARY KEY,
+    addon_id INTEGER NOT NULL,
+    uuid VARCHAR(255) NOT NULL UNIQUE,
+    type INTEGER NOT NULL
+);
+CREATE TABLE inapp_products (
+    id INTEGER PRIMARY KEY,
+    guid VARCHAR(255) NOT NULL
+);
+CREATE TABLE stats_contributions (
+    id INTEGER PRIMARY KEY,
+    inapp_product_id INTEGER NOT NULL,
+    type INTEGER NOT NULL
+);
+"""
+
+# Receipt status => (purchase type, seconds until expiry, tampered).
+SCENARIOS = (
+    ('ok', CONTRIB_PURCHASE, 60 * 60, False),
+    ('expired', CONTRIB_PURCHASE, -60 * 60, False),
+    ('refunded', CONTRIB_REFUND, 60 * 60, False),
+    ('invalid', CONTRIB_PURCHASE, 60 * 60, True),
+)
+
+
+class Cursor(object):
+    """
+    A SQLite cursor accepting the MySQLdb parameter style used by verify.py.
+    """
+    param_re = re.compile(r'%\((\w+)\)s|%s')
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=None):
+        sql = self.param_re.sub(
+            lambda m: ':' + m.group(1) if m.group(1) else '?', sql)
+        return self.cursor.execute(sql, params or ())
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+
+class Connection(object):
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+
+    def cursor(self):
+        return Cursor(self.conn.cursor())
+
+
+class Pool(object):
+    """Replaces the MySQL connection pool of verify.py."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        return Connection(self.path)
+
+
+def create_db(path, count):
+    """
+    Creates the stand-in database with `count` purchases and in-app
+    purchases for each scenario.
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute('INSERT INTO inapp_products (id, guid) VALUES (1, ?)',
+                 (INAPP_GUID,))
+    contribution_id = 0
+    for status, purchase_type, expiry, tampered in SCENARIOS:
+        for i in range(count):
+            contribution_id += 1
+            conn.execute('INSERT INTO addon_purchase (addon_id, uuid, type) '
+                         'VALUES (?, ?, ?)',
+                         (APP_ID, '%s-%s' % (status, i), purchase_type))
+            conn.execute('INSERT INTO stats_contributions '
+                         '(id, inapp_product_id, type) VALUES (?, 1, ?)',
+                         (contribution_id, purchase_type))
+    conn.commit()
+    conn.close()
+
+
+def create_receipt(uuid, expiry, tampered, contribution_id=None):
+    """
+    Returns a signed purchase receipt, shaped like the receipts created by
+    mkt.receipts.utils.create_receipt.
+    """
+    now = calendar.timegm(time.gmtime())
+    storedata = {'id': APP_ID}
+    if contribution_id:
+        storedata['contrib'] = contribution_id
+        storedata['inapp_id'] = INAPP_GUID
+    receipt = {
+        'detail': settings.SITE_URL + '/api/v1/receipts/reissue/',
+        'exp': now + expiry,
+        'iat': now,
+        'iss': settings.SITE_URL,
+        'nbf': now,
+        'product': {'storedata': urlencode(storedata),
+                    'url': settings.SITE_URL},
+        'reissue': settings.SITE_URL + '/api/v1/receipts/reissue/',
+        'typ': 'purchase-receipt',
+        'user': {'type': 'directed-identifier', 'value': uuid},
+        'verify': static_url('WEBAPPS_RECEIPT_URL'),
+    }
+    signed = jwt.encode(receipt, jwt.rsa_load(settings.WEBAPPS_RECEIPT_KEY),
+                        u'RS512')
+    if tampered:
+        signed = signed[:-4] + ('AAAA' if signed[-4:] != 'AAAA' else 'BBBB')
+    return signed
+
+
+def create_receipts(count):
+    """Returns the list of (status, receipt) to verify."""
+    receipts = []
+    contribution_id = 0
+    for status, purchase_type, expiry, tampered in SCENARIOS:
+        for i in range(count):
+            contribution_id += 1
+            uuid = '%s-%s' % (status, i)
+            # Half of the receipts are for the app, half for the in-app.
+            receipts.append((status, create_receipt(
+                uuid, expiry, tampered,
+                contribution_id=contribution_id if i % 2 else None)))
+    return receipts
+
+
+def run(args):
+    """
+    Verifies each receipt through the WSGI application, returns a list of
+    (status, seconds) tuples.
+    """
+    receipts, db_path, cold = args
+    verify.mypool = Pool(db_path)
+    path = urlparse(static_url('WEBAPPS_RECEIPT_URL')).path
+    results = []
+    for status, receipt in receipts:
+        if cold:
+            verify.clear_caches()
+        environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'POST',
+                   'wsgi.input': StringIO(receipt)}
+        start = time.time()
+        body = verify.application(environ, lambda status, headers: None)
+        results.append((status, time.time() - start))
+        assert '"%s"' % status in body[0], (status, body)
+    return results
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a sorted list."""
+    index = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(index, len(values) - 1))]
+
+
+def report(results, elapsed, workers):
+    print '%-10s %8s %10s %10s %10s' % ('status', 'count', 'p50 (ms)',
+                                       'p99 (ms)', 'req/s')
+    for status, _, _, _ in SCENARIOS:
+        timings = sorted(t for s, t in results if s == status)
+        if not timings:
+            continue
+        print '%-10s %8d %10.2f %10.2f %10.1f' % (
+            status, len(timings), percentile(timings, 50) * 1000,
+            percentile(timings, 99) * 1000,
+            # Each worker verifies its receipts one after the other.
+            workers * len(timings) / sum(timings))
+    print 'Total: %d requests in %.2fs, %.1f req/s with %d worker(s).' % (
+        len(results), elapsed, len(results) / elapsed, workers)
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('-n', '--count', type='int', default=200,
+                      help='Receipts per status (default: %default)')
+    parser.add_option('-r', '--repeat', type='int', default=5,
+                      help='Times each receipt is verified (default: '
+                           '%default)')
+    parser.add_option('-w', '--workers', type='int', default=1,
+                      help='Worker processes (default: %default)')
+    parser.add_option('--cold', action='store_true', default=False,
+                      help='Clear the service caches before every request')
+    options, args = parser.parse_args()
+
+    # The receipts are signed with the local key, not the signing server.
+    settings.SIGNING_SERVER_ACTIVE = False
+    settings.WEBAPPS_RECEIPT_EXPIRED_SEND = False
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        create_db(db_path, options.count)
+        receipts = create_receipts(options.count) * options.repeat
+
+        chunks = [(receipts[i::options.workers], db_path, options.cold)
+                  for i in range(options.workers)]
+        start = time.time()
+        if options.workers == 1:
+            results = run(chunks[0])
+        else:
+            pool = multiprocessing.Pool(options.workers)
+            results = sum(pool.map(run, chunks), [])
+            pool.close()
+        report(results, time.time() - start, options.workers)
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,10 @@
 import dictconfig
 import logging
 import os
+import threading
+from time import time
+
+from ordereddict import OrderedDict
 
 
 # get the right settings module
@@ -65,3 +69,45 @@ def log_exception(data):
 def log_info(msg):
     error_log = logging.getLogger('z.receipt')
     error_log.info(msg)
+
+
+class LRUCache(object):
+    """
+    A bounded, thread safe, in-process cache. When full, the least recently
+    used entry is dropped. Entries also expire `timeout` seconds after being
+    set.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                expires, value = self.data.pop(key)
+            except KeyError:
+                return default
+            if expires < time():
+                return default
+            # Put it back at the end, it's now the most recently used.
+            self.data[key] = (expires, value)
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0 or self.timeout <= 0:
+            return
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = (time() + self.timeout, value)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
@@ -1,4 +1,6 @@
 import calendar
+import copy
+import hashlib
 import json
 from datetime import datetime
 from time import gmtime, time
@@ -18,7 +20,7 @@ from services.utils import settings
 
 from utils import (CONTRIB_CHARGEBACK, CONTRIB_NO_CHARGE, CONTRIB_PURCHASE,
                    CONTRIB_REFUND, log_configure, log_exception, log_info,
-                   mypool)
+                   LRUCache, mypool)
 
 # Go configure the log.
 log_configure()
@@ -28,10 +30,27 @@ import receipts  # NOQA, used for patching in the tests
 
 status_codes = {
     200: '200 OK',
+    400: '400 Bad Request',
     405: '405 Method Not Allowed',
     500: '500 Internal Server Error',
 }
 
+# Apps verify the same receipts over and over again, so remember the decoded
+# receipts and the purchase lookups for a little while.
+decoded_cache = LRUCache(settings.WEBAPPS_RECEIPT_CACHE_SIZE,
+                         settings.WEBAPPS_RECEIPT_CACHE_TIMEOUT)
+purchase_cache = LRUCache(settings.WEBAPPS_RECEIPT_CACHE_SIZE,
+                          settings.WEBAPPS_RECEIPT_PURCHASE_CACHE_TIMEOUT)
+
+# The certificate verifier, built once per process by `get_verifier`.
+_verifier = None
+
+# Used to tell a missing cache entry from a cached `None`.
+_missing = object()
+
+# Appended to the receipt verification URL to verify a list of receipts.
+BATCH_SUFFIX = 'batch/'
+
 
 class VerificationError(Exception):
     pass
@@ -58,16 +77,39 @@ class Verify:
         # This is so the unit tests can override the connection.
         self.conn, self.cursor = None, None
 
+        # Purchases looked up beforehand by BatchVerify, keyed by
+        # (app id, uuid) and by contribution id.
+        self.app_purchases = {}
+        self.inapp_purchases = {}
+
     def check_full(self):
         """
         This is the default that verify will use, this will
         do the entire stack of checks.
         """
+        try:
+            self.check_receipt()
+        except InvalidReceipt, err:
+            return self.invalid(str(err))
+
+        return self.check_purchased()
+
+    def check_receipt(self):
+        """
+        Decodes the receipt and verifies that it is a purchase receipt meant
+        to be verified here.
+        """
         receipt_domain = urlparse(static_url('WEBAPPS_RECEIPT_URL')).netloc
+        self.decoded = self.decode()
+        self.check_type('purchase-receipt')
+        self.check_url(receipt_domain)
+
+    def check_purchased(self):
+        """
+        Once the receipt is decoded, verifies the purchase and returns the
+        status of the receipt.
+        """
         try:
-            self.decoded = self.decode()
-            self.check_type('purchase-receipt')
-            self.check_url(receipt_domain)
             self.check_purchase()
         except InvalidReceipt, err:
             return self.invalid(str(err))
@@ -237,15 +279,15 @@ class Verify:
         """
         Verifies that the inapp has been purchased.
         """
-        self.setup_db()
-        sql = """SELECT i.guid, c.type FROM stats_contributions c
-                 JOIN inapp_products i ON i.id=c.inapp_product_id
-                 WHERE c.id = %(contribution_id)s LIMIT 1;"""
-        self.cursor.execute(
-            sql,
-            {'contribution_id': self.get_contribution_id()}
-        )
-        result = self.cursor.fetchone()
+        contribution_id = self.get_contribution_id()
+        result = self.inapp_purchases.get(contribution_id, _missing)
+        if result is _missing:
+            self.setup_db()
+            sql = """SELECT i.guid, c.type FROM stats_contributions c
+                     JOIN inapp_products i ON i.id=c.inapp_product_id
+                     WHERE c.id = %(contribution_id)s LIMIT 1;"""
+            self.cursor.execute(sql, {'contribution_id': contribution_id})
+            result = self.cursor.fetchone()
         if not result:
             log_info('Invalid in-app receipt, no purchase')
             raise InvalidReceipt('NO_PURCHASE')
@@ -262,19 +304,31 @@ class Verify:
     def check_purchase_app(self):
         """
         Verifies that the app has been purchased by the user.
-        """
-        self.setup_db()
-        sql = """SELECT type FROM addon_purchase
-                 WHERE addon_id = %(app_id)s
-                 AND uuid = %(uuid)s LIMIT 1;"""
-        self.cursor.execute(sql, {'app_id': self.get_app_id(),
-                                  'uuid': self.get_user()})
-        result = self.cursor.fetchone()
-        if not result:
+
+        The purchase type, or the lack of purchase, is cached for a short
+        while.
+        """
+        key = (self.get_app_id(), self.get_user())
+        purchase_type = self.app_purchases.get(key, _missing)
+        if purchase_type is _missing:
+            purchase_type = purchase_cache.get(key, _missing)
+        if purchase_type is _missing:
+            self.setup_db()
+            sql = """SELECT type FROM addon_purchase
+                     WHERE addon_id = %(app_id)s
+                     AND uuid = %(uuid)s LIMIT 1;"""
+            self.cursor.execute(sql, {'app_id': key[0], 'uuid': key[1]})
+            result = self.cursor.fetchone()
+            purchase_type = result[0] if result else None
+            purchase_cache.set(key, purchase_type)
+        else:
+            statsd.incr('services.verify.purchase_cache.hit')
+
+        if purchase_type is None:
             log_info('Invalid app receipt, no purchase')
             raise InvalidReceipt('NO_PURCHASE')
 
-        self.check_purchase_type(result[0])
+        self.check_purchase_type(purchase_type)
 
     def check_purchase_type(self, purchase_type):
         """
@@ -353,6 +407,92 @@ class Verify:
         return {'status': 'expired'}
 
 
+class BatchVerify:
+    """
+    Verifies a list of purchase receipts with the same checks as Verify, but
+    looks up all the purchases at once.
+    """
+
+    def __init__(self, receipt_list, environ):
+        self.verifiers = [Verify(receipt, environ)
+                          for receipt in receipt_list]
+
+        # This is so the unit tests can override the connection.
+        self.conn, self.cursor = None, None
+
+    def setup_db(self):
+        if not self.cursor:
+            self.conn = mypool.connect()
+            self.cursor = self.conn.cursor()
+
+    def check_full(self):
+        """
+        Returns the result of Verify.check_full for each receipt, in the same
+        order as the receipts.
+        """
+        results = [None] * len(self.verifiers)
+        decoded = []
+        for i, verify in enumerate(self.verifiers):
+            try:
+                verify.check_receipt()
+            except InvalidReceipt, err:
+                results[i] = verify.invalid(str(err))
+            else:
+                decoded.append((i, verify))
+
+        self.get_purchases([verify for i, verify in decoded])
+
+        for i, verify in decoded:
+            results[i] = verify.check_purchased()
+        return results
+
+    def get_purchases(self, verifiers):
+        """
+        Looks up the purchases of all the receipts with one query for the
+        apps and one for the in-app products, and hands them to each Verify.
+        """
+        app_keys, contribution_ids = set(), set()
+        for verify in verifiers:
+            try:
+                if 'contrib' in verify.get_storedata():
+                    contribution_ids.add(verify.get_contribution_id())
+                else:
+                    key = (verify.get_app_id(), verify.get_user())
+                    if purchase_cache.get(key, _missing) is _missing:
+                        app_keys.add(key)
+            except InvalidReceipt:
+                # This will be reported when checking the purchase.
+                continue
+
+        app_purchases = dict((key, None) for key in app_keys)
+        if app_keys:
+            self.setup_db()
+            uuids = list(set(uuid for app_id, uuid in app_keys))
+            sql = """SELECT addon_id, uuid, type FROM addon_purchase
+                     WHERE uuid IN (%s);""" % ', '.join(['%s'] * len(uuids))
+            self.cursor.execute(sql, uuids)
+            for app_id, uuid, purchase_type in self.cursor.fetchall():
+                if (app_id, uuid) in app_purchases:
+                    app_purchases[(app_id, uuid)] = purchase_type
+            for key, purchase_type in app_purchases.items():
+                purchase_cache.set(key, purchase_type)
+
+        inapp_purchases = dict((id_, None) for id_ in contribution_ids)
+        if contribution_ids:
+            self.setup_db()
+            ids = list(contribution_ids)
+            sql = """SELECT c.id, i.guid, c.type FROM stats_contributions c
+                     JOIN inapp_products i ON i.id=c.inapp_product_id
+                     WHERE c.id IN (%s);""" % ', '.join(['%s'] * len(ids))
+            self.cursor.execute(sql, ids)
+            for contribution_id, guid, purchase_type in self.cursor.fetchall():
+                inapp_purchases[contribution_id] = (guid, purchase_type)
+
+        for verify in verifiers:
+            verify.app_purchases = app_purchases
+            verify.inapp_purchases = inapp_purchases
+
+
 def get_headers(length):
     return [('Access-Control-Allow-Origin', '*'),
             ('Access-Control-Allow-Methods', 'POST'),
@@ -362,26 +502,53 @@ def get_headers(length):
             ('Last-Modified', format_date_time(time()))]
 
 
+def get_verifier():
+    """Returns the certificate verifier, building it on first use."""
+    global _verifier
+    if _verifier is None:
+        _verifier = certs.ReceiptVerifier(
+            valid_issuers=settings.SIGNING_VALID_ISSUERS)
+    return _verifier
+
+
+def clear_caches():
+    """Forget the verifier, the decoded receipts and the purchases."""
+    global _verifier
+    _verifier = None
+    decoded_cache.clear()
+    purchase_cache.clear()
+
+
 def decode_receipt(receipt):
     """
     Cracks the receipt using the private key. This will probably change
     to using the cert at some point, especially when we get the HSM.
+
+    Receipts that were successfully decoded are cached, keyed by a hash of
+    the whole receipt, signature included.
     """
+    key = hashlib.sha256(receipt).hexdigest()
+    raw = decoded_cache.get(key)
+    if raw is not None:
+        statsd.incr('services.decode_cache.hit')
+        # The caller may modify the receipt, e.g. to update its expiry.
+        return copy.deepcopy(raw)
+
     with statsd.timer('services.decode'):
         if settings.SIGNING_SERVER_ACTIVE:
-            verifier = certs.ReceiptVerifier(valid_issuers=
-                                             settings.SIGNING_VALID_ISSUERS)
             try:
-                result = verifier.verify(receipt)
+                result = get_verifier().verify(receipt)
             except ExpiredSignatureError:
                 # Until we can do something meaningful with this, just ignore.
-                return jwt.decode(receipt.split('~')[1], verify=False)
+                result = True
             if not result:
                 raise VerificationError()
-            return jwt.decode(receipt.split('~')[1], verify=False)
+            raw = jwt.decode(receipt.split('~')[1], verify=False)
         else:
-            key = jwt.rsa_load(settings.WEBAPPS_RECEIPT_KEY)
-            raw = jwt.decode(receipt, key)
+            key_file = jwt.rsa_load(settings.WEBAPPS_RECEIPT_KEY)
+            raw = jwt.decode(receipt, key_file)
+
+    decoded_cache.set(key, copy.deepcopy(raw))
     return raw
 
 
@@ -416,6 +583,36 @@ def receipt_check(environ):
     return output
 
 
+def batch_receipt_check(environ):
+    """
+    Verifies a JSON list of receipts, returns a JSON list of the results in
+    the same order.
+    """
+    with statsd.timer('services.verify.batch'):
+        data = environ['wsgi.input'].read()
+        try:
+            receipt_list = json.loads(data)
+        except ValueError:
+            receipt_list = None
+        if (not isinstance(receipt_list, list) or
+                len(receipt_list) > settings.WEBAPPS_RECEIPT_BATCH_SIZE or
+                not all(isinstance(r, basestring) for r in receipt_list)):
+            log_info('Invalid batch of receipts')
+            return 400, ''
+
+        # The receipts are verified against the path of the single receipt
+        # verification.
+        path = environ['PATH_INFO'][:-len(BATCH_SUFFIX)]
+        environ = dict(environ, PATH_INFO=path)
+        try:
+            verify = BatchVerify([r.encode('utf-8') for r in receipt_list],
+                                 environ)
+            return 200, json.dumps(verify.check_full())
+        except:
+            log_exception('<none>')
+            return 500, ''
+
+
 def application(environ, start_response):
     body = ''
     path = environ.get('PATH_INFO', '')
@@ -425,6 +622,8 @@ def application(environ, start_response):
         # Only allow POST through as per spec.
         if environ.get('REQUEST_METHOD') != 'POST':
             status = 405
+        elif path.endswith('/' + BATCH_SUFFIX):
+            status, body = batch_receipt_check(environ)
         else:
             status, body = receipt_check(environ)
     start_response(status_codes[status], get_headers(len(body)))
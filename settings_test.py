@@ -73,6 +73,10 @@ CACHES = {
 # is just too annoying for tests, so disable it.
 CACHE_COUNT_TIMEOUT = -1
 
+# Cached search results would not see the changes made by the tests, so
+# disable the search cache.
+SEARCH_CACHE_TIMEOUT = 0
+
 # Overrides whatever storage you might have put in local settings.
 DEFAULT_FILE_STORAGE = 'amo.utils.LocalFileStorage'
 